@@ -5,16 +5,67 @@ import os
 import subprocess
 import sys
 from configs.Get_Configs import Bootstrap, Loader, loader_context
-from src.chatops.ChatChain import *
 from src.chatops.OutputChain import *
+from src.chatops.Cache import ExecutionCache, ResponseCache
+from src.chatops.Scheduler import RateLimitScheduler
+from src.chatops.Progress import ProgressRenderer, ProgressTracker
+from src.chatops.Retry import RetryEngine, RetryPolicy
+from src.chatops.ResultStore import ResultStore
+from src.chatops.Incremental import IncrementalBuild
+from src.chatops.Manifest import ProjectManifest
+from src.chatops.Transport import AzureHTTPTransport, OpenAITransport
+from src.chatops.Router import DeploymentRouter
+from src.chatops.Executor import CodeExecutor
+from src.chatops.RunnerPool import RunnerPool
+from src.chatops.Daemon import DaemonClient, default_address
+from src.chatops.Tracing import tracer
 
 class CLI:
     def __init__(self):
-        self.init = Bootstrap()
+        # Arguments are parsed first so --help returns before configurations and LLM clients load
         self.parser = argparse.ArgumentParser(description="Welcome to ChatOps!")
         self._add_arguments()
+        self.headless = self.args.headless or not sys.stdout.isatty()
+        if self.is_client():
+            # Thin client: the daemon holds the configurations, encoders, connections and workers
+            self.client = DaemonClient(self.args.daemon_socket or default_address())
+            return
+        if self.args.trace_file is not None:
+            tracer.enable()
+        self.init = Bootstrap(headless=self.headless)
+        # Imported here as it pulls in pydantic and the LLM clients
+        from src.chatops.ChatChain import Prompt_Manager
+
         user_roles = self.init.prompt_template
-        self.prompt_manager = Prompt_Manager(self.init.model_name, self.args.objective_name, [], "", user_roles)
+        self.response_cache = ResponseCache(self.args.cache_dir) if self.args.cache else None
+        self.progress = ProgressTracker()
+        self.scheduler = RateLimitScheduler(
+            max_in_flight=self.args.max_in_flight,
+            requests_per_minute=self.args.requests_per_minute,
+            tokens_per_minute=self.args.tokens_per_minute,
+            progress=self.progress
+        )
+        self.retry_engine = RetryEngine(
+            RetryPolicy(max_retries=self.args.max_retries, base_delay=self.args.retry_backoff, hedge_percentile=self.args.hedge_percentile),
+            self.scheduler
+        )
+        self.executor = CodeExecutor(
+            max_workers=self.args.max_workers,
+            timeout=self.args.exec_timeout,
+            memory_limit_mb=self.args.exec_memory_mb,
+            runner_pool=self.build_runner_pool(),
+            progress=self.progress
+        )
+        self.execution_cache = ExecutionCache(self.args.exec_cache_dir, cache_failures=self.args.exec_cache_failures) if self.args.exec_cache else None
+        self.execution_results = ResultStore(f"{os.path.splitext(self.args.results_file)[0]}.executions.jsonl") if self.args.results_file else None
+        self.transport = self.build_transport()
+        # Batch and daemon runs build one Prompt_Manager per job around the shared components above
+        if self.args.command is None:
+            self.stream_processor = self.build_processor() if self.args.stream else None
+            on_code_block = self.process_code_block if self.args.stream else None
+            self.prompt_manager = Prompt_Manager(self.init.model_name, self.args.objective_name, [], "", user_roles, response_cache=self.response_cache, scheduler=self.scheduler, transport=self.transport, on_code_block=on_code_block, context_tokens=self.args.context_tokens, retry_engine=self.retry_engine,
+                                                 candidates=self.args.candidates, candidate_check=self.build_candidate_check(), candidate_temperature=self.args.candidate_temperature,
+                                                 results_path=self.args.results_file)
 
     def _add_arguments(self):
         self.parser.add_argument(
@@ -42,7 +93,20 @@ class CLI:
             "--output_index",
             type=str,
             default=None,
-            help="Index of the output to process. If not provided, processes the last output by default."
+            help="Index of the output to process, negative values count from the end. Pass 'all' or leave it out to process every output."
+        )
+        self.parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only request and execute tasks whose inputs (model, objective, roles, task and data) changed since the latest "
+                 "version of the project, the files of unchanged tasks are copied forward. Processes every output."
+        )
+        self.parser.add_argument(
+            "--results_file",
+            type=str,
+            default=None,
+            help="JSONL file the completions are written to as they finish, with the execution results in <results_file>.executions.jsonl. "
+                 "Defaults to a temporary file."
         )
         self.parser.add_argument(
             "--overwrite_project",
@@ -71,8 +135,274 @@ class CLI:
                  "Application is used for running code; passing 'python' will execute code as a Python script."
                  " Example: --output_override 'hello_world.py' 'python'"
         )
+        self.parser.add_argument(
+            "--cache",
+            action=argparse.BooleanOptionalAction,
+            default=True,
+            help="Reuse stored LLM responses for identical prompts. Use --no-cache to always call the LLM."
+        )
+        self.parser.add_argument(
+            "--cache-dir",
+            dest="cache_dir",
+            type=str,
+            default=".chatops_cache/responses",
+            help="Folder used to store cached LLM responses."
+        )
+        self.parser.add_argument(
+            "--max_in_flight",
+            type=int,
+            default=8,
+            help="Maximum number of concurrent LLM requests. Pass 0 for no limit."
+        )
+        self.parser.add_argument(
+            "--requests_per_minute",
+            type=float,
+            default=None,
+            help="Requests per minute quota of the deployment. Requests are paced to stay under it."
+        )
+        self.parser.add_argument(
+            "--tokens_per_minute",
+            type=float,
+            default=None,
+            help="Tokens per minute quota of the deployment. Requests are admitted using the token counts from planning."
+        )
+        self.parser.add_argument(
+            "--candidates",
+            type=int,
+            default=1,
+            help="Completions requested per role. Their code blocks are executed concurrently and the first candidate whose "
+                 "blocks all complete is kept, the others are cancelled. Costs a request per candidate."
+        )
+        self.parser.add_argument(
+            "--candidate_temperature",
+            type=float,
+            default=0.7,
+            help="Sampling temperature of every candidate but the first, so candidates differ."
+        )
+        self.parser.add_argument(
+            "--max_retries",
+            type=int,
+            default=3,
+            help="Retries of LLM requests failing with a timeout, a dropped connection, 429 or 5xx. Other errors are not retried."
+        )
+        self.parser.add_argument(
+            "--retry_backoff",
+            type=float,
+            default=1.0,
+            help="Seconds of backoff before the first retry, doubled with full jitter for each further retry. A Retry-After from the service takes precedence."
+        )
+        self.parser.add_argument(
+            "--hedge_percentile",
+            type=float,
+            default=None,
+            help="Send a duplicate of requests slower than this latency percentile, e.g. 95, and keep the first answer. "
+                 "Cuts tail latency at the cost of extra tokens. Off by default."
+        )
+        self.parser.add_argument(
+            "--transport",
+            type=str,
+            choices=["http", "openai"],
+            default="http",
+            help="LLM backend: 'http' uses a pooled async HTTP client, 'openai' runs the openai client on a thread pool."
+        )
+        self.parser.add_argument(
+            "--deployments",
+            type=str,
+            default=None,
+            help="JSON file listing several deployments and their quotas to spread requests across, "
+                 "defaults to the file named by azure_openai_deployments in llm.env. Requires the http transport."
+        )
+        self.parser.add_argument(
+            "--pool_size",
+            type=int,
+            default=100,
+            help="Maximum number of pooled HTTP connections to the LLM endpoint."
+        )
+        self.parser.add_argument(
+            "--connect_timeout",
+            type=float,
+            default=10,
+            help="Seconds allowed to connect to the LLM endpoint."
+        )
+        self.parser.add_argument(
+            "--request_timeout",
+            type=float,
+            default=120,
+            help="Seconds allowed for a single LLM request."
+        )
+        self.parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="Stream completions and save or execute each code block as soon as it is generated."
+        )
+        self.parser.add_argument(
+            "--max_workers",
+            type=int,
+            default=None,
+            help="Maximum number of code blocks executed in parallel. Defaults to the CPU count."
+        )
+        self.parser.add_argument(
+            "--exec_timeout",
+            type=float,
+            default=60,
+            help="Wall clock and CPU seconds allowed per executed code block."
+        )
+        self.parser.add_argument(
+            "--exec_memory_mb",
+            type=int,
+            default=None,
+            help="Address space limit per executed code block in MB. No limit by default, as runtimes such as the JVM or node "
+                 "reserve large virtual address ranges."
+        )
+        self.parser.add_argument(
+            "--warm_runners",
+            type=int,
+            default=0,
+            help="Number of pre-forked, pre-warmed Python workers used to run python code blocks. 0 starts a new interpreter per block."
+        )
+        self.parser.add_argument(
+            "--exec-cache",
+            dest="exec_cache",
+            action=argparse.BooleanOptionalAction,
+            default=True,
+            help="Reuse stored results for code blocks already executed with the same interpreter. "
+                 "Use --no-exec-cache to always execute, e.g. for non-deterministic code."
+        )
+        self.parser.add_argument(
+            "--exec-cache-dir",
+            dest="exec_cache_dir",
+            type=str,
+            default=".chatops_cache/executions",
+            help="Folder used to store cached execution results."
+        )
+        self.parser.add_argument(
+            "--exec-cache-failures",
+            dest="exec_cache_failures",
+            action="store_true",
+            help="Also cache failed runs of code blocks. By default only completed runs are cached, "
+                 "so blocks failing on a missing dependency or flaky resource are executed again."
+        )
+        self.parser.add_argument(
+            "--plan-file",
+            dest="plan_file",
+            type=str,
+            default=None,
+            help="Plan file to execute. When the file exists its precomputed messages are replayed without reading data files; "
+                 "otherwise the tasks are planned and the plan is saved to it."
+        )
+        self.parser.add_argument(
+            "--context_tokens",
+            type=int,
+            default=None,
+            help="Context window of the deployment in tokens. Previous completions sent to refining roles are trimmed to fit. "
+                 "Defaults to the window of the model."
+        )
+        self.parser.add_argument(
+            "--headless",
+            action="store_true",
+            help="Log plain lines instead of the interactive loader and logo. Applied automatically when output is not a terminal."
+        )
+        self.parser.add_argument(
+            "--progress_fps",
+            type=float,
+            default=4,
+            help="Maximum redraws per second of the progress line. Headless runs print a plain line at most every 2 seconds."
+        )
+        self.parser.add_argument(
+            "--trace_file",
+            type=str,
+            default=None,
+            help="Record spans of planning, queueing, requests, parsing and execution and write them to this file as a Chrome trace "
+                 "(open it in chrome://tracing or ui.perfetto.dev)."
+        )
+
+        self.parser.add_argument(
+            "--daemon-socket",
+            dest="daemon_socket",
+            type=str,
+            default=None,
+            help="Submit the run to a ChatOps daemon listening on this Unix socket path or localhost host:port instead of running it in this process. "
+                 "All outputs of the run are processed; --stream and --output_index are not supported by the daemon."
+        )
+
+        subparsers = self.parser.add_subparsers(dest="command")
+        batch_parser = subparsers.add_parser(
+            "batch",
+            help="Run every job of a JSONL manifest through one shared scheduler, response cache and executor. "
+                 "Options before 'batch' apply to all jobs."
+        )
+        batch_parser.add_argument(
+            "manifest",
+            type=str,
+            help="JSONL file with one job per line, e.g. "
+                 '{"id": "bot-1", "project_name": "bot", "objective": "...", "tasks": [["Task1", "Data1"]], "output_override": ["hello_world.py", "python"]}'
+        )
+        batch_parser.add_argument(
+            "--state-file",
+            dest="state_file",
+            type=str,
+            default=None,
+            help="JSONL file recording finished jobs. Completed jobs are skipped when the batch runs again. Defaults to <manifest>.state.jsonl"
+        )
+        batch_parser.add_argument(
+            "--report",
+            type=str,
+            default=None,
+            help="Summary report written when the batch finishes. Defaults to <manifest>.report.json"
+        )
+        batch_parser.add_argument(
+            "--max_jobs",
+            type=int,
+            default=4,
+            help="Jobs planned and processed concurrently. LLM requests of all jobs share the --max_in_flight and rate limits."
+        )
+        daemon_parser = subparsers.add_parser(
+            "daemon",
+            help="Serve jobs on --daemon-socket, keeping configurations, encoders, HTTP connections and warm runners resident. "
+                 f"Listens on {default_address()} by default. Options before 'daemon' configure the shared limits."
+        )
+        daemon_parser.add_argument(
+            "--max_jobs",
+            type=int,
+            default=4,
+            help="Jobs planned and processed concurrently across all clients."
+        )
+        daemon_parser.add_argument(
+            "--status",
+            action="store_true",
+            help="Print the status of the running daemon instead of starting one."
+        )
+        daemon_parser.add_argument(
+            "--stop",
+            action="store_true",
+            help="Stop the running daemon."
+        )
         self.args = self.parser.parse_args()
 
+    def build_transport(self):
+        deployments = self.init.load_deployments(self.args.deployments) if self.args.deployments else self.init.deployments
+        if self.args.transport == "openai":
+            if deployments:
+                logging.warning("The openai transport uses a single deployment, pass --transport http to spread requests across the configured deployments")
+            self.init.configure_openai()
+            return OpenAITransport(self.init.model_name)
+        if deployments:
+            return DeploymentRouter.from_config(
+                deployments,
+                pool_size=self.args.pool_size,
+                connect_timeout=self.args.connect_timeout,
+                request_timeout=self.args.request_timeout
+            )
+        return AzureHTTPTransport(
+            endpoint=self.init.azure_openai_endpoint,
+            api_key=self.init.azure_openai_key,
+            api_version=self.init.azure_openai_api_version,
+            deployment=self.init.model_name,
+            pool_size=self.args.pool_size,
+            connect_timeout=self.args.connect_timeout,
+            request_timeout=self.args.request_timeout
+        )
+
     def parse_output_override(self, output_override):
         if len(output_override) != 2:
             raise ValueError("Output override must contain both output file and app type.")
@@ -80,29 +410,172 @@ class CLI:
         output_file, output_app_type = output_override
         return output_file, output_app_type
 
+    def is_client(self):
+        if self.args.command == "daemon":
+            return self.args.status or self.args.stop
+        return self.args.command is None and self.args.daemon_socket is not None
+
     def main(self):
-        with loader_context(message="Initializing...", timeout=0.1):
-            if self.args.data_file is not None:
-                self.load_tasks_and_data()
+        if self.is_client():
+            return self.run_client()
+        try:
+            if self.args.command == "batch":
+                return self.run_batch()
+            if self.args.command == "daemon":
+                return self.run_daemon()
+            return self.run_project()
+        finally:
+            if self.args.trace_file is not None:
+                tracer.export(self.args.trace_file)
+
+    def run_project(self):
+        with loader_context(message="Initializing...", timeout=0.1, headless=self.headless):
+            if self.args.plan_file is not None and os.path.isfile(self.args.plan_file):
+                if self.args.tasks_and_data or self.args.data_file is not None:
+                    logging.warning(f"Executing plan file {self.args.plan_file}, the tasks passed on the command line are ignored")
+                self.prompt_manager.load_plan(self.args.plan_file)
             else:
-                if len(self.args.tasks_and_data) % 2 != 0:
-                    logging.info("Error: Pairs of task and data values are required.")
-                    sys.exit(1)
+                if self.args.data_file is not None:
+                    self.load_tasks_and_data()
+                else:
+                    if len(self.args.tasks_and_data) % 2 != 0:
+                        logging.info("Error: Pairs of task and data values are required.")
+                        sys.exit(1)
 
-                self.load_tasks_and_data()
+                    self.load_tasks_and_data()
 
-            plan_result = self.prompt_manager.plan()
+                plan_result = self.prompt_manager.plan()
+                if self.args.plan_file is not None:
+                    self.prompt_manager.save_plan(self.args.plan_file)
 
-        with loader_context(message="Processing output...", timeout=0.1):
+            incremental = self.build_incremental()
+            if incremental is not None:
+                incremental.prepare()
+
+        with ProgressRenderer(self.progress, desc="Processing output...", fps=self.args.progress_fps, plain=self.headless):
             self.prompt_manager.main()
+            if isinstance(self.transport, DeploymentRouter):
+                for stats in self.transport.stats():
+                    logging.info(f"Deployment {stats['name']}: {stats['requests']} request(s), {stats['throttles']} throttled, "
+                                 f"{stats['failures']} failed, latency {stats['latency']}s")
+
+            # Streamed code blocks are processed while the completions are generated
+            if self.args.stream:
+                self.stream_processor.publish()
+                return
 
             # Parse output_override and pass to process_output
             output_override = self.parse_output_override(self.args.output_override)
+            if incremental is not None:
+                processor = self.build_processor()
+                statuses = incremental.process(processor, *output_override)
+                processor.publish()
+                incremental.record(processor)
+                logging.info(f"Code blocks: {dict(statuses)}")
+                return
             self.process_output(
                 output_index=self.args.output_index,
                 output_override=output_override
             )
 
+    def build_incremental(self):
+        if not self.args.incremental:
+            return None
+        if self.args.stream:
+            logging.warning("--incremental is not supported with --stream, regenerating every task")
+            return None
+        return IncrementalBuild(
+            self.prompt_manager,
+            ProjectManifest(self.init.output_folder, self.args.project_name),
+            extra=[self.args.output_override, self.args.no_testing]
+        )
+
+    def build_batch_runner(self, manifest=None):
+        from src.chatops.Batch import BatchRunner
+
+        return BatchRunner(
+            manifest,
+            self.init.model_name,
+            self.init.prompt_template,
+            self.init.output_folder,
+            response_cache=self.response_cache,
+            scheduler=self.scheduler,
+            transport=self.transport,
+            executor=self.executor,
+            execution_cache=self.execution_cache,
+            state_path=getattr(self.args, "state_file", None),
+            report_path=getattr(self.args, "report", None),
+            max_jobs=self.args.max_jobs,
+            context_tokens=self.args.context_tokens,
+            retry_engine=self.retry_engine,
+            candidates=self.args.candidates,
+            candidate_check=self.build_candidate_check(),
+            candidate_temperature=self.args.candidate_temperature
+        )
+
+    def run_batch(self):
+        runner = self.build_batch_runner(self.args.manifest)
+        try:
+            with ProgressRenderer(self.progress, desc="Running batch...", fps=self.args.progress_fps, plain=self.headless):
+                report = runner.run()
+        finally:
+            self.executor.shutdown()
+        if report['failed']:
+            sys.exit(1)
+
+    def run_daemon(self):
+        from src.chatops.Daemon import ChatOpsDaemon
+        from src.chatops.TokenCounter import token_counter
+
+        # Load the encoder before the first job arrives
+        token_counter.encoding_for("gpt-3.5-turbo")
+        daemon = ChatOpsDaemon(self.args.daemon_socket or default_address(), self.build_batch_runner(), max_jobs=self.args.max_jobs)
+        try:
+            with ProgressRenderer(self.progress, desc="Serving jobs...", fps=self.args.progress_fps, plain=self.headless):
+                daemon.run()
+        finally:
+            self.executor.shutdown()
+
+    def build_job(self):
+        """
+        Builds a daemon job from the command line, data files are read here and sent inline.
+        """
+        if len(self.args.tasks_and_data) % 2 != 0:
+            logging.info("Error: Pairs of task and data values are required.")
+            sys.exit(1)
+        tasks = []
+        for i in range(0, len(self.args.tasks_and_data), 2):
+            task_name, data_or_file = self.args.tasks_and_data[i], self.args.tasks_and_data[i + 1]
+            data = self.load_data_from_file(data_or_file) if os.path.isfile(data_or_file) else data_or_file
+            tasks.append([task_name, data])
+
+        job = {
+            'project_name': self.args.project_name,
+            'objective': self.args.objective_name,
+            'tasks': tasks,
+            'overwrite_project': self.args.overwrite_project,
+            'no_testing': self.args.no_testing
+        }
+        output_file, output_app_type = self.parse_output_override(self.args.output_override)
+        if output_file is not None or output_app_type is not None:
+            job['output_override'] = [output_file, output_app_type]
+        if self.args.plan_file is not None:
+            job['plan_file'] = os.path.abspath(self.args.plan_file)
+        return job
+
+    def run_client(self):
+        try:
+            if self.args.command == "daemon":
+                response = self.client.shutdown() if self.args.stop else self.client.status()
+            else:
+                response = self.client.submit(self.build_job())
+        except (ConnectionError, ValueError) as e:
+            logging.error(e)
+            sys.exit(1)
+        print(json.dumps(response, indent=4))
+        if response['event'] == 'error' or response.get('status') == 'failed':
+            sys.exit(1)
+
     def load_data_from_file(self, file_path):
         try:
             file_path = os.path.normpath(file_path)
@@ -127,36 +600,62 @@ class CLI:
             self.prompt_manager.add_task(task_name, data)
 
     def process_output(self, output_index=None, output_override=None):
-        outputs = list(self.prompt_manager.tmp.items())
+        # Completions are read from the result store one at a time
+        completions = self.prompt_manager.completions
 
-        if str(output_index).lower() == "all":
-            for _, output in outputs:
-                self._process_output(output, output_override=output_override)
-        elif output_index is not None:
+        if output_index is None or str(output_index).lower() == "all":
+            for record in completions:
+                self._process_output(record['output'], output_override=output_override)
+        else:
             try:
-                _, output = outputs[output_index]
-            except IndexError:
+                record = completions[int(output_index)]
+            except (IndexError, ValueError):
                 logging.error(f"Invalid output index {output_index}. Processing the last output by default.")
-                _, output = outputs[-1]
-            self._process_output(output, output_override=output_override)
-        else:
-            for _, output in outputs:
-                self._process_output(output, output_override=output_override)
+                record = completions[-1]
+            self._process_output(record['output'], output_override=output_override)
 
-    def _process_output(self, output, output_override=None):
-        processor = CodeProcessor(
+    def build_candidate_check(self):
+        if self.args.candidates <= 1:
+            return None
+        return CandidateChecker(self.executor, self.execution_cache, no_test=self.args.no_testing)
+
+    def build_runner_pool(self):
+        if not self.args.warm_runners:
+            return None
+        return RunnerPool(
+            size=self.args.warm_runners,
+            timeout=self.args.exec_timeout,
+            memory_limit_mb=self.args.exec_memory_mb
+        )
+
+    def build_processor(self):
+        return CodeProcessor(
             output_project=self.args.project_name,
             output_location=self.init.output_folder,
             overwrite_project=self.args.overwrite_project,
-            no_test=self.args.no_testing
+            no_test=self.args.no_testing,
+            executor=self.executor,
+            execution_cache=self.execution_cache,
+            result_store=self.execution_results
         )
 
+    def process_code_block(self, file_name, block):
+        """
+        Saves or executes a single streamed code block in the project folder of this run.
+        """
+        output_file, output_app_type = self.parse_output_override(self.args.output_override)
+        for key, result in self.stream_processor.iter_code_blocks({file_name: block}, output_file=output_file, output_app_type=output_app_type, publish=False):
+            logging.info(f"{key}: {json.dumps(result, indent=4)}")
+
+    def _process_output(self, output, output_override=None):
+        processor = self.build_processor()
+
         # Pass output_override to the execute_code_blocks method
         code_blocks = processor.parse_code_blocks(output)
         logging.info(code_blocks)
         print('---' , output_override[0],output_override[1])
-        execution_results = processor.execute_code_blocks(code_blocks,output_file=output_override[0] ,output_app_type= output_override[1])
-        logging.info(execution_results)
+        for key, result in processor.iter_code_blocks(code_blocks,output_file=output_override[0] ,output_app_type= output_override[1]):
+            logging.info(f"{key}: {json.dumps(result, indent=4)}")
 
 if __name__ == "__main__":
     cli = CLI()
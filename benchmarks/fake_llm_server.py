@@ -0,0 +1,140 @@
+"""
+Local, deterministic stand-in for the Azure OpenAI chat completions endpoint.
+
+Latency, completion token rate, error rate and output size are configurable, and errors are
+drawn from a seeded generator so two runs with the same settings fail the same requests.
+
+Usage:
+    python benchmarks/fake_llm_server.py --port 8080 --latency 0.2 --token_rate 500 --error_rate 0.05 --blocks 4
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+DEFAULT_OUTPUT = """#~Folder_Name:ChatOps/Benchmark~
+#~File_Name:Hello_World~
+```python
+print("Hello, World!")
+```
+"""
+
+
+def make_output(blocks: int = 1, lines: int = 1) -> str:
+    """
+    Builds a completion with the given number of python code blocks of the given number of lines.
+    """
+    sections = []
+    for block in range(blocks):
+        body = "\n".join(f'print("block {block} line {line}")' for line in range(lines))
+        sections.append(f"#~Folder_Name:ChatOps/Benchmark~\n#~File_Name:Block_{block}~\n```python\n{body}\n```\n")
+    return "\n".join(sections)
+
+
+def create_app(latency: float = 0.05, output: str = DEFAULT_OUTPUT, chunk_size: int = 8, chunk_delay: float = 0.0,
+               token_rate: float = None, error_rate: float = 0.0, seed: int = 0) -> web.Application:
+    """
+    Builds an application answering every deployment with a fixed completion after a fixed latency.
+    Streaming requests receive the completion as server-sent events of chunk_size characters.
+
+    Args:
+        latency (float): Seconds before the first byte of every answer.
+        output (str): Completion returned for every request.
+        chunk_size (int): Characters per streamed chunk.
+        chunk_delay (float): Seconds between streamed chunks, derived from token_rate when set.
+        token_rate (float): Completion tokens generated per second, None for instant generation.
+        error_rate (float): Fraction of requests answered with 429 or 500.
+        seed (int): Seed of the error generator.
+    """
+    completion_tokens = len(output.split())
+    generation_time = completion_tokens / token_rate if token_rate else 0.0
+    if token_rate:
+        chunk_delay = generation_time / max(1, -(-len(output) // chunk_size))
+    errors = random.Random(seed)
+    stats = {"requests": 0, "errors": 0}
+
+    async def stream_completion(request, deployment):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for start in range(0, len(output), chunk_size):
+            chunk = {
+                "object": "chat.completion.chunk",
+                "model": deployment,
+                "choices": [{"index": 0, "delta": {"content": output[start:start + chunk_size]}, "finish_reason": None}]
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            if chunk_delay:
+                await asyncio.sleep(chunk_delay)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def chat_completions(request):
+        body = await request.json()
+        stats["requests"] += 1
+        await asyncio.sleep(latency)
+        if error_rate and errors.random() < error_rate:
+            stats["errors"] += 1
+            if errors.random() < 0.5:
+                return web.json_response({"error": {"code": "429", "message": "Rate limit is exceeded."}}, status=429, headers={"Retry-After": "1"})
+            return web.json_response({"error": {"code": "InternalServerError", "message": "The server had an error."}}, status=500)
+        if body.get("stream"):
+            return await stream_completion(request, request.match_info["deployment"])
+        await asyncio.sleep(generation_time)
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in body.get("messages", []))
+        return web.json_response({
+            "id": "chatcmpl-standin",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.match_info["deployment"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": output}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        })
+
+    app = web.Application()
+    app["stats"] = stats
+    app.router.add_post("/openai/deployments/{deployment}/chat/completions", chat_completions)
+    return app
+
+
+async def start_server(host: str = "127.0.0.1", port: int = 0, **kwargs):
+    """
+    Starts the stand-in server on the running loop.
+
+    Returns:
+        tuple: (runner, base_url), call runner.cleanup() to stop the server. runner.app["stats"] counts requests and errors.
+    """
+    runner = web.AppRunner(create_app(**kwargs))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in chat completions server")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds to wait before answering.")
+    parser.add_argument("--token_rate", type=float, default=None, help="Completion tokens generated per second.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered with 429 or 500.")
+    parser.add_argument("--blocks", type=int, default=1, help="Code blocks per completion.")
+    parser.add_argument("--lines", type=int, default=1, help="Lines per code block.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the error generator.")
+    args = parser.parse_args()
+    app = create_app(
+        latency=args.latency,
+        output=make_output(args.blocks, args.lines),
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measures CLI cold start and checks that `--help` does not import the heavy dependencies.
+
+Each run starts a new interpreter, so the numbers include interpreter start up. Exits with
+status 1 when the median start up exceeds --max_ms or a heavy module gets imported, so it
+can guard against regressions in CI.
+
+Usage:
+    python benchmarks/import_benchmark.py --runs 10 --max_ms 300
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CLI = os.path.join(ROOT, "ChatOps.py")
+
+# Modules that must stay out of the `--help` path
+HEAVY_MODULES = ("openai", "tiktoken", "pydantic", "curses", "aiohttp", "dotenv")
+
+# Runs the CLI like `python ChatOps.py --help` and reports the heavy modules it loaded on exit
+PROBE = """
+import atexit, runpy, sys
+heavy = {heavy!r}
+atexit.register(lambda: print("LOADED=" + ",".join(sorted(m for m in heavy if m in sys.modules)), file=sys.stderr))
+sys.argv = [{cli!r}, "--help"]
+sys.path.insert(0, {root!r})
+runpy.run_path({cli!r}, run_name="__main__")
+"""
+
+
+def cold_start(args):
+    start = perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return perf_counter() - start
+
+
+def loaded_modules():
+    probe = PROBE.format(heavy=HEAVY_MODULES, cli=CLI, root=ROOT)
+    completed = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    for line in completed.stderr.splitlines():
+        if line.startswith("LOADED="):
+            return [name for name in line[len("LOADED="):].split(",") if name]
+    raise RuntimeError(f"Probe did not report loaded modules:\n{completed.stderr}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChatOps CLI cold start")
+    parser.add_argument("--runs", type=int, default=10, help="Cold starts measured per case.")
+    parser.add_argument("--max_ms", type=float, default=None, help="Fail when the median `--help` start up exceeds this many milliseconds.")
+    args = parser.parse_args()
+
+    baseline = statistics.median(cold_start(["-c", "pass"]) for _ in range(args.runs)) * 1000
+    help_start = statistics.median(cold_start([CLI, "--help"]) for _ in range(args.runs)) * 1000
+    print(f"{'case':>20} {'p50 (ms)':>10}")
+    print(f"{'python -c pass':>20} {baseline:>10.2f}")
+    print(f"{'ChatOps.py --help':>20} {help_start:>10.2f}")
+
+    failed = False
+    loaded = loaded_modules()
+    if loaded:
+        print(f"Heavy modules imported by --help: {', '.join(loaded)}")
+        failed = True
+    if args.max_ms is not None and help_start > args.max_ms:
+        print(f"--help start up {help_start:.2f} ms exceeds the {args.max_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares CodeProcessor.parse_code_blocks with the previous two pass regex parser
+on multi-megabyte synthetic completions.
+
+Usage:
+    python benchmarks/parser_benchmark.py --sizes 1 4 16
+"""
+import argparse
+import os
+import re
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.chatops.OutputChain import CodeProcessor
+
+FUNCTION = '''
+def handler_{index}_{line}(event):
+    """Return the event with a status code."""
+    return {{"status": 200, "body": event, "line": {line}}}
+'''
+
+
+def make_block(index, functions):
+    body = "".join(FUNCTION.format(index=index, line=line) for line in range(functions))
+    return f"#~Folder_Name:ChatOps/Benchmark~\n#~File_Name:module_{index}~\n```python{body}```\n"
+
+
+def regex_parse(input_string):
+    code_dict = {}
+    file_name_matches = re.findall(r'~File_Name:(.*?)~', input_string)
+    code_matches = re.findall(r'```(\S+)\s*([\s\S]*?)```', input_string, re.DOTALL)
+    for file_name, (app_type, code_content) in zip(file_name_matches, code_matches):
+        code_dict[file_name] = {'app_type': app_type, 'code_content': code_content.strip()}
+    return code_dict
+
+
+def synthetic_completion(megabytes, functions, unterminated=False):
+    blocks = []
+    size = 0
+    index = 0
+    while size < megabytes * 1024 * 1024:
+        block = make_block(index, functions)
+        blocks.append(block)
+        size += len(block)
+        index += 1
+    text = "Here is the project.\n" + "".join(blocks)
+    if unterminated:
+        # A truncated completion leaves a minified one line block open
+        text += "#~File_Name:truncated~\n```" + '{"key":"value",' * 2000
+    return text
+
+
+def timed(function, text):
+    start = perf_counter()
+    result = function(text)
+    return perf_counter() - start, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark code block parsing")
+    parser.add_argument("--sizes", type=float, nargs='+', default=[1, 4, 16], help="Completion sizes in megabytes.")
+    parser.add_argument("--functions", type=int, default=50, help="Functions per generated file, controls the block size.")
+    args = parser.parse_args()
+
+    # Bypass __init__ so no project folder is resolved
+    processor = CodeProcessor.__new__(CodeProcessor)
+
+    print(f"{'MB':>6} {'case':>12} {'regex (s)':>10} {'blocks':>7} {'parser (s)':>10} {'blocks':>7}")
+    for megabytes in args.sizes:
+        for case, unterminated in (("complete", False), ("unterminated", True)):
+            text = synthetic_completion(megabytes, args.functions, unterminated)
+            regex_time, regex_blocks = timed(regex_parse, text)
+            parser_time, parser_blocks = timed(processor.parse_code_blocks, text)
+            print(f"{megabytes:>6} {case:>12} {regex_time:>10.4f} {regex_blocks:>7} {parser_time:>10.4f} {parser_blocks:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmarks Prompt_Manager.plan for 1, 10 and 100 tasks.
+
+Usage:
+    python benchmarks/plan_benchmark.py --data_size 20000 --repeat 3
+"""
+import argparse
+import logging
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from configs.Get_Configs import Bootstrap
+from src.chatops.ChatChain import Prompt_Manager
+from src.chatops.TokenCounter import TokenCounter
+
+
+def run_plan(roles, task_count, data, fresh_counter):
+    prompt_manager = Prompt_Manager("bench", "You are a helpful AI Assistant.", [], "", roles)
+    if fresh_counter:
+        prompt_manager.token_counter = TokenCounter()
+    for i in range(task_count):
+        prompt_manager.add_task(f"Task {i}: write a hello world program", data)
+    start = perf_counter()
+    prompt_manager.plan()
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Prompt_Manager.plan")
+    parser.add_argument("--data_size", type=int, default=20000, help="Characters of task data per task.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per task count.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    roles = Bootstrap.load_config(os.path.join(os.path.dirname(__file__), '..', 'configs', 'prompt_roles.json'))
+    data = ("def handler(event):\n    return {'status': 200, 'body': event}\n" * args.data_size)[:args.data_size]
+
+    print(f"{'tasks':>6} {'cold (s)':>10} {'warm (s)':>10}")
+    for task_count in (1, 10, 100):
+        cold = min(run_plan(roles, task_count, data, True) for _ in range(args.repeat))
+        warm = min(run_plan(roles, task_count, data, False) for _ in range(args.repeat))
+        print(f"{task_count:>6} {cold:>10.4f} {warm:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
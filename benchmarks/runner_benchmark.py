@@ -0,0 +1,63 @@
+"""
+Compares per-block latency of a new interpreter per block with the warm runner pool.
+
+Usage:
+    python benchmarks/runner_benchmark.py --blocks 50 --workers 4
+"""
+import argparse
+import os
+import statistics
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.chatops.Executor import CodeExecutor
+from src.chatops.RunnerPool import RunnerPool
+
+BLOCKS = {
+    "hello": 'print("Hello, World!")',
+    "imports": 'import json, asyncio, unittest, logging\nprint(json.dumps({"ok": True}))',
+    "unittest": '''import unittest
+
+class TestMath(unittest.TestCase):
+    def test_add(self):
+        self.assertEqual(1 + 1, 2)
+
+unittest.main(argv=["test"], exit=False)
+''',
+}
+
+
+def latencies(run, code, blocks):
+    samples = []
+    for _ in range(blocks):
+        start = perf_counter()
+        status, result = run("python", code)
+        samples.append(perf_counter() - start)
+        assert status == "completed", result
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark warm runner pool against a new interpreter per block")
+    parser.add_argument("--blocks", type=int, default=50, help="Blocks executed per case.")
+    parser.add_argument("--workers", type=int, default=2, help="Warm runner pool size.")
+    args = parser.parse_args()
+
+    cold = CodeExecutor(max_workers=1)
+    pool = RunnerPool(size=args.workers)
+    warm = CodeExecutor(max_workers=1, runner_pool=pool)
+
+    print(f"{'block':>10} {'subprocess p50 (ms)':>20} {'warm p50 (ms)':>14} {'speedup':>8}")
+    try:
+        for name, code in BLOCKS.items():
+            cold_p50 = statistics.median(latencies(cold.run, code, args.blocks)) * 1000
+            warm_p50 = statistics.median(latencies(warm.run, code, args.blocks)) * 1000
+            print(f"{name:>10} {cold_p50:>20.2f} {warm_p50:>14.2f} {cold_p50 / warm_p50:>7.1f}x")
+    finally:
+        warm.shutdown()
+
+
+if __name__ == "__main__":
+    main()
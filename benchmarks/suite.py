@@ -0,0 +1,234 @@
+"""
+End-to-end benchmark suite running ChatOps against the local stand-in chat completions server.
+
+Measures Prompt_Manager.plan, Prompt_Manager.async_main throughput at several concurrency
+levels, CodeProcessor.parse_code_blocks and CodeProcessor.execute_code_blocks, and writes the
+results as JSON. Pass the results of an earlier commit with --compare to print the change of
+every metric and exit with status 1 when one regressed by more than --threshold percent.
+
+Usage:
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --output results.json --compare baseline.json --threshold 10
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_llm_server import make_output, start_server
+from configs.Get_Configs import Bootstrap
+from src.chatops.ChatChain import Prompt_Manager
+from src.chatops.Executor import CodeExecutor
+from src.chatops.OutputChain import CodeProcessor
+from src.chatops.Scheduler import RateLimitScheduler
+from src.chatops.Transport import AzureHTTPTransport
+
+API_VERSION = "2023-05-15"
+ROLES = Bootstrap.load_config(os.path.join(os.path.dirname(__file__), '..', 'configs', 'prompt_roles.json'))
+
+
+def result(name, unit, samples, lower_is_better=True, **params):
+    return {
+        "name": name,
+        "params": params,
+        "unit": unit,
+        "value": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "samples": len(samples),
+        "lower_is_better": lower_is_better
+    }
+
+
+def make_manager(task_count, data, transport=None, scheduler=None):
+    manager = Prompt_Manager("bench", "You are a helpful AI Assistant.", [], "", ROLES, transport=transport, scheduler=scheduler)
+    for i in range(task_count):
+        manager.add_task(f"Task {i}: write a hello world program", data)
+    return manager
+
+
+def bench_plan(args):
+    data = ("def handler(event):\n    return {'status': 200, 'body': event}\n" * args.data_size)[:args.data_size]
+    results = []
+    for task_count in (1, 10, 100):
+        samples = []
+        for _ in range(args.repeat):
+            manager = make_manager(task_count, data)
+            start = perf_counter()
+            manager.plan()
+            samples.append(perf_counter() - start)
+        results.append(result("plan", "s", samples, tasks=task_count, data_size=args.data_size))
+    return results
+
+
+async def bench_async_main(args):
+    output = make_output(args.blocks, args.lines)
+    runner, base_url = await start_server(latency=args.latency, output=output, token_rate=args.token_rate, error_rate=args.error_rate, seed=args.seed)
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            samples = []
+            failures = 0
+            for _ in range(args.repeat):
+                transport = AzureHTTPTransport(base_url, "standin", API_VERSION, "bench", pool_size=concurrency)
+                manager = make_manager(args.tasks, "hello", transport=transport, scheduler=RateLimitScheduler(max_in_flight=concurrency))
+                manager.plan()
+                start = perf_counter()
+                try:
+                    # Completions are printed as they finish, keep them out of the report
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        await manager.async_main()
+                    requests = len(manager.completions)
+                    samples.append(requests / (perf_counter() - start))
+                except Exception as e:
+                    logging.warning(f"async_main failed at concurrency {concurrency}: {e}")
+                    failures += 1
+                finally:
+                    await transport.close()
+            if samples:
+                entry = result("async_main", "req/s", samples, lower_is_better=False, concurrency=concurrency, tasks=args.tasks,
+                               latency=args.latency, token_rate=args.token_rate, error_rate=args.error_rate)
+                entry["failures"] = failures
+                results.append(entry)
+    finally:
+        await runner.cleanup()
+    return results
+
+
+def bench_parse(args):
+    results = []
+    processor = CodeProcessor(output_location=tempfile.mkdtemp(prefix="chatops-bench-"))
+    for blocks in (1, 10, 100):
+        output = make_output(blocks, args.lines)
+        samples = []
+        for _ in range(args.repeat):
+            start = perf_counter()
+            processor.parse_code_blocks(output)
+            samples.append(perf_counter() - start)
+        results.append(result("parse_code_blocks", "s", samples, blocks=blocks, lines=args.lines, characters=len(output)))
+    return results
+
+
+def bench_execute(args):
+    results = []
+    output_location = tempfile.mkdtemp(prefix="chatops-bench-")
+    executor = CodeExecutor(max_workers=args.exec_workers)
+    try:
+        for blocks in (1, 10, 50):
+            samples = []
+            for _ in range(args.repeat):
+                processor = CodeProcessor(output_location=output_location, executor=executor)
+                code_blocks = processor.parse_code_blocks(make_output(blocks, args.lines))
+                start = perf_counter()
+                processor.execute_code_blocks(code_blocks, use_cache=False)
+                samples.append(perf_counter() - start)
+            results.append(result("execute_code_blocks", "s", samples, blocks=blocks, workers=executor.max_workers))
+    finally:
+        executor.shutdown()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def key_of(entry):
+    return entry["name"], json.dumps(entry["params"], sort_keys=True)
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change of every metric against a baseline and returns the regressed metrics.
+    """
+    previous = {key_of(entry): entry for entry in baseline["results"]}
+    regressions = []
+    print(f"\n{'benchmark':<60} {'baseline':>12} {'current':>12} {'change':>9}")
+    for entry in results:
+        before = previous.get(key_of(entry))
+        if before is None or not before["value"]:
+            continue
+        change = (entry["value"] - before["value"]) / before["value"] * 100
+        worse = change if entry["lower_is_better"] else -change
+        label = f"{entry['name']} {json.dumps(entry['params'], sort_keys=True)}"[:60]
+        flag = " !" if worse > threshold else ""
+        print(f"{label:<60} {before['value']:>12.4f} {entry['value']:>12.4f} {change:>+8.1f}%{flag}")
+        if worse > threshold:
+            regressions.append(entry)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChatOps end to end against a stand-in LLM backend")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="File the JSON results are written to.")
+    parser.add_argument("--compare", type=str, default=None, help="Results of an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change counted as a regression.")
+    parser.add_argument("--only", nargs="+", choices=["plan", "async_main", "parse", "execute"], default=None, help="Benchmarks to run, all by default.")
+    parser.add_argument("--repeat", type=int, default=3, help="Samples per measurement, the median is reported.")
+    parser.add_argument("--data_size", type=int, default=20000, help="Characters of task data per task for plan().")
+    parser.add_argument("--tasks", type=int, default=50, help="Tasks per async_main run, each runs every prompt role.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="max_in_flight values for async_main.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in server latency in seconds.")
+    parser.add_argument("--token_rate", type=float, default=None, help="Stand-in completion tokens per second.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of stand-in requests answered with 429 or 500.")
+    parser.add_argument("--blocks", type=int, default=2, help="Code blocks per stand-in completion.")
+    parser.add_argument("--lines", type=int, default=20, help="Lines per generated code block.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the stand-in error generator.")
+    parser.add_argument("--exec_workers", type=int, default=None, help="Code executor workers, defaults to the CPU count.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    selected = args.only or ["plan", "async_main", "parse", "execute"]
+    results = []
+    if "plan" in selected:
+        results += bench_plan(args)
+    if "async_main" in selected:
+        results += asyncio.run(bench_async_main(args))
+    if "parse" in selected:
+        results += bench_parse(args)
+    if "execute" in selected:
+        results += bench_execute(args)
+
+    report = {
+        "created": datetime.now().isoformat(),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": vars(args),
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=4)
+
+    print(f"{'benchmark':<60} {'median':>12} {'unit':>6}")
+    for entry in results:
+        label = f"{entry['name']} {json.dumps(entry['params'], sort_keys=True)}"[:60]
+        print(f"{label:<60} {entry['value']:>12.4f} {entry['unit']:>6}")
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Measures chat completions throughput of each transport against the local stand-in server.
+
+Usage:
+    python benchmarks/transport_benchmark.py --requests 500 --concurrency 100 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import openai
+
+from benchmarks.fake_llm_server import start_server
+from src.chatops.Transport import AzureHTTPTransport, OpenAITransport
+
+API_VERSION = "2023-05-15"
+
+
+async def measure(transport, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    messages = [{"role": "user", "content": "write a hello world program"}]
+
+    async def one():
+        async with semaphore:
+            await transport.complete(messages, 0.1)
+
+    start = perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    duration = perf_counter() - start
+    await transport.close()
+    return duration
+
+
+async def run(args):
+    runner, base_url = await start_server(latency=args.latency)
+    try:
+        openai.api_base = base_url
+        openai.api_key = "standin"
+        openai.api_version = API_VERSION
+        openai.api_type = "azure"
+        transports = {
+            "openai": OpenAITransport("bench"),
+            "http": AzureHTTPTransport(base_url, "standin", API_VERSION, "bench", pool_size=args.concurrency),
+        }
+        print(f"{'transport':>10} {'seconds':>10} {'req/s':>10}")
+        for name, transport in transports.items():
+            duration = await measure(transport, args.requests, args.concurrency)
+            print(f"{name:>10} {duration:>10.3f} {args.requests / duration:>10.1f}")
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat completions transports")
+    parser.add_argument("--requests", type=int, default=500, help="Total number of requests.")
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum concurrent requests.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stand-in server latency in seconds.")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
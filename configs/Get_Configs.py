@@ -1,16 +1,25 @@
 import os
 import sys
 import json
-import curses
-import openai
 import logging
 from queue import Queue
 from itertools import cycle
-from time import sleep, time
-from dotenv import load_dotenv
+from time import time
+from functools import lru_cache
 from contextlib import contextmanager
 from threading import Thread, Event
 
+# curses, dotenv and openai are imported where they are used so `--help` and headless runs start fast
+
+
+@lru_cache(maxsize=None)
+def load_logo():
+    """
+    Reads the ChatOps logo once per process.
+    """
+    with open(os.path.abspath(os.path.join(os.path.dirname(__file__), 'cli.txt')), 'r') as file:
+        return file.read()
+
 
 
 
@@ -18,7 +27,7 @@ from threading import Thread, Event
 class Bootstrap:
 
 
-    def __init__(self, prompt_template_file: str = 'prompt_roles.json', output_folder: str = 'outputs', disable_logging: bool = False):
+    def __init__(self, prompt_template_file: str = 'prompt_roles.json', output_folder: str = 'outputs', disable_logging: bool = False, headless: bool = False):
         """
         A class for initializing ChatOps configurations and setting up credentials.
 
@@ -28,6 +37,7 @@ class Bootstrap:
         you can store as many templates as you want just call them by file name
         - output_folder (str): Folder location where to output code to
         - disable_logging (Bool): If specified will not display info logs
+        - headless (Bool): If specified will not print the cli logo
         
         - reads from 4 files :
             - ./env/azure.env (used to configure connectivity to azure cli)
@@ -42,12 +52,15 @@ class Bootstrap:
         - azure_openai_api_type (str): Azure OpenAI API type.
         - support_email (str): Support email address.
         - model_name (str): OpenAI model name.
+        - deployments (list): Deployments listed in the file named by azure_openai_deployments, empty when not set.
         - prompt_template (dict): Loaded prompt templates.
         - output_folder (str): output_folder for code files
 
         Methods:
         - assert_not_empty(value): Asserts that the provided value is not empty and returns it.
         - load_config(file_path): Loads JSON configuration from the specified file path.
+        - configure_openai(): Configures the openai client with the loaded credentials.
+        - load_deployments(file_path): Loads the deployments requests are spread across.
 
         Example usage:
         ```
@@ -61,14 +74,16 @@ class Bootstrap:
         if disable_logging:
             logging.disable(logging.CRITICAL)
         
+        from dotenv import load_dotenv
+
         env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'env', 'llm.env'))
         prompt_template = os.path.abspath(os.path.join(os.path.dirname(__file__), prompt_template_file))
-        logo = open(os.path.abspath(os.path.join(os.path.dirname(__file__), 'cli.txt')),'r')
-        logo = logo.read()
+        logo = load_logo()
         # Configure logging
 
-        print('')
-        print(logo)
+        if not headless:
+            print('')
+            print(logo)
         logging.info('Initializing Application')
         logging.info(' - Loading Configurations')
         
@@ -85,15 +100,62 @@ class Bootstrap:
         self.support_email = self.assert_not_empty(os.getenv("support_email"))
         self.model_name = self.assert_not_empty(os.getenv("model_name"))
         self.cli_logo = logo
-        # Configure OpenAI credentials
+        self.deployments = self.load_deployments(os.getenv("azure_openai_deployments"))
+
+        # Load additional configurations
+        self.prompt_template = self.load_config(prompt_template)
+        logging.info(' - Finished Loading Configurations')
+
+    def configure_openai(self):
+        """
+        Configures the openai client with the loaded credentials. Only needed by the openai transport.
+        """
+        import openai
+
         openai.api_base = self.azure_openai_endpoint
         openai.api_key = self.azure_openai_key
         openai.api_version = self.azure_openai_api_version
         openai.api_type = self.azure_openai_api_type
 
-        # Load additional configurations
-        self.prompt_template = self.load_config(prompt_template)
-        logging.info(' - Finished Loading Configurations')
+    def load_deployments(self, file_path):
+        """
+        Loads the deployments requests are spread across from a JSON file.
+
+        The file holds a list, or {"deployments": [...]}, of entries such as
+        {"name": "eastus", "endpoint": "https://eastus.openai.azure.com", "deployment": "gpt-35-turbo",
+         "api_key_env": "EASTUS_OPENAI_KEY", "tokens_per_minute": 120000, "requests_per_minute": 720}
+        Missing endpoint, api_key, api_version and deployment values default to the llm.env settings.
+        Relative paths are resolved against the current folder, then the env folder.
+
+        Args:
+        - file_path (str): Path to the JSON file, None for no deployments.
+
+        Returns:
+        - deployments (list): Deployments with every connection setting filled in.
+
+        Raises:
+        - ValueError: If the file does not list deployments.
+        """
+        if not file_path:
+            return []
+        if not os.path.isfile(file_path):
+            file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'env', file_path))
+        config = self.load_config(file_path)
+        entries = config.get('deployments') if isinstance(config, dict) else config
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+            raise ValueError(f"{file_path} must list deployments as JSON objects")
+
+        deployments = []
+        for entry in entries:
+            deployment = dict(entry)
+            deployment['endpoint'] = entry.get('endpoint') or self.azure_openai_endpoint
+            deployment['deployment'] = entry.get('deployment') or self.model_name
+            deployment['api_version'] = entry.get('api_version') or self.azure_openai_api_version
+            deployment['api_key'] = entry.get('api_key') or os.getenv(entry.get('api_key_env') or '') or self.azure_openai_key
+            deployment['name'] = entry.get('name') or f"{deployment['endpoint']}/{deployment['deployment']}"
+            deployments.append(deployment)
+        logging.info(f' - Loaded {len(deployments)} deployment(s) from {file_path}')
+        return deployments
 
     def assert_not_empty(self, value):
         """
@@ -129,6 +191,8 @@ class Bootstrap:
 
 class LoaderContext:
     def __enter__(self):
+        import curses
+
         if not hasattr(LoaderContext, 'stdscr'):
             curses.initscr()
             curses.curs_set(0)  # Hide the cursor
@@ -142,10 +206,22 @@ class LoaderContext:
         return LoaderContext.stdscr
 
     def __exit__(self, exc_type, exc_value, tb):
+        import curses
+
         curses.endwin()
 
 @contextmanager
-def loader_context(message="Loading...", timeout=0.1):
+def loader_context(message="Loading...", timeout=0.1, headless=False):
+    """
+    Displays a loader while the block runs. Headless mode, or output that is not a terminal,
+    logs plain lines instead of initializing curses.
+    """
+    if headless or not sys.stdout.isatty():
+        loader = HeadlessLoader(message)
+        with loader:
+            yield loader
+        return
+
     with LoaderContext() as stdscr:
         loader = Loader(stdscr, message, timeout)
         with loader:
@@ -156,10 +232,33 @@ def loader_context(message="Loading...", timeout=0.1):
         loader.print_summary(duration)
 
 
+class HeadlessLoader:
+    """
+    Plain line loader used when curses is not available or not wanted.
+    """
+
+    def __init__(self, desc="Loading..."):
+        self.desc = desc
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time()
+        logging.info(self.desc)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.print_summary(time() - self.start_time)
+
+    def print_summary(self, duration=None):
+        if duration is not None:
+            logging.info(f"{self.desc} Done in {duration:.2f} seconds")
+
+
 class Loader:
     line_number = 1  # Class-level variable to track line number for each instance
 
     def __init__(self, stdscr, desc="Loading...", timeout=0.1):
+        import curses
 
         self.stdscr = stdscr
         self.desc = desc
@@ -173,7 +272,7 @@ class Loader:
         self.last_iteration = False  # Flag to track if this is the last iteration
         self.duration = None  # Track the total duration
         self.done_displayed = False  # Flag to track if "Done!" has been displayed
-        self.logo = open(os.path.abspath(os.path.join(os.path.dirname(__file__), 'cli.txt')),'r').read()
+        self.logo = load_logo()
         self.context_started = False
 
     def start(self):
@@ -185,16 +284,13 @@ class Loader:
         return self
 
     def _animate(self):
-        # Display initial static text only once at the beginning
+        import curses
+
+        # The logo is static, draw it once instead of on every frame
         if not getattr(self, 'initial_text_displayed', False):
-            initial_static_text = self.logo
-            self.stdscr.addstr(0, 0, initial_static_text, curses.A_BOLD)
-            self.stdscr.refresh()
+            self.stdscr.addstr(0, 0, self.logo, curses.A_BOLD)
             self.initial_text_displayed = True
 
-        # Print the static ASCII art
-        self.stdscr.addstr(0, 0, initial_static_text, curses.A_BOLD)
-
         for i, c in enumerate(cycle(self.steps)):
             if self.done_event.is_set():
                 break
@@ -211,13 +307,9 @@ class Loader:
             self.stdscr.addstr(self.instance_line_number + 7, 0, f"{self.desc} {c}", curses.color_pair(color_pair))
 
             self.stdscr.refresh()
-            sleep(self.timeout)
-
-            # Restore the static ASCII art
-            self.stdscr.addstr(0, 0, initial_static_text, curses.A_BOLD)
 
             # Check if done_event is set and break the loop
-            if self.done_event.is_set():
+            if self.done_event.wait(self.timeout):
                 break
 
             # Check if this is the last iteration
@@ -231,6 +323,8 @@ class Loader:
             self.done_displayed = True  # Set the flag to indicate that "Done!" has been displayed
 
     def stop(self):
+        import curses
+
         # Clear the animation line
         self.stdscr.addstr(self.instance_line_number, 0, " " * curses.COLS)
         self.stdscr.refresh()
@@ -244,6 +338,8 @@ class Loader:
         self.stop()
 
     def print_summary(self, duration=None):
+        import curses
+
         if duration is not None:
             # Clear the animation line
             self.stdscr.addstr(self.instance_line_number + 7, 0, " " * curses.COLS)
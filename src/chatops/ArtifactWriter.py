@@ -0,0 +1,318 @@
+import ctypes
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from time import time
+
+
+def _read_umask() -> int:
+    # Linux reports the umask without changing it, elsewhere it is swapped out and back once at import
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+UMASK = _read_umask()
+
+# renameat2 flag swapping two existing paths, and the dirfd resolving relative paths from the cwd
+_RENAME_EXCHANGE = 2
+_AT_FDCWD = -100
+
+
+def _load_renameat2():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (AttributeError, OSError):
+        # glibc before 2.28 and other C libraries without the wrapper
+        return None
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    renameat2.restype = ctypes.c_int
+    return renameat2
+
+
+_renameat2 = _load_renameat2()
+
+
+def exchange(first: str, second: str) -> bool:
+    """
+    Atomically swaps two existing paths with renameat2(RENAME_EXCHANGE).
+
+    Returns:
+        bool: False when the platform, C library, kernel or file system cannot exchange paths.
+    """
+    if _renameat2 is None:
+        return False
+    if _renameat2(_AT_FDCWD, os.fsencode(first), _AT_FDCWD, os.fsencode(second), _RENAME_EXCHANGE) == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP):
+        return False
+    raise OSError(error, os.strerror(error), first, None, second)
+
+
+class ArtifactWriter:
+    """
+    Stages the files of a project version in a temporary folder and publishes them with a rename.
+
+    Overwriting a version swaps the staging and live folders in one renameat2(RENAME_EXCHANGE) on
+    Linux. Elsewhere, or on file systems without exchange support, the live folder is first moved
+    into a .{folder}.retired-* folder and the staging folder renamed in its place: a crash between
+    the two renames leaves no live folder, which the next writer of that folder moves back from
+    the retired folder on construction (see recover).
+
+    File contents are stored once in a content-addressed blob store ({output_location}/.blobs)
+    and hard linked into each version, so files identical across versions cost no extra disk
+    space or write I/O. New content is fsynced in one batch right before publishing, and a crash
+    before publishing leaves the live version folder untouched.
+
+    Blobs are read-only since every version linking them shares the same content: edit a copy of a
+    generated file rather than the file in place. The blob store is never pruned while writing, run
+    collect_garbage after deleting old versions to reclaim the space of content no version links.
+    """
+
+    # Modes applied through the umask, files linked from the blob store are never writable
+    blob_mode = 0o444
+    file_mode = 0o666
+    dir_mode = 0o777
+
+    def __init__(self, output_location: str, folder_name: str, blob_dir: str = None):
+        """
+        Args:
+            output_location (str): Folder holding the project versions.
+            folder_name (str): Name of the version folder to publish, e.g. bot_v3.
+            blob_dir (str): Content-addressed blob store, defaults to {output_location}/.blobs
+        """
+        self.output_location = output_location
+        self.folder_name = folder_name
+        self.target = os.path.join(output_location, folder_name)
+        self.blob_dir = blob_dir or os.path.join(output_location, '.blobs')
+        self.staging_dir = None
+        self.files = {}
+        self._unsynced = []
+        self._lock = threading.Lock()
+        self.recover(output_location, folder_name)
+
+    @staticmethod
+    def recover(output_location: str, folder_name: str) -> bool:
+        """
+        Cleans up retired folders an interrupted publish left behind, restoring the live version
+        folder from one when the crash happened between moving it away and renaming the staging
+        folder in its place.
+
+        Args:
+            output_location (str): Folder holding the project versions.
+            folder_name (str): Name of the version folder, e.g. bot_v3.
+
+        Returns:
+            bool: True when the version folder was restored.
+        """
+        restored = False
+        target = os.path.join(output_location, folder_name)
+        prefix = f".{folder_name}.retired-"
+        try:
+            names = sorted(os.listdir(output_location))
+        except FileNotFoundError:
+            return False
+        for name in names:
+            if not name.startswith(prefix):
+                continue
+            retired = os.path.join(output_location, name)
+            previous = os.path.join(retired, folder_name)
+            if not os.path.lexists(target) and os.path.isdir(previous):
+                os.rename(previous, target)
+                restored = True
+                logging.warning(f"Restored {target} from an interrupted publish")
+            shutil.rmtree(retired, ignore_errors=True)
+        return restored
+
+    def _stage(self) -> str:
+        if self.staging_dir is None:
+            os.makedirs(self.output_location, exist_ok=True)
+            self.staging_dir = tempfile.mkdtemp(prefix=f".{self.folder_name}.staging-", dir=self.output_location)
+            # When overwriting, carry the files of the live version forward
+            if os.path.isdir(self.target):
+                for root, _, names in os.walk(self.target):
+                    for name in names:
+                        source = os.path.join(root, name)
+                        destination = os.path.join(self.staging_dir, os.path.relpath(source, self.target))
+                        os.makedirs(os.path.dirname(destination), exist_ok=True)
+                        self._link_or_copy(source, destination)
+        return self.staging_dir
+
+    @staticmethod
+    def blob_path(blob_dir: str, digest: str) -> str:
+        return os.path.join(blob_dir, digest[:2], digest)
+
+    def _store_blob(self, digest: str, data: bytes) -> str:
+        blob = self.blob_path(self.blob_dir, digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            # Windows cannot remove read-only files, which would break replacing and retiring versions
+            if os.name == 'posix':
+                os.chmod(tmp_path, self.blob_mode & ~UMASK)
+            os.replace(tmp_path, blob)
+            self._unsynced.append(blob)
+        return blob
+
+    def _link_or_copy(self, source: str, destination: str):
+        try:
+            os.link(source, destination)
+        except OSError:
+            # File systems without hard links get a writable copy
+            shutil.copyfile(source, destination)
+            os.chmod(destination, self.file_mode & ~UMASK)
+            self._unsynced.append(destination)
+
+    def write(self, name: str, content: str) -> str:
+        """
+        Stages a file of the version.
+
+        Args:
+            name (str): Path of the file relative to the version folder.
+            content (str): File content.
+
+        Returns:
+            str: sha256 of the content.
+        """
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            path = os.path.join(self._stage(), name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.lexists(path):
+                os.remove(path)
+            try:
+                self._link_or_copy(self._store_blob(digest, data), path)
+            except FileNotFoundError:
+                # The blob was collected between the existence check and the link
+                self._link_or_copy(self._store_blob(digest, data), path)
+            self.files[name] = digest
+        return digest
+
+    def adopt(self, name: str, digest: str) -> bool:
+        """
+        Stages a file of an earlier version from the blob store without rewriting its content.
+
+        Args:
+            name (str): Path of the file relative to the version folder.
+            digest (str): sha256 recorded for the file.
+
+        Returns:
+            bool: False when the blob store no longer holds the content.
+        """
+        blob = self.blob_path(self.blob_dir, digest)
+        if not os.path.exists(blob):
+            return False
+        with self._lock:
+            path = os.path.join(self._stage(), name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.lexists(path):
+                os.remove(path)
+            try:
+                self._link_or_copy(blob, path)
+            except FileNotFoundError:
+                return False
+            self.files[name] = digest
+        return True
+
+    @staticmethod
+    def _fsync(path: str, directory: bool = False):
+        if directory and os.name != 'posix':
+            return
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def publish(self):
+        """
+        Flushes staged content to disk and swaps the staging folder in as the version folder.
+        """
+        with self._lock:
+            if self.staging_dir is None:
+                return
+
+            directories = {os.path.dirname(path) for path in self._unsynced}
+            for path in self._unsynced:
+                self._fsync(path)
+            for root, _, _ in os.walk(self.staging_dir):
+                directories.add(root)
+            for directory in directories:
+                self._fsync(directory, directory=True)
+
+            # mkdtemp creates the staging folder for its owner only
+            os.chmod(self.staging_dir, self.dir_mode & ~UMASK)
+            if os.path.isdir(self.target) and exchange(self.staging_dir, self.target):
+                # The staging path now holds the previous version
+                shutil.rmtree(self.staging_dir, ignore_errors=True)
+            elif os.path.isdir(self.target):
+                retired = tempfile.mkdtemp(prefix=f".{self.folder_name}.retired-", dir=self.output_location)
+                os.rename(self.target, os.path.join(retired, self.folder_name))
+                os.rename(self.staging_dir, self.target)
+                shutil.rmtree(retired, ignore_errors=True)
+            else:
+                os.rename(self.staging_dir, self.target)
+            self._fsync(self.output_location, directory=True)
+
+            logging.info(f"Published {len(self.files)} file(s) to {self.target}")
+            self.staging_dir = None
+            self._unsynced = []
+
+    @staticmethod
+    def collect_garbage(blob_dir: str, min_age: float = 86400) -> int:
+        """
+        Removes blobs no version folder links anymore, e.g. after old versions were deleted.
+
+        A blob with a single link is only referenced by the blob store. Blobs younger than min_age
+        are kept, as a run may be about to link them. On file systems without hard links every
+        version holds copies, so unchanged files of incremental runs are regenerated once collected.
+
+        Args:
+            blob_dir (str): Content-addressed blob store, e.g. outputs/.blobs
+            min_age (float): Seconds since a blob or temporary file was written before it can be removed.
+
+        Returns:
+            int: Bytes freed.
+        """
+        freed = 0
+        cutoff = time() - min_age
+        for root, _, names in os.walk(blob_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime < cutoff and (stat.st_nlink == 1 or name.endswith('.tmp')):
+                        os.remove(path)
+                        freed += stat.st_size
+                except FileNotFoundError:
+                    continue
+        logging.info(f"Collected {freed} bytes of unreferenced blobs from {blob_dir}")
+        return freed
+
+    def discard(self):
+        """
+        Drops the staged files without touching the live version folder.
+        """
+        with self._lock:
+            if self.staging_dir is not None:
+                shutil.rmtree(self.staging_dir, ignore_errors=True)
+                self.staging_dir = None
+                self._unsynced = []
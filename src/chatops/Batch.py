@@ -0,0 +1,297 @@
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from time import monotonic
+from src.chatops.ChatChain import Prompt_Manager
+from src.chatops.Incremental import IncrementalBuild
+from src.chatops.Manifest import ProjectManifest
+from src.chatops.OutputChain import CodeProcessor
+from src.chatops.Plan import PlanFile
+
+
+class BatchRunner:
+    """
+    Runs many ChatOps jobs in one process through a shared scheduler, response cache,
+    transport and code executor, so bootstrap, tokenizer loading and connection setup are
+    paid once per batch instead of once per project.
+
+    Jobs are read from a JSONL manifest, one job per line:
+        {"id": "bot-1", "project_name": "bot", "objective": "...",
+         "tasks": [["Write a hello world script", "data or path to a data file"]],
+         "data_file": "shared data for tasks without data", "output_override": ["hello_world.py", "python"],
+         "overwrite_project": false, "no_testing": false, "plan_file": "bot.plan.json", "incremental": false}
+
+    Only "tasks", or an existing "plan_file", is required; "tasks" may also be a {task: data} object. Relative
+    data files, plan files and the output folder are resolved against the job's "cwd" when it has one, as set
+    by the daemon for the client that submitted the job. Jobs without an "id" are identified by a fingerprint of their line. Every finished job is appended to a JSONL
+    state file, and jobs already completed there are skipped when the batch runs again.
+    """
+
+    default_objective = "You are a helpful AI Assistant with extensive knowledge in programming, writing, and creative development."
+
+    def __init__(self, manifest_path: str, model_name: str, roles: dict, output_location: str, response_cache=None,
+                 scheduler=None, transport=None, executor=None, execution_cache=None, state_path: str = None,
+                 report_path: str = None, max_jobs: int = 4, context_tokens: int = None, retry_engine=None,
+                 candidates: int = 1, candidate_check=None, candidate_temperature: float = 0.7):
+        """
+        Args:
+            manifest_path (str): JSONL file listing the jobs, None when jobs are passed to run_job directly.
+            model_name (str): Deployment the jobs run against.
+            roles (dict): Prompt role template used by jobs without their own "roles".
+            output_location (str): Folder the projects are written to.
+            response_cache (ResponseCache): Shared completion cache.
+            scheduler (RateLimitScheduler): Shared admission control for every LLM request.
+            transport (Transport): Shared chat completions backend.
+            executor (CodeExecutor): Shared code execution pool.
+            execution_cache (ExecutionCache): Shared execution result cache.
+            state_path (str): JSONL file recording finished jobs, defaults to {manifest}.state.jsonl, None to not record jobs
+            report_path (str): Summary report, defaults to {manifest}.report.json
+            max_jobs (int): Jobs planned and processed concurrently.
+            context_tokens (int): Context window override passed to every Prompt_Manager.
+            retry_engine (RetryEngine): Shared retry and hedging engine.
+            candidates (int): Candidate completions per role, see Prompt_Manager.
+            candidate_check (callable): Check deciding which candidate wins.
+            candidate_temperature (float): Sampling temperature of the extra candidates.
+        """
+        self.manifest_path = manifest_path
+        self.model_name = model_name
+        self.roles = roles
+        self.output_location = output_location
+        self.response_cache = response_cache
+        self.scheduler = scheduler
+        self.transport = transport
+        self.executor = executor
+        self.execution_cache = execution_cache
+        base_path = os.path.splitext(manifest_path)[0] if manifest_path else None
+        self.state_path = state_path or (f"{base_path}.state.jsonl" if base_path else None)
+        self.report_path = report_path or (f"{base_path}.report.json" if base_path else None)
+        self.max_jobs = max(1, max_jobs)
+        self.context_tokens = context_tokens
+        self.retry_engine = retry_engine
+        self.candidates = candidates
+        self.candidate_check = candidate_check
+        self.candidate_temperature = candidate_temperature
+
+    def load_jobs(self) -> dict:
+        """
+        Reads the manifest.
+
+        Returns:
+            dict: {job id: job} in manifest order.
+
+        Raises:
+            ValueError: Raised for invalid lines or duplicate job ids.
+        """
+        jobs = {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as file:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    job = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{self.manifest_path}:{line_number}: invalid JSON ({e})")
+                try:
+                    job_id = self.job_id(job)
+                except ValueError as e:
+                    raise ValueError(f"{self.manifest_path}:{line_number}: {e}")
+                if job_id in jobs:
+                    raise ValueError(f"{self.manifest_path}:{line_number}: duplicate job id '{job_id}'")
+                jobs[job_id] = job
+        return jobs
+
+    @staticmethod
+    def job_id(job: dict) -> str:
+        """
+        Validates a job and returns its id, a fingerprint of the job when it has no "id".
+
+        Raises:
+            ValueError: Raised for jobs without tasks.
+        """
+        if not isinstance(job, dict) or not (job.get('tasks') or job.get('plan_file')):
+            raise ValueError("a job needs a non empty 'tasks' entry or a 'plan_file'")
+        return str(job.get('id') or PlanFile.fingerprint(job)[:12])
+
+    def load_state(self) -> dict:
+        """
+        Returns the last recorded state of every job in the state file.
+        """
+        state = {}
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run interrupted mid write leaves a partial last line
+                        continue
+                    state[record['id']] = record
+        return state
+
+    def _record_state(self, record: dict):
+        if self.state_path is None:
+            return
+        with open(self.state_path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    @staticmethod
+    def _path(job: dict, path: str) -> str:
+        # Absolute paths are kept by os.path.join
+        return os.path.join(job['cwd'], path) if job.get('cwd') else path
+
+    def _output_location(self, job: dict) -> str:
+        return self._path(job, self.output_location)
+
+    @classmethod
+    def _task_pairs(cls, job: dict):
+        tasks = job.get('tasks') or []
+        pairs = tasks.items() if isinstance(tasks, dict) else [(task, None) if isinstance(task, str) else task for task in tasks]
+        for task_name, data in pairs:
+            # Tasks without their own data use the data file of the job
+            data = data if data is not None else job.get('data_file')
+            if isinstance(data, str) and os.path.isfile(cls._path(job, data)):
+                with open(os.path.normpath(cls._path(job, data)), 'r') as file:
+                    data = file.read()
+            yield task_name, data
+
+    def build_manager(self, job: dict) -> Prompt_Manager:
+        manager = Prompt_Manager(
+            self.model_name, job.get('objective', self.default_objective), [], "", job.get('roles', self.roles),
+            response_cache=self.response_cache, scheduler=self.scheduler, transport=self.transport,
+            context_tokens=self.context_tokens, retry_engine=self.retry_engine,
+            candidates=self.candidates, candidate_check=self.candidate_check,
+            candidate_temperature=self.candidate_temperature, echo=False
+        )
+        plan_file = self._path(job, job['plan_file']) if job.get('plan_file') else None
+        if plan_file and os.path.isfile(plan_file):
+            manager.load_plan(plan_file)
+            return manager
+        for task_name, data in self._task_pairs(job):
+            manager.add_task(task_name, data)
+        manager.plan()
+        if plan_file:
+            manager.save_plan(plan_file)
+        return manager
+
+    def build_incremental(self, manager: Prompt_Manager, job: dict) -> IncrementalBuild:
+        """
+        Returns the incremental build of jobs with "incremental" set, None otherwise.
+        """
+        if not job.get('incremental'):
+            return None
+        manifest = ProjectManifest(self._output_location(job), job.get('project_name', 'bot'))
+        return IncrementalBuild(manager, manifest, extra=[job.get('output_override') or [None, None], job.get('no_testing', False)])
+
+    def process_outputs(self, manager: Prompt_Manager, job: dict, incremental: IncrementalBuild = None) -> dict:
+        """
+        Saves and executes the code blocks of every completion of a job into one project version.
+        Incremental jobs also carry the files of unchanged tasks forward and record the task fingerprints.
+
+        Returns:
+            dict: Project version and the number of code blocks per status.
+        """
+        output_file, output_app_type = job.get('output_override') or (None, None)
+        processor = CodeProcessor(
+            output_project=job.get('project_name', 'bot'),
+            output_location=self._output_location(job),
+            overwrite_project=job.get('overwrite_project', False),
+            no_test=job.get('no_testing', False),
+            executor=self.executor,
+            execution_cache=self.execution_cache
+        )
+        if incremental is not None:
+            statuses = incremental.process(processor, output_file, output_app_type)
+            processor.publish()
+            incremental.record(processor)
+            return {'project': processor.manifest.folder_name(processor.version), 'blocks': dict(statuses), 'unchanged_tasks': len(incremental.unchanged)}
+
+        statuses = Counter()
+        for record in manager.completions:
+            code_blocks = processor.parse_code_blocks(record['output'])
+            for _, result in processor.iter_code_blocks(code_blocks, output_file=output_file, output_app_type=output_app_type, publish=False):
+                statuses[result['status']] += 1
+        processor.publish()
+        return {'project': processor.manifest.folder_name(processor.version), 'blocks': dict(statuses)}
+
+    async def run_job(self, job_id: str, job: dict) -> dict:
+        start = monotonic()
+        record = {'id': job_id, 'project_name': job.get('project_name', 'bot')}
+        manager = None
+        try:
+            manager = await asyncio.to_thread(self.build_manager, job)
+            incremental = self.build_incremental(manager, job)
+            if incremental is not None:
+                await asyncio.to_thread(incremental.prepare)
+            await manager.async_main()
+            # Completions of the roles that succeeded are saved even when others failed
+            record.update(await asyncio.to_thread(self.process_outputs, manager, job, incremental))
+            record.update(status='completed', completions=len(manager.completions), tokens_trimmed=manager.tokens_trimmed)
+            if manager.failures:
+                record.update(status='failed', error=f"{len(manager.failures)} role(s) failed or were skipped", failures=manager.failures)
+        except Exception as e:
+            logging.error(f"Batch job {job_id} failed: {e}")
+            record.update(status='failed', error=str(e))
+        finally:
+            if manager is not None:
+                manager.completions.close()
+        record['duration'] = round(monotonic() - start, 3)
+        self._record_state(record)
+        logging.info(f"Batch job {job_id} {record['status']} in {record['duration']}s")
+        return record
+
+    async def run_async(self, jobs: dict) -> list:
+        semaphore = asyncio.Semaphore(self.max_jobs)
+
+        async def bounded(job_id, job):
+            async with semaphore:
+                return await self.run_job(job_id, job)
+
+        try:
+            return await asyncio.gather(*[bounded(job_id, job) for job_id, job in jobs.items()])
+        finally:
+            if self.transport is not None:
+                await self.transport.close()
+
+    def run(self) -> dict:
+        """
+        Runs every job not yet completed and writes the summary report.
+
+        Returns:
+            dict: Summary report.
+        """
+        start = monotonic()
+        jobs = self.load_jobs()
+        state = self.load_state()
+        skipped = [job_id for job_id in jobs if state.get(job_id, {}).get('status') == 'completed']
+        pending = {job_id: job for job_id, job in jobs.items() if job_id not in skipped}
+        logging.info(f"Batch of {len(jobs)} job(s): {len(pending)} to run, {len(skipped)} already completed")
+
+        records = asyncio.run(self.run_async(pending))
+
+        # Report the latest outcome of every job in the manifest, including earlier runs
+        latest = {job_id: state[job_id] for job_id in skipped}
+        latest.update({record['id']: record for record in records})
+        jobs_report = [latest[job_id] for job_id in jobs if job_id in latest]
+        statuses = Counter(record['status'] for record in jobs_report)
+        report = {
+            'manifest': self.manifest_path,
+            'jobs': len(jobs),
+            'completed': statuses.get('completed', 0),
+            'failed': statuses.get('failed', 0),
+            'skipped': len(skipped),
+            'duration': round(monotonic() - start, 3),
+            'tokens_trimmed': sum(record.get('tokens_trimmed', 0) for record in records),
+            'blocks': dict(sum((Counter(record.get('blocks', {})) for record in records), Counter())),
+            'response_cache': self.response_cache.stats() if self.response_cache is not None else None,
+            'execution_cache': self.execution_cache.stats() if self.execution_cache is not None else None,
+            'results': jobs_report
+        }
+        with open(self.report_path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=4, ensure_ascii=False)
+        logging.info(f"Batch finished: {report['completed']} completed, {report['failed']} failed, "
+                     f"{report['skipped']} skipped in {report['duration']}s. Report: {self.report_path}")
+        return report
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from time import time
+
+
+class DiskCache:
+    """
+    Persistent content-addressed cache storing one JSON file per entry.
+
+    Entries are evicted least recently used first once the cache grows past max_bytes,
+    and entries older than max_age seconds are treated as misses and removed.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024, max_age: float = 7 * 24 * 3600):
+        """
+        Args:
+            cache_dir (str): Folder the cache entries are stored in, created when missing.
+            max_bytes (int): Upper bound for the total size of all entries.
+            max_age (float): Maximum age of an entry in seconds.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        # Reentrant as evict removes entries while set holds the lock
+        self._lock = threading.RLock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """
+        Builds a stable hash key from JSON serializable parts.
+        """
+        payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.cache_dir) if entry.is_file() and entry.name.endswith('.json')]
+
+    def get(self, key: str):
+        """
+        Returns the cached value for a key or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+
+        if time() - entry.get('created', 0) > self.max_age:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        # Touch the entry so eviction treats it as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process or thread since it was read
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['value']
+
+    def set(self, key: str, value):
+        """
+        Stores a JSON serializable value under a key and evicts entries over the size bound.
+        """
+        path = self._path(key)
+        payload = json.dumps({'created': time(), 'value': value}, ensure_ascii=False)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(payload)
+
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def _remove(self, path: str):
+        # Sized and removed under the lock so concurrent removals of one entry subtract its size once
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """
+        Removes expired entries, then least recently used entries until under max_bytes.
+        """
+        now = time()
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+            for entry in entries:
+                stat = entry.stat()
+                if self._size <= self.max_bytes and now - stat.st_mtime <= self.max_age:
+                    continue
+                self._remove(entry.path)
+                logging.debug(f"Evicted cache entry {entry.name}")
+
+    def stats(self) -> str:
+        return f"cache hits: {self.hits}, misses: {self.misses}"
+
+
+class ResponseCache(DiskCache):
+    """
+    Cache for chat completion responses keyed by (engine, temperature, messages).
+    """
+
+    @staticmethod
+    def normalize_messages(messages):
+        """
+        Reduces messages to their role and stripped content so cosmetic differences hash the same.
+        """
+        return [
+            {'role': message['role'], 'content': str(message['content']).strip()}
+            for message in messages
+        ]
+
+    def key_for(self, engine: str, temperature: float, messages) -> str:
+        return self.make_key(engine, temperature, self.normalize_messages(messages))
+
+    def get_completion(self, engine: str, temperature: float, messages):
+        return self.get(self.key_for(engine, temperature, messages))
+
+    def set_completion(self, engine: str, temperature: float, messages, output: str):
+        self.set(self.key_for(engine, temperature, messages), output)
+
+
+class ExecutionCache(DiskCache):
+    """
+    Cache for code block execution results keyed by (app_type, interpreter version, code hash).
+    Only deterministic outcomes are stored: completed runs, and failed runs when cache_failures is set.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024, max_age: float = 7 * 24 * 3600,
+                 cache_failures: bool = False):
+        """
+        Args:
+            cache_failures (bool): Also store failed runs, so a block failing on a missing dependency
+                or a flaky resource keeps failing from the cache until the entry expires.
+        """
+        super().__init__(cache_dir, max_bytes, max_age)
+        self.cacheable_statuses = ('completed', 'failed') if cache_failures else ('completed',)
+
+    def key_for(self, app_type: str, interpreter_version: str, code_content: str) -> str:
+        code_hash = hashlib.sha256(code_content.encode('utf-8')).hexdigest()
+        return self.make_key(app_type.lower(), interpreter_version, code_hash)
+
+    def get_result(self, app_type: str, interpreter_version: str, code_content: str):
+        """
+        Returns the stored {'status', 'stdout', 'stderr'} for a code block or None on a miss.
+        """
+        value = self.get(self.key_for(app_type, interpreter_version, code_content))
+        # Entries of an older format, or failures stored while they were cacheable, are misses
+        if value is None or 'stdout' not in value or value['status'] not in self.cacheable_statuses:
+            return None
+        return value
+
+    def set_result(self, app_type: str, interpreter_version: str, code_content: str, status: str, stdout: str, stderr: str):
+        if status in self.cacheable_statuses:
+            self.set(self.key_for(app_type, interpreter_version, code_content), {'status': status, 'stdout': stdout, 'stderr': stderr})
@@ -2,35 +2,29 @@ import asyncio
 import concurrent.futures
 import logging
 import json
-import os
+import threading
 from datetime import datetime
 from pydantic import BaseModel
 from typing import List, Dict
-import tiktoken
-import openai
-from dotenv import load_dotenv
-
-
-# Get the absolute path to the .env file using the current script's directory
-env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'env', 'llm.env'))
-
-# Load Environment file
-load_dotenv(env_path)
-
+from src.chatops.TokenCounter import token_counter
+from src.chatops.Scheduler import RateLimitScheduler
+from src.chatops.Transport import OpenAITransport
+from src.chatops.OutputChain import CodeBlockParser
+from src.chatops.ContextBuilder import ContextBuilder
+from src.chatops.Plan import PlanFile
+from src.chatops.Retry import MalformedResponseError, RetryEngine
+from src.chatops.ResultStore import ResultStore
+from src.chatops.Tracing import tracer
+
+# Credentials and the openai client are configured once by configs.Get_Configs.Bootstrap
 
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] [%(name)s] - %(message)s')
 
-azure_openai_key = os.getenv("azure_openai_key")
-azure_openai_endpoint = os.getenv("azure_openai_endpoint")
-azure_openai_api_version = os.getenv("azure_openai_api_version")
-azure_openai_api_type = os.getenv("azure_openai_api_type")
-support_email = os.getenv("support_email")
-model_name = os.getenv("model_name")
-openai.api_base = azure_openai_endpoint
-openai.api_key = azure_openai_key
-openai.api_version = azure_openai_api_version
-openai.api_type = azure_openai_api_type
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] [%(name)s] - %(message)s')
+class UpstreamFailed(Exception):
+    """
+    Raised for a role that was skipped because a role it depends on failed.
+    """
 
 
 class Item(BaseModel):
@@ -53,10 +47,55 @@ class Objective(BaseModel):
 class RoleTask(BaseModel):
     role: str
     instructions: List[str]
+    depends_on: List[str] = []  # Roles whose completions this role refines
+
+
+def build_role_graph(roles: dict) -> Dict[str, RoleTask]:
+    """
+    Normalizes a prompt role template into a dependency graph of RoleTask entries.
+
+    A role is either a list of instructions, in which case it depends on the role declared
+    before it, or a dictionary with 'instructions' and an optional 'depends_on' list.
+
+    Args:
+        roles (dict): Prompt role template as loaded from prompt_roles.json.
+
+    Returns:
+        dict: RoleTask per role name in topological order.
+
+    Raises:
+        ValueError: Raised for unknown dependencies or dependency cycles.
+    """
+    role_tasks = {}
+    previous_role = None
+    for role, definition in roles.items():
+        if isinstance(definition, dict):
+            role_tasks[role] = RoleTask(role=role, **definition)
+        else:
+            depends_on = [previous_role] if previous_role is not None else []
+            role_tasks[role] = RoleTask(role=role, instructions=definition, depends_on=depends_on)
+        previous_role = role
+
+    for role_task in role_tasks.values():
+        unknown = [dependency for dependency in role_task.depends_on if dependency not in role_tasks]
+        if unknown:
+            raise ValueError(f"Role '{role_task.role}' depends on unknown role(s): {unknown}")
+
+    # Kahn's algorithm keeps declaration order among roles that are ready together
+    ordered = {}
+    pending = dict(role_tasks)
+    while pending:
+        ready = [role for role, role_task in pending.items() if all(dependency in ordered for dependency in role_task.depends_on)]
+        if not ready:
+            raise ValueError(f"Role dependency cycle between: {list(pending)}")
+        for role in ready:
+            ordered[role] = pending.pop(role)
+    return ordered
 
 
 class Prompt_Manager:
-    def __init__(self,model_name, objective_name, task_name, data, roles):
+    def __init__(self,model_name, objective_name, task_name, data, roles, response_cache=None, scheduler=None, transport=None, on_code_block=None, context_tokens=None, retry_engine=None, candidates=1, candidate_check=None, candidate_temperature=0.7,
+                 results_path=None, echo=True):
         """
         Initializes the Prompt_Manager instance.
 
@@ -65,6 +104,21 @@ class Prompt_Manager:
             task_name (str): Name of the task.
             data (str): Task-specific data.
             roles (dict): Dictionary of user roles and their corresponding instructions.
+            response_cache (ResponseCache): Optional on-disk cache for completion responses.
+            scheduler (RateLimitScheduler): Admits requests under concurrency and rate limits.
+            transport (Transport): Chat completions backend, defaults to the blocking openai client.
+            on_code_block (callable): When set, completions are streamed and on_code_block(file_name, block)
+                is called on a worker thread for every code block as soon as its closing fence arrives.
+            context_tokens (int): Context window used to budget requests, defaults to the window of the model.
+            retry_engine (RetryEngine): Retries and hedges failed or slow requests, share one so hedging learns from every
+                request. Defaults to 3 retries without hedging.
+            candidates (int): Completions requested per role. They are checked concurrently and the first one passing
+                candidate_check wins, the others are cancelled.
+            candidate_check (callable): candidate_check(output, cancel_event) returns True when a completion works, e.g. a
+                CandidateChecker. Required for more than one candidate.
+            candidate_temperature (float): Sampling temperature of every candidate but the first, so candidates differ.
+            results_path (str): JSONL file the completions are written to, defaults to a temporary file.
+            echo (bool): Prints every completion as it finishes.
         """
 
         self.prompt_configurations ="""
@@ -86,12 +140,29 @@ class Prompt_Manager:
         self.task_name = task_name
         self.data = data
         self.roles = roles
+        self.role_graph = build_role_graph(roles)
         self.task_collection = {}
         self.plan_results = []
-        self.completions = []
-        self.tmp = {}
-        self.iter = 0
-        self.init_prompt = 0 
+        self.plan_model = None
+        # {'task', 'role', 'output'} records in the order the completions finish
+        self.completions = ResultStore(results_path)
+        # {'task', 'role', 'error'} of every role that failed or was skipped
+        self.failures = []
+        self.echo = echo
+        self.token_counter = token_counter
+        self.context_builder = ContextBuilder(model_name, context_tokens=context_tokens)
+        self.tokens_trimmed = 0
+        self.response_cache = response_cache
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.transport = transport or OpenAITransport(model_name)
+        self.on_code_block = on_code_block
+        self.retry_engine = retry_engine or RetryEngine(scheduler=self.scheduler)
+        self.candidates = candidates if candidate_check is not None and on_code_block is None else 1
+        if self.candidates != candidates:
+            logging.warning("Candidate completions need a candidate check and are not used while streaming, requesting one completion per role")
+        self.candidate_check = candidate_check
+        self.candidate_temperature = candidate_temperature
+        self.temperature = 0.1
 
     def add_task(self, task_name: str, data) -> list:
         """
@@ -121,154 +192,390 @@ class Prompt_Manager:
         num_tokens = len(encoding.encode(string))
         return num_tokens
 
-    def count_tokens(self, text, encoding):
+    def count_tokens(self, text, model="gpt-3.5-turbo"):
         """
-        Counts the number of tokens in the given text.
+        Counts the number of tokens in the given text using the shared token counter.
 
         Args:
             text: Input text.
-            encoding: Encoding method.
+            model (str): Model used to select the cached encoder.
 
         Returns:
             int: Number of tokens.
         """
-        return self.num_tokens_from_string(text, encoding)
+        return self.token_counter.count(text, model)
 
-    def plan(self, model="gpt-3.5-turbo"):
+    def plan_task(self, task, data, model="gpt-3.5-turbo"):
         """
-        Plans the execution of tasks.
+        Builds the role message lists and token usage for a single task.
 
         Args:
-            model (str): OpenAI model to use.
+            task (str): Task name.
+            data: Task-specific data.
+            model (str): Model used for token accounting.
 
         Returns:
-            str: Formatted results.
+            dict: Messages per role plus a 'token_usage' breakdown.
         """
-        # List to store results for each task
-        for task, data in self.task_collection.items():
-            logging.info(f"Objective: {self.objective_name}")
-            logging.info(f" -Executing Task: {task}")
-            role_results = {}
-            total_tokens = 0
-            for role, instructions in self.roles.items():
-                content = []
-                logging.info(f"  - Executing Task as Role: {role}")
-                # Add system role for instruction
-                for instruction in instructions:
-                    content.append({
-                        "role": "system",
-                        "content": str({
-                            "Instruction": f'{instruction}'
-                        })
-                    })
-                    total_tokens = self.count_tokens(str(instruction), tiktoken.encoding_for_model(model))
-
-                # Add user role for task
+        logging.info(f" -Executing Task: {task}")
+        start = tracer.now()
+        role_results = {}
+        role_tokens = {}
+        for role, role_task in self.role_graph.items():
+            instructions = role_task.instructions
+            content = []
+            logging.info(f"  - Executing Task as Role: {role}")
+            # Add system role for instruction
+            for instruction in instructions:
                 content.append({
-                    "role": "user",
+                    "role": "system",
                     "content": str({
-                        "Task": task,
-                        "Data": data,  # Use the data parameter here
-                        "Role": role
+                        "Instruction": f'{instruction}'
                     })
                 })
 
-                role_results[role] = content
-                total_tokens += self.count_tokens(str(content), tiktoken.encoding_for_model(model))
-
-            # Add system role for objective
-            role_results["system"] = [{
-                "role": "system",
+            # Add user role for task
+            content.append({
+                "role": "user",
                 "content": str({
-                    "Objective": self.objective_name
+                    "Task": task,
+                    "Data": data,  # Use the data parameter here
+                    "Role": role
                 })
-            }]
-            total_tokens += self.count_tokens(str(self.objective_name), tiktoken.encoding_for_model(model))
-            role_results['token_usage'] = total_tokens
+            })
+
+            role_results[role] = content
+            role_tokens[role] = self.token_counter.count_messages(content, model)
+
+        # Add system role for objective
+        role_results["system"] = [{
+            "role": "system",
+            "content": str({
+                "Objective": self.objective_name
+            })
+        }]
+        objective_tokens = self.token_counter.count_messages(role_results["system"], model)
+        role_results['task'] = task
+        role_results['token_usage'] = {
+            "roles": role_tokens,
+            "objective": objective_tokens,
+            # Objective plus role messages as sent, the reply priming is only counted once
+            "prompts": {role: tokens + objective_tokens - self.token_counter.tokens_per_reply for role, tokens in role_tokens.items()},
+            "total": sum(role_tokens.values()) + objective_tokens
+        }
+        tracer.add("plan_task", start, task=task, roles=len(role_tokens), tokens=role_results['token_usage']['total'])
+        return role_results
+
+    def plan(self, model="gpt-3.5-turbo", max_workers=None):
+        """
+        Plans the execution of tasks, encoding tasks in parallel across a thread pool.
+
+        Args:
+            model (str): OpenAI model to use.
+            max_workers (int): Size of the thread pool, defaults to the executor default.
 
-            self.plan_results.append(role_results)  # Append results for the current task
+        Returns:
+            str: Formatted results.
+        """
+        logging.info(f"Objective: {self.objective_name}")
+        self.plan_model = model
+        with tracer.span("plan", tasks=len(self.task_collection), model=model) as span:
+            # Load the encoder once up front so worker threads share it
+            self.token_counter.encoding_for(model)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(self.plan_task, task, data, model)
+                    for task, data in self.task_collection.items()
+                ]
+                # Keep results in task order
+                self.plan_results.extend(future.result() for future in futures)
+
+            total_tokens = sum(result['token_usage']['total'] for result in self.plan_results)
+            span.set(tokens=total_tokens)
+        logging.info(f"Planned {len(self.plan_results)} task(s) using {total_tokens} prompt tokens")
 
         # Use json.dumps for formatting with indent 4
         formatted_results = json.dumps(self.plan_results, indent=4)
         return formatted_results
 
-    async def chain_completions(self, prompt, retry=3, previous_data=None):
+    def compile_plan(self) -> dict:
+        """
+        Returns the current plan as a versioned plan artifact, see PlanFile.
+        """
+        roles = {role: {"instructions": role_task.instructions, "depends_on": role_task.depends_on} for role, role_task in self.role_graph.items()}
+        return PlanFile.build(self.plan_model, self.objective_name, roles, self.prompt_configurations, self.task_collection, self.plan_results)
+
+    def save_plan(self, path: str):
+        """
+        Writes the current plan to a plan file that load_plan() can execute later.
+        """
+        PlanFile.save(path, self.compile_plan())
+
+    def task_fingerprints(self, extra=None) -> dict:
+        """
+        Returns a fingerprint of the inputs of every planned task.
+
+        A fingerprint covers the model, the output rules, the role instructions and dependencies, and
+        the planned messages, which hold the objective, the task text and its data. It changes
+        whenever any of them changes.
+
+        Args:
+            extra: JSON serializable settings that also change the outputs, e.g. the output override.
+
+        Returns:
+            dict: {task: sha256} in plan order.
+        """
+        roles = {role: {"instructions": role_task.instructions, "depends_on": role_task.depends_on} for role, role_task in self.role_graph.items()}
+        shared = {'model': self.model_name, 'configurations': self.prompt_configurations, 'roles': roles, 'extra': extra}
+        return {
+            result['task']: PlanFile.fingerprint({**shared, 'plan': {key: value for key, value in result.items() if key != 'token_usage'}})
+            for result in self.plan_results
+        }
+
+    def skip_tasks(self, tasks):
+        """
+        Removes tasks from the plan so main() does not request them.
+        """
+        tasks = set(tasks)
+        self.plan_results = [result for result in self.plan_results if result['task'] not in tasks]
+
+    def load_plan(self, path: str):
+        """
+        Loads a plan file so main() executes it without reading data or tokenizing prompts.
+
+        Args:
+            path (str): Plan file written by save_plan().
+        """
+        plan = PlanFile.load(path)
+        if plan['fingerprints']['configurations'] != PlanFile.fingerprint(self.prompt_configurations):
+            logging.warning(f"Plan file {path} was compiled with different output rules, the current rules are used")
+        self.objective_name = plan['objective']
+        self.role_graph = build_role_graph(plan['roles'])
+        self.plan_model = plan['model']
+        self.plan_results = plan['tasks']
+        total_tokens = sum(result['token_usage']['total'] for result in self.plan_results)
+        logging.info(f"Loaded plan of {len(self.plan_results)} task(s) using {total_tokens} prompt tokens from {path}")
+
+    async def chain_completions(self, prompt, retry=None, previous_data=None, prompt_tokens=None, task=None, role=None):
         """
         Chains completions asynchronously.
 
         Args:
-            prompt: Input prompt.
-            retry (int): Number of retries.
-            previous_data: Previous completion data.
+            prompt: Input prompt, not modified.
+            retry (int): Number of retries, defaults to the retry policy.
+            previous_data (list): Completions of the upstream roles, oldest first.
+            prompt_tokens (int): Tokens of the prompt precounted by plan().
+            task (str): Task recorded with the completion.
+            role (str): Role recorded with the completion.
 
         Raises:
-            Exception: Raised after reaching the maximum number of retries.
-        """
-        attempt = 0
-        while attempt <= retry:
-            messages = prompt
-
-            
-            #if attempt == 0 and self.init_prompt == 0:
-            # Add output Configs #
-            messages.append({
-                "role": "system",
-                "content": json.dumps(f"{self.prompt_configurations}")
-            })
+            Exception: The error of the last attempt once the retries are used up, or the first error that is not retryable.
+        """
+        # Built once so every retry sends the same messages
+        with tracer.span("build_context", upstream=len(previous_data or [])) as span:
+            context = self.context_builder.build(prompt, self.prompt_configurations, previous_data or [], prompt_tokens=prompt_tokens)
+            span.set(tokens=context.prompt_tokens, tokens_trimmed=context.tokens_trimmed, omitted=len(context.omitted))
+        messages = context.messages
+        estimated_tokens = context.prompt_tokens
+        self.tokens_trimmed += context.tokens_trimmed
+        logging.info(f"Request uses {context.prompt_tokens} prompt tokens, {context.tokens_trimmed} trimmed from previous completions" + (f", summarized: {context.omitted}" if context.omitted else ""))
+
+        if self.response_cache is not None:
+            with tracer.span("cache_lookup") as span:
+                cached_output = self.response_cache.get_completion(self.model_name, self.temperature, messages)
+                span.set(hit=cached_output is not None)
+            if cached_output is not None:
+                logging.info("Using cached completion")
+                if self.on_code_block is not None:
+                    parser = CodeBlockParser()
+                    await self._handle_code_blocks(parser.feed(cached_output) + parser.close())
+                return self._record_completion(cached_output, task, role)
+
+        if self.on_code_block is not None:
+            async def stream(attempt):
+                with tracer.span("llm_stream", tokens_in=estimated_tokens) as span:
+                    output = await self._stream_completion(messages, estimated_tokens)
+                    span.set(characters=len(output))
+                return output
 
+            # Streams hand code blocks to on_code_block as they arrive, so they are never hedged
+            output = await self.retry_engine.call(stream, retries=retry, hedge=False)
+        else:
+            def make_request(temperature):
+                async def request(attempt):
+                    with tracer.span("llm_request", tokens_in=estimated_tokens, temperature=temperature) as span:
+                        async with self.scheduler.admit(estimated_tokens):
+                            attempt.admitted()
+                            prompt_response = await self.transport.complete(messages, temperature)
+                        usage = prompt_response.get('usage', {})
+                        span.set(tokens_out=usage.get('completion_tokens'), tokens_total=usage.get('total_tokens'))
+                    self.scheduler.record_usage(estimated_tokens, usage.get('total_tokens', 0))
+                    try:
+                        return prompt_response['choices'][0]['message']['content']
+                    except (KeyError, IndexError, TypeError) as e:
+                        raise MalformedResponseError(f"Completion response without message content: {e!r}")
+                return request
+
+            if self.candidates > 1:
+                output = await self._race_candidates(make_request, retry)
+            else:
+                output = await self.retry_engine.call(make_request(self.temperature), retries=retry)
+
+        if self.response_cache is not None:
+            self.response_cache.set_completion(self.model_name, self.temperature, messages, output)
+        return self._record_completion(output, task, role)
+
+    async def _race_candidates(self, make_request, retry=None):
+        """
+        Requests self.candidates completions concurrently and checks each one as soon as it arrives.
 
-            self.init_prompt +=1
+        The first candidate passing the check wins; requests and checks of the other candidates are
+        cancelled, which kills their running code blocks. When no candidate passes, the completion
+        at the base temperature is returned, or the lowest numbered one that arrived.
 
-            if previous_data:
-                messages.append({
-                    "role": "system",
-                    "content": json.dumps(f"Use the output from the previous completion: {previous_data} as your starting point for completing your task. Make changes in place ")
-                })
+        Args:
+            make_request (callable): Returns a coroutine function requesting a completion at a temperature.
+            retry (int): Retries of each candidate request.
 
-            prompt_response = await asyncio.to_thread(
-                openai.ChatCompletion.create,
-                temperature=0.1,
-                engine=self.model_name,
-                messages=messages
-            )
-
-            try:
-                output = prompt_response['choices'][0]['message']['content']
-                self.completions.append(output)
-
-                task_name = self.iter
-                self.tmp[task_name] = output
-                self.iter +=1
-                print(output)
-                return output
-            except Exception as e:
-                logging.error(f'Retry {attempt}/{retry} failed. Error: {e}')
-                attempt += 1
+        Returns:
+            str: The winning completion.
+        """
+        cancel_events = [threading.Event() for _ in range(self.candidates)]
+
+        async def candidate(index):
+            temperature = self.temperature if index == 0 else self.candidate_temperature
+            output = await self.retry_engine.call(make_request(temperature), retries=retry)
+            with tracer.span("candidate_check", candidate=index) as span:
+                check = asyncio.ensure_future(asyncio.to_thread(self.candidate_check, output, cancel_events[index]))
+                try:
+                    passed = await asyncio.shield(check)
+                except asyncio.CancelledError:
+                    # The check thread outlives a cancelled await, wait until it killed its code blocks
+                    cancel_events[index].set()
+                    await asyncio.gather(check, return_exceptions=True)
+                    raise
+                span.set(passed=passed)
+            return index, output, passed
+
+        attempts = [asyncio.ensure_future(candidate(index)) for index in range(self.candidates)]
+        outputs = {}
+        error = None
+        try:
+            for attempt in asyncio.as_completed(attempts):
+                try:
+                    index, output, passed = await attempt
+                except Exception as e:
+                    error = e
+                    continue
+                if passed:
+                    logging.info(f"Candidate {index + 1}/{self.candidates} passed, cancelling the others")
+                    return output
+                logging.info(f"Candidate {index + 1}/{self.candidates} failed its check")
+                outputs[index] = output
+        finally:
+            for event in cancel_events:
+                event.set()
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+            # Retrieves the errors of the losers and returns once their code blocks are killed
+            await asyncio.gather(*attempts, return_exceptions=True)
+        if not outputs:
+            raise error
+        logging.warning(f"None of the {self.candidates} candidates passed, keeping candidate {min(outputs) + 1}")
+        return outputs[min(outputs)]
+
+    def _handle_code_blocks(self, blocks):
+        """
+        Runs on_code_block for each parsed block on a worker thread so generation keeps streaming.
+
+        Returns:
+            Future: Resolves once every handler has finished.
+        """
+        return asyncio.gather(*[
+            asyncio.to_thread(self.on_code_block, block.file_name, block.entry())
+            for block in blocks
+        ])
+
+    async def _stream_completion(self, messages, estimated_tokens=0):
+        """
+        Streams a completion through the incremental code block parser.
 
-        raise Exception(f"Failed after {retry} retries.")
+        Returns:
+            str: The full completion text.
+        """
+        parser = CodeBlockParser()
+        handlers = []
+        chunks = []
+        async with self.scheduler.admit(estimated_tokens):
+            async for delta in self.transport.stream(messages, self.temperature):
+                chunks.append(delta)
+                blocks = parser.feed(delta)
+                if blocks:
+                    handlers.append(self._handle_code_blocks(blocks))
+        handlers.append(self._handle_code_blocks(parser.close()))
+        await asyncio.gather(*handlers)
+        return "".join(chunks)
+
+    def _record_completion(self, output, task=None, role=None):
+        """
+        Stores a finished completion and returns it.
+        """
+        self.completions.append({'task': task, 'role': role, 'output': output})
+        if self.echo:
+            print(output)
+        return output
 
     async def async_main(self):
         """
         Asynchronous main function to process tasks concurrently.
-        """
-        async def process_task(task_results):
-            tasks = []
-            for role, content in task_results.items():
-                if role != 'token_usage':
-                    self.init_prompt = 0
-                    prompt = content
-                    previous_data = self.completions[-1] if self.completions else None
 
-                    # Append the coroutine to the list, not the result of the coroutine
-                    tasks.append(self.chain_completions(prompt, previous_data=previous_data))
+        Each task runs its roles as a dependency graph: independent roles start immediately
+        and a dependent role starts as soon as all of its upstream completions are available.
+
+        Completions are recorded in self.completions as they finish, so only the completions
+        still needed by dependent roles are held in memory.
 
-            # Await all tasks concurrently and gather the results
-            results = await asyncio.gather(*tasks)
-            return results
+        A failing role does not stop the run: roles depending on it are skipped, every other role
+        and task runs to completion, and the failures are listed in self.failures.
 
-        # Process all tasks concurrently and gather the results
-        results = await asyncio.gather(*[process_task(task_results) for task_results in self.plan_results])
-        return results
+        Returns:
+            ResultStore: self.completions
+        """
+        async def process_task(task_results):
+            objective = task_results['system']
+            role_runs = {}
+
+            async def run_role(role):
+                dependencies = self.role_graph[role].depends_on
+                if dependencies:
+                    await asyncio.wait([role_runs[dependency] for dependency in dependencies])
+                failed = [dependency for dependency in dependencies if role_runs[dependency].exception() is not None]
+                if failed:
+                    raise UpstreamFailed(f"skipped, upstream role(s) {failed} failed")
+                upstream = [role_runs[dependency].result() for dependency in dependencies]
+                prompt = objective + task_results[role]
+                prompt_tokens = task_results['token_usage']['prompts'][role]
+                with tracer.span("role", task=task_results.get('task'), role=role, upstream=len(upstream)):
+                    return await self.chain_completions(prompt, previous_data=upstream, prompt_tokens=prompt_tokens,
+                                                        task=task_results.get('task'), role=role)
+
+            # Roles are in topological order so every dependency is scheduled before its dependents
+            for role in self.role_graph:
+                role_runs[role] = asyncio.ensure_future(run_role(role))
+
+            results = await asyncio.gather(*role_runs.values(), return_exceptions=True)
+            for role, result in zip(role_runs, results):
+                if isinstance(result, Exception):
+                    if not isinstance(result, UpstreamFailed):
+                        logging.error(f"Role '{role}' of task '{task_results.get('task')}' failed: {result!r}")
+                    self.failures.append({'task': task_results.get('task'), 'role': role, 'error': str(result) or repr(result)})
+
+        # Process all tasks concurrently
+        await asyncio.gather(*[process_task(task_results) for task_results in self.plan_results])
+        if self.failures:
+            logging.error(f"{len(self.failures)} role(s) failed or were skipped, completions of the other roles are kept")
+        return self.completions
 
     def main(self):
         """
@@ -279,11 +586,18 @@ class Prompt_Manager:
         new_loop = asyncio.new_event_loop()
         asyncio.set_event_loop(new_loop)
         loop = asyncio.get_event_loop()
-        results = loop.run_until_complete(self.async_main())
+        try:
+            with tracer.span("main", tasks=len(self.plan_results)):
+                loop.run_until_complete(self.async_main())
+        finally:
+            loop.run_until_complete(self.transport.close())
         end_time = datetime.now()
         duration = end_time - start_time
-        logging.info(f"Total execution time: {duration} ⏳")
-        logging.info(f"Total tasks executed: {len(self.tmp)} ✅")
+        cache_stats = f" ({self.response_cache.stats()})" if self.response_cache is not None else ""
+        logging.info(f"Total execution time: {duration} ⏳{cache_stats}")
+        logging.info(f"Previous completion tokens trimmed by context budgeting: {self.tokens_trimmed}")
+        logging.info(f"Retries: {self.retry_engine.retries}, hedged requests: {self.retry_engine.hedges} ({self.retry_engine.hedges_won} won by the duplicate)")
+        logging.info(f"Total tasks executed: {len(self.completions)} ✅")
         logging.info(f"-Finished Running Main Class-")
 
 '''
@@ -326,5 +640,5 @@ if __name__ == "__main__":
     # [print(i['Programmer']) for i in prompt_manager.plan_results]
     #print(plan_result)
     prompt_manager.main()
-    [print(i) for k,i in prompt_manager.tmp.items()]
+    [print(record['output']) for record in prompt_manager.completions]
 '''
\ No newline at end of file
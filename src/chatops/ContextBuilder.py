@@ -0,0 +1,172 @@
+import logging
+import re
+from typing import List, NamedTuple, Optional, Sequence
+from src.chatops.OutputChain import CodeBlockParser
+from src.chatops.TokenCounter import token_counter
+
+
+class RequestContext(NamedTuple):
+    messages: List[dict]
+    prompt_tokens: int   # Tokens of the messages as sent
+    full_tokens: int     # Tokens of the same request with every previous completion sent in full
+    tokens_trimmed: int  # Tokens of previous completions trimmed or summarized to fit the budget
+    omitted: List[str]   # Files summarized instead of sent
+
+
+class ContextSection(NamedTuple):
+    name: str
+    app_type: Optional[str]
+    text: str
+    recency: int         # Index of the upstream completion, higher is newer
+
+
+class ContextBuilder:
+    """
+    Assembles the messages of one request within the token budget of the model.
+
+    The prompt and its configuration messages are always sent. Previous completions are split
+    into one section per generated file, files regenerated by a newer completion replace older
+    copies, and sections are admitted most relevant to the refining role first. Sections that
+    do not fit are trimmed to their first lines, or summarized in a single line once the budget
+    is spent. Inputs are never modified, every call returns a new message list.
+    """
+
+    # Context windows by model name prefix, matched after removing separators so Azure
+    # deployment names such as gpt-35-turbo-16k resolve too. Longest prefix wins.
+    context_windows = {
+        'gpt35turbo16k': 16384,
+        'gpt35turbo': 4096,
+        'gpt4turbo': 128000,
+        'gpt4o': 128000,
+        'gpt432k': 32768,
+        'gpt4': 8192,
+    }
+    default_context_window = 8192
+    # Sections are only trimmed when at least this many tokens remain, otherwise summarized
+    min_section_tokens = 64
+    keyword_pattern = re.compile(r'[A-Za-z][A-Za-z0-9_]{2,}')
+    stopwords = frozenset({
+        'the', 'and', 'for', 'you', 'your', 'with', 'that', 'this', 'are', 'all', 'any', 'not', 'use',
+        'from', 'into', 'make', 'code', 'task', 'data', 'role', 'instruction', 'should', 'will', 'must'
+    })
+
+    def __init__(self, model: str, context_tokens: int = None, completion_tokens: int = 1024, counter=token_counter):
+        """
+        Args:
+            model (str): Model or deployment name used for token counting and the context window.
+            context_tokens (int): Context window override, defaults to the window of the model.
+            completion_tokens (int): Tokens kept free for the completion.
+            counter (TokenCounter): Token accounting engine.
+        """
+        self.model = model
+        self.context_tokens = context_tokens or self.context_window_for(model)
+        self.completion_tokens = completion_tokens
+        self.counter = counter
+
+    @classmethod
+    def context_window_for(cls, model: str) -> int:
+        normalized = re.sub(r'[^a-z0-9]', '', str(model).lower())
+        for prefix in sorted(cls.context_windows, key=len, reverse=True):
+            if normalized.startswith(prefix):
+                return cls.context_windows[prefix]
+        return cls.default_context_window
+
+    def keywords(self, text: str) -> set:
+        return {word for word in map(str.lower, self.keyword_pattern.findall(text)) if word not in self.stopwords}
+
+    @staticmethod
+    def split_sections(previous_data: Sequence[str]) -> List[ContextSection]:
+        """
+        Splits previous completions into one section per generated file, newest copy of a file wins.
+        """
+        sections = {}
+        for recency, output in enumerate(previous_data):
+            parser = CodeBlockParser(default_file_name=f"untitled_{recency}")
+            blocks = parser.feed(output) + parser.close()
+            if not blocks:
+                sections[f"completion_{recency}"] = ContextSection(f"completion_{recency}", None, output.strip(), recency)
+                continue
+            for block in blocks:
+                header = f"#~Folder_Name:{block.folder_name}~\n" if block.folder_name else ""
+                text = f"{header}#~File_Name:{block.file_name}~\n```{block.app_type}\n{block.code_content}\n```"
+                sections[block.file_name] = ContextSection(block.file_name, block.app_type, text, recency)
+        return list(sections.values())
+
+    def _trim(self, section: ContextSection, tokens: int, budget: int) -> str:
+        lines = section.text.splitlines()
+        keep = max(1, int(len(lines) * budget / tokens))
+        while keep > 1:
+            text = "\n".join(lines[:keep]) + f"\n... [{len(lines) - keep} more lines of {section.name} trimmed]"
+            if self.counter.count(text, self.model) <= budget:
+                return text
+            keep = int(keep * 0.8)
+        return None
+
+    @staticmethod
+    def _summary(section: ContextSection) -> str:
+        kind = f"{section.app_type}, " if section.app_type else ""
+        lines = len(section.text.splitlines())
+        return f"[{section.name} omitted: {kind}{lines} lines]"
+
+    def build(self, prompt: Sequence[dict], configurations: str, previous_data: Sequence[str] = (), prompt_tokens: int = None) -> RequestContext:
+        """
+        Builds the messages of a request.
+
+        Args:
+            prompt (list): Objective and role messages from plan(), not modified.
+            configurations (str): Output rules appended as a system message.
+            previous_data (list): Upstream completions this request refines, oldest first.
+            prompt_tokens (int): Tokens of the prompt precounted by plan(), counted here when None.
+
+        Returns:
+            RequestContext: Messages plus token accounting for the request.
+        """
+        if isinstance(previous_data, str):
+            previous_data = [previous_data]
+        if prompt_tokens is None:
+            prompt_tokens = self.counter.count_messages(prompt, self.model)
+        messages = [dict(message) for message in prompt]
+        configuration_message = {"role": "system", "content": configurations}
+        messages.append(configuration_message)
+        base_tokens = prompt_tokens + self.counter.count_message(configuration_message, self.model)
+        if not previous_data:
+            return RequestContext(messages, base_tokens, base_tokens, 0, [])
+
+        instruction = "Use the output from the previous completion below as your starting point for completing your task. Make changes in place.\n\n"
+        budget = self.context_tokens - self.completion_tokens - base_tokens - self.counter.count_message({"role": "system", "content": instruction}, self.model)
+        if budget <= 0:
+            logging.warning(f"Prompt uses {base_tokens} of {self.context_tokens} context tokens, previous completions are summarized only")
+
+        focus = self.keywords(" ".join(str(message['content']) for message in prompt))
+        sections = self.split_sections(previous_data)
+        ranked = sorted(
+            sections,
+            key=lambda section: (len(focus & self.keywords(f"{section.name} {section.app_type or ''} {section.text}")), section.recency),
+            reverse=True
+        )
+
+        # The same request with every section in full, what trimming is measured against
+        full_tokens = base_tokens + self.counter.count_message(
+            {"role": "system", "content": instruction + "\n\n".join(section.text for section in sections)}, self.model
+        )
+
+        selected = {}
+        omitted = []
+        for section in ranked:
+            tokens = self.counter.count(section.text, self.model)
+            if tokens <= budget:
+                selected[section.name] = section.text
+                budget -= tokens
+                continue
+            trimmed = self._trim(section, tokens, budget) if budget >= self.min_section_tokens else None
+            if trimmed is None:
+                trimmed = self._summary(section)
+                omitted.append(section.name)
+            selected[section.name] = trimmed
+            budget -= self.counter.count(trimmed, self.model)
+
+        # Send the sections in their original order so the files read like the completion
+        previous_message = {"role": "system", "content": instruction + "\n\n".join(selected[section.name] for section in sections)}
+        messages.append(previous_message)
+        request_tokens = base_tokens + self.counter.count_message(previous_message, self.model)
+        return RequestContext(messages, request_tokens, full_tokens, max(0, full_tokens - request_tokens), omitted)
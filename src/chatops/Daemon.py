@@ -0,0 +1,261 @@
+import asyncio
+import hmac
+import itertools
+import json
+import logging
+import os
+import secrets
+import socket
+import tempfile
+
+# The client side only needs the standard library so thin CLI invocations start fast
+
+DEFAULT_SOCKET = os.path.join(".chatops_cache", "chatops.sock")
+DEFAULT_TCP_ADDRESS = "127.0.0.1:8765"
+# Written by a daemon listening on TCP and sent by its clients, readable by its owner only
+DEFAULT_TOKEN_FILE = os.path.join(".chatops_cache", "chatops.token")
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+# Jobs carry their data inline, allow requests well beyond the 64 KiB asyncio default
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+def default_address() -> str:
+    return DEFAULT_SOCKET if hasattr(socket, 'AF_UNIX') else DEFAULT_TCP_ADDRESS
+
+
+def parse_address(address: str):
+    """
+    Splits a daemon address into ('unix', path) or ('tcp', (host, port)).
+
+    Addresses of the form host:port use TCP and must be a loopback host, anything else is
+    a Unix domain socket path.
+
+    Raises:
+        ValueError: Raised for TCP addresses that are not on the loopback interface.
+    """
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit() and os.sep not in host:
+        host = host.strip("[]")
+        if host not in LOOPBACK_HOSTS:
+            raise ValueError(f"The daemon only listens on localhost, got {host}")
+        return 'tcp', (host, int(port))
+    return 'unix', address
+
+
+class ChatOpsDaemon:
+    """
+    Long lived server keeping configurations, encoders, HTTP connections and warm executor
+    workers resident between jobs.
+
+    Clients send one JSON request per connection and receive JSON lines back:
+        {"command": "submit", "job": {...}, "cwd": "/abs/path"}  -> {"event": "accepted", "id": ...} then {"event": "result", ...}
+        {"command": "status"}                                    -> {"event": "status", ...}
+        {"command": "shutdown"}                                  -> {"event": "stopping"}
+
+    Jobs use the BatchRunner job format, with their relative paths and output folder resolved
+    against the working directory of the client. Jobs of every client run on the shared scheduler,
+    so they are multiplexed onto the same in flight, requests per minute and tokens per minute limits.
+
+    As jobs execute generated code, the Unix socket is created for its owner and group only. Any
+    local user can connect to a TCP port, so on TCP every request must carry the random token the
+    daemon writes to token_file, a file only its owner can read.
+    """
+
+    def __init__(self, address: str, runner, max_jobs: int = 4, token_file: str = DEFAULT_TOKEN_FILE):
+        """
+        Args:
+            address (str): Unix socket path or localhost host:port.
+            runner (BatchRunner): Runs submitted jobs on the shared components.
+            max_jobs (int): Jobs planned and processed concurrently across all clients.
+            token_file (str): File the token of a TCP daemon is written to.
+        """
+        self.address = address
+        self.runner = runner
+        self.max_jobs = max(1, max_jobs)
+        self.token_file = os.path.abspath(token_file)
+        self.token = None
+        self.jobs_running = 0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self._ids = itertools.count(1)
+        self._semaphore = None
+        self._stopping = None
+
+    async def _send(self, writer, message: dict):
+        writer.write((json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8'))
+        await writer.drain()
+
+    def status(self) -> dict:
+        scheduler = self.runner.scheduler
+        return {
+            'event': 'status',
+            'address': self.address,
+            'jobs_running': self.jobs_running,
+            'jobs_done': self.jobs_done,
+            'jobs_failed': self.jobs_failed,
+            'requests_in_flight': scheduler.in_flight if scheduler is not None else None,
+            'requests_admitted': scheduler.admitted if scheduler is not None else None,
+            'response_cache': self.runner.response_cache.stats() if self.runner.response_cache is not None else None,
+            'execution_cache': self.runner.execution_cache.stats() if self.runner.execution_cache is not None else None,
+            'deployments': self.runner.transport.stats() if hasattr(self.runner.transport, 'stats') else None
+        }
+
+    async def _submit(self, writer, job: dict, cwd: str):
+        try:
+            # Numbered so the same job submitted twice gets two ids
+            job_id = f"{self.runner.job_id(job)}-{next(self._ids)}"
+            if not isinstance(cwd, str) or not os.path.isabs(cwd):
+                raise ValueError("submit requests need the absolute working directory of the client as 'cwd'")
+        except ValueError as e:
+            await self._send(writer, {'event': 'error', 'error': str(e)})
+            return
+        # Relative paths and the output folder are resolved against the client, not the daemon
+        job = {**job, 'cwd': cwd}
+        await self._send(writer, {'event': 'accepted', 'id': job_id})
+        async with self._semaphore:
+            self.jobs_running += 1
+            try:
+                record = await self.runner.run_job(job_id, job)
+            finally:
+                self.jobs_running -= 1
+        self.jobs_done += 1
+        if record['status'] != 'completed':
+            self.jobs_failed += 1
+        await self._send(writer, {'event': 'result', **record})
+
+    async def handle(self, reader, writer):
+        try:
+            request = json.loads(await reader.readline())
+            if self.token is not None and not hmac.compare_digest(str(request.get('token', '')), self.token):
+                await self._send(writer, {'event': 'error', 'error': f"Invalid or missing token, read it from {self.token_file}"})
+                return
+            command = request.get('command', 'submit')
+            if command == 'submit':
+                await self._submit(writer, request.get('job'), request.get('cwd'))
+            elif command == 'status':
+                await self._send(writer, self.status())
+            elif command == 'shutdown':
+                await self._send(writer, {'event': 'stopping'})
+                self._stopping.set()
+            else:
+                await self._send(writer, {'event': 'error', 'error': f"Unknown command '{command}'"})
+        except (json.JSONDecodeError, ValueError, AttributeError) as e:
+            await self._send(writer, {'event': 'error', 'error': f"Invalid request: {e}"})
+        except ConnectionError:
+            logging.info("Client disconnected")
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self._semaphore = asyncio.Semaphore(self.max_jobs)
+        self._stopping = asyncio.Event()
+        kind, target = parse_address(self.address)
+        if kind == 'tcp':
+            self._write_token()
+            server = await asyncio.start_server(self.handle, *target, limit=MAX_REQUEST_BYTES)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            if os.path.exists(target):
+                # A socket left behind by a daemon that did not shut down cleanly
+                os.remove(target)
+            # Bound with owner and group access only, there is no window where others can connect
+            umask = os.umask(0o117)
+            try:
+                server = await asyncio.start_unix_server(self.handle, target, limit=MAX_REQUEST_BYTES)
+            finally:
+                os.umask(umask)
+        logging.info(f"ChatOps daemon listening on {self.address}")
+        try:
+            async with server:
+                await self._stopping.wait()
+        finally:
+            if kind == 'unix' and os.path.exists(target):
+                os.remove(target)
+            if self.token is not None and os.path.exists(self.token_file):
+                os.remove(self.token_file)
+            if self.runner.transport is not None:
+                await self.runner.transport.close()
+            logging.info(f"ChatOps daemon stopped after {self.jobs_done} job(s)")
+
+    def _write_token(self):
+        self.token = secrets.token_hex(32)
+        directory = os.path.dirname(os.path.abspath(self.token_file))
+        os.makedirs(directory, exist_ok=True)
+        # mkstemp creates the file readable and writable by its owner only
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            file.write(self.token)
+        os.replace(tmp_path, self.token_file)
+
+    def run(self):
+        asyncio.run(self.serve())
+
+
+class DaemonClient:
+    """
+    Blocking client for ChatOpsDaemon, used by the CLI as a thin front end.
+    """
+
+    def __init__(self, address: str, timeout: float = None, token_file: str = DEFAULT_TOKEN_FILE):
+        """
+        Args:
+            address (str): Unix socket path or localhost host:port of the daemon.
+            timeout (float): Seconds to wait for each response, None to wait for the job to finish.
+            token_file (str): Token written by a daemon listening on TCP.
+        """
+        self.address = address
+        self.timeout = timeout
+        self.token_file = token_file
+
+    def _token(self) -> str:
+        try:
+            with open(self.token_file, 'r') as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            raise ConnectionError(f"No daemon token in {self.token_file}, start the daemon from this folder or pass its token file")
+
+    def _connect(self) -> socket.socket:
+        kind, target = parse_address(self.address)
+        if kind == 'tcp':
+            connection = socket.create_connection(target, timeout=self.timeout)
+        else:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            connection.connect(target)
+        return connection
+
+    def request(self, payload: dict):
+        """
+        Sends a request and yields every response line.
+
+        Raises:
+            ConnectionError: Raised when no daemon is listening on the address.
+        """
+        if parse_address(self.address)[0] == 'tcp':
+            payload = {**payload, 'token': self._token()}
+        try:
+            connection = self._connect()
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise ConnectionError(f"No ChatOps daemon listening on {self.address}: {e}")
+        with connection, connection.makefile('rwb') as stream:
+            stream.write((json.dumps(payload, ensure_ascii=False) + "\n").encode('utf-8'))
+            stream.flush()
+            for line in stream:
+                yield json.loads(line)
+
+    def submit(self, job: dict) -> dict:
+        """
+        Submits a job and waits for its result record.
+        """
+        for response in self.request({'command': 'submit', 'job': job, 'cwd': os.getcwd()}):
+            if response['event'] == 'accepted':
+                logging.info(f"Job {response['id']} accepted by the daemon at {self.address}")
+            elif response['event'] in ('result', 'error'):
+                return response
+        raise ConnectionError("The daemon closed the connection before the job finished")
+
+    def status(self) -> dict:
+        return next(self.request({'command': 'status'}))
+
+    def shutdown(self) -> dict:
+        return next(self.request({'command': 'shutdown'}))
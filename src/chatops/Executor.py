@@ -0,0 +1,229 @@
+import concurrent.futures
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+from time import monotonic
+from src.chatops.Tracing import tracer
+
+try:
+    import resource
+except ImportError:  # Windows has no rlimits
+    resource = None
+
+# Sets the limits given as arguments and replaces itself with the command, used where prlimit is not available
+LIMITS_WRAPPER = """
+import os, resource, sys
+cpu_time, memory = int(sys.argv[1]), int(sys.argv[2])
+resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time))
+if memory:
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+os.execvp(sys.argv[3], sys.argv[3:])
+"""
+
+
+def format_result(status: str, stdout: str, stderr: str) -> str:
+    """
+    Returns the single result text reported for a block: its output when it completed, its error otherwise.
+    """
+    if status == 'completed':
+        return stdout
+    if status == 'language_not_installed':
+        return stderr
+    return f"Error executing code: {stderr}"
+
+
+class CodeExecutor:
+    """
+    Runs generated code blocks in parallel on a bounded worker pool.
+
+    Every block runs in its own process group with a wall clock timeout and, where the
+    platform supports rlimits, CPU time and an opt-in address space limit so concurrent
+    executions cannot starve the host. Limits are set with prlimit once the block started, or
+    by a small wrapper that execs the interpreter, as preexec_fn is not safe in worker threads.
+    """
+
+    python_app_types = ('python', 'python3')
+
+    def __init__(self, max_workers: int = None, timeout: float = 60, cpu_time: int = None, memory_limit_mb: int = None, runner_pool=None, progress=None):
+        """
+        Args:
+            max_workers (int): Maximum concurrent executions, defaults to the CPU count.
+            timeout (float): Wall clock seconds allowed per block.
+            cpu_time (int): CPU seconds allowed per block, defaults to the wall clock timeout.
+            memory_limit_mb (int): Address space limit per block in MB, None for no limit. Runtimes reserving
+                large virtual address ranges, e.g. the JVM or node, fail under low limits.
+            runner_pool (RunnerPool): Warm Python workers used for python blocks instead of a new interpreter.
+            progress (ProgressTracker): Receives queued, running and finished block events.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.cpu_time = cpu_time or max(1, int(timeout))
+        self.memory_limit_mb = memory_limit_mb
+        self.runner_pool = runner_pool
+        self.progress = progress
+        self._pool = None
+        self._versions = {}
+        self._versions_lock = threading.Lock()
+
+    @property
+    def pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="chatops-exec")
+        return self._pool
+
+    @property
+    def memory_limit(self) -> int:
+        return self.memory_limit_mb * 1024 * 1024 if self.memory_limit_mb else 0
+
+    def _command(self, app_type: str, code_content: str) -> list:
+        command = [app_type, '-c', code_content]
+        if os.name != 'posix' or resource is None or hasattr(resource, 'prlimit'):
+            return command
+        if shutil.which(app_type) is None:
+            raise FileNotFoundError(app_type)
+        return [sys.executable, '-c', LIMITS_WRAPPER, str(self.cpu_time), str(self.memory_limit)] + command
+
+    def _apply_limits(self, pid: int):
+        try:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (self.cpu_time, self.cpu_time))
+            if self.memory_limit:
+                resource.prlimit(pid, resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
+        except ProcessLookupError:
+            # The block already exited
+            pass
+
+    def interpreter_version(self, app_type: str):
+        """
+        Returns the version string of the interpreter that runs an app_type, or None when it is not installed.
+        """
+        if self.runner_pool is not None and app_type.lower() in self.python_app_types:
+            return f"{sys.executable} {sys.version}"
+
+        with self._versions_lock:
+            if app_type not in self._versions:
+                try:
+                    process = subprocess.run([app_type, '--version'], capture_output=True, text=True, timeout=10)
+                    self._versions[app_type] = (process.stdout + process.stderr).strip()
+                except (FileNotFoundError, subprocess.TimeoutExpired):
+                    self._versions[app_type] = None
+            return self._versions[app_type]
+
+    # Seconds between checks of the cancel event while a block runs
+    cancel_poll_interval = 0.1
+
+    def run(self, app_type: str, code_content: str, cancel: threading.Event = None):
+        """
+        Executes a single code block.
+
+        Args:
+            app_type (str): Interpreter used to run the code with '-c'.
+            code_content (str): Code to execute.
+            cancel (threading.Event): Kills the block as soon as it is set.
+
+        Returns:
+            tuple: (status, result) where status is one of completed, failed, timeout, cancelled or language_not_installed.
+        """
+        status, stdout, stderr = self.execute(app_type, code_content, cancel)
+        return status, format_result(status, stdout, stderr)
+
+    def execute(self, app_type: str, code_content: str, cancel: threading.Event = None):
+        """
+        Executes a single code block, keeping its output and errors apart.
+
+        Returns:
+            tuple: (status, stdout, stderr), stderr describes the failure when the block timed out,
+            was cancelled or its language is not installed.
+        """
+        if cancel is not None and cancel.is_set():
+            return 'cancelled', '', "cancelled"
+        if self.runner_pool is not None and app_type.lower() in self.python_app_types:
+            return self.runner_pool.execute(code_content, cancel=cancel)
+
+        posix = os.name == 'posix'
+        try:
+            process = subprocess.Popen(
+                self._command(app_type, code_content),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                start_new_session=posix
+            )
+        except FileNotFoundError:
+            # Handle the case where the programming language is not installed
+            return 'language_not_installed', '', f"Error: {app_type} is not installed."
+        if posix and resource is not None and hasattr(resource, 'prlimit'):
+            self._apply_limits(process.pid)
+
+        deadline = monotonic() + self.timeout
+        while True:
+            remaining = deadline - monotonic()
+            try:
+                stdout, stderr = process.communicate(timeout=max(0, min(remaining, self.cancel_poll_interval) if cancel is not None else remaining))
+                break
+            except subprocess.TimeoutExpired:
+                if cancel is not None and cancel.is_set():
+                    self._kill(process)
+                    return 'cancelled', '', "cancelled"
+                if monotonic() >= deadline:
+                    self._kill(process)
+                    return 'timeout', '', f"timed out after {self.timeout} seconds"
+
+        if process.returncode != 0:
+            if posix and process.returncode == -signal.SIGXCPU:
+                return 'timeout', stdout.strip(), f"exceeded {self.cpu_time} seconds of CPU time"
+            return 'failed', stdout.strip(), stderr.strip()
+        return 'completed', stdout.strip(), stderr.strip()
+
+    @staticmethod
+    def _kill(process: subprocess.Popen):
+        # Kill the whole process group so children spawned by the block do not linger
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.communicate()
+
+    def run_all(self, jobs, cancel: threading.Event = None):
+        """
+        Executes code blocks concurrently and yields results as they finish.
+
+        Args:
+            jobs (dict): {key: (app_type, code_content)}
+            cancel (threading.Event): Kills running blocks and skips queued ones once set, they finish as cancelled.
+
+        Yields:
+            tuple: (key, status, stdout, stderr) in completion order, see execute.
+        """
+        if self.progress is not None:
+            for _ in jobs:
+                self.progress.block_queued()
+        futures = {self.pool.submit(self._run_job, key, app_type, code_content, cancel): key for key, (app_type, code_content) in jobs.items()}
+        for future in concurrent.futures.as_completed(futures):
+            status, stdout, stderr = future.result()
+            logging.debug(f"Executed {futures[future]}: {status}")
+            yield futures[future], status, stdout, stderr
+
+    def _run_job(self, key, app_type: str, code_content: str, cancel: threading.Event = None):
+        with tracer.span("execute", block=key, app_type=app_type, warm=self.runner_pool is not None) as span:
+            if self.progress is None:
+                status, stdout, stderr = self.execute(app_type, code_content, cancel)
+            else:
+                self.progress.block_started()
+                status = 'failed'
+                try:
+                    status, stdout, stderr = self.execute(app_type, code_content, cancel)
+                finally:
+                    self.progress.block_finished(status)
+            span.set(status=status)
+        return status, stdout, stderr
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self.runner_pool is not None:
+            self.runner_pool.shutdown()
@@ -0,0 +1,106 @@
+import logging
+import os
+from collections import Counter
+from src.chatops.ArtifactWriter import ArtifactWriter
+from src.chatops.Manifest import ProjectManifest
+
+
+class IncrementalBuild:
+    """
+    Regenerates only the tasks whose inputs changed since the latest version of a project.
+
+    Every task is fingerprinted (see Prompt_Manager.task_fingerprints) and the fingerprint is
+    recorded with the files the task produced in the project manifest. On the next run, tasks
+    with the same fingerprint are removed from the plan and their files are linked into the new
+    version from the blob store, so only changed tasks are requested and executed. Tasks with a
+    failed role or code block are not recorded as up to date and run again.
+
+    Usage:
+        build = IncrementalBuild(prompt_manager, ProjectManifest(output_location, project))
+        build.prepare()                  # before the CodeProcessor claims its version
+        prompt_manager.main()
+        processor = CodeProcessor(...)
+        build.process(processor)
+        processor.publish()
+        build.record(processor)
+    """
+
+    passing_statuses = ('completed', 'saved_directly')
+
+    def __init__(self, manager, manifest: ProjectManifest, extra=None):
+        """
+        Args:
+            manager (Prompt_Manager): Manager holding the plan of the run.
+            manifest (ProjectManifest): Manifest of the project written to.
+            extra: Settings folded into every fingerprint, e.g. the output override and no_testing.
+        """
+        self.manager = manager
+        self.manifest = manifest
+        self.fingerprints = manager.task_fingerprints(extra)
+        self.blob_dir = os.path.join(manifest.output_location, '.blobs')
+        self.unchanged = {}
+        self.task_files = {}
+        self.failed = set()
+
+    def _available(self, files: dict) -> bool:
+        return all(os.path.exists(ArtifactWriter.blob_path(self.blob_dir, digest)) for digest in files.values())
+
+    def prepare(self) -> dict:
+        """
+        Compares the fingerprints with the latest version and removes unchanged tasks from the plan.
+
+        Returns:
+            dict: {task: {file name: sha256}} of the unchanged tasks.
+        """
+        latest = self.manifest.latest_version()
+        previous = self.manifest.version_tasks(latest) if latest else {}
+        for task, fingerprint in self.fingerprints.items():
+            entry = previous.get(task)
+            if entry and entry['fingerprint'] == fingerprint and self._available(entry['files']):
+                self.unchanged[task] = entry['files']
+        self.manager.skip_tasks(self.unchanged)
+        logging.info(f"Incremental run: {len(self.fingerprints) - len(self.unchanged)} task(s) changed, "
+                     f"{len(self.unchanged)} unchanged task(s) copied forward from version {latest}")
+        return self.unchanged
+
+    def process(self, processor, output_file: str = None, output_app_type: str = None) -> Counter:
+        """
+        Carries the files of unchanged tasks into the version of processor, then saves and executes the
+        code blocks of every new completion without publishing.
+
+        Returns:
+            Counter: Number of code blocks per status.
+        """
+        for task, files in self.unchanged.items():
+            processor.carry_forward(files)
+            self.task_files[task] = dict(files)
+        # Tasks with a failed or skipped role are incomplete and run again next time
+        self.failed.update(failure['task'] for failure in self.manager.failures)
+
+        statuses = Counter()
+        for record in self.manager.completions:
+            task = record['task']
+            files = self.task_files.setdefault(task, {})
+            code_blocks = processor.parse_code_blocks(record['output'])
+            for key, result in processor.iter_code_blocks(code_blocks, output_file=output_file, output_app_type=output_app_type, publish=False):
+                statuses[result['status']] += 1
+                if result['status'] not in self.passing_statuses:
+                    self.failed.add(task)
+                    continue
+                # Blocks saved without execution ignore the output override
+                if result['status'] == 'saved_directly' or output_file is None:
+                    file_name = processor.file_name(key, result['app_type'], code_blocks[key].get('folder_name'))
+                else:
+                    file_name = processor.file_name(output_file, output_app_type)
+                files[file_name] = processor.saved_files[file_name]
+        return statuses
+
+    def record(self, processor):
+        """
+        Records the fingerprint and files of every task with the version of processor.
+        """
+        tasks = {
+            task: {'fingerprint': None if task in self.failed else fingerprint, 'files': self.task_files.get(task, {})}
+            for task, fingerprint in self.fingerprints.items()
+        }
+        self.manifest.record_tasks(processor.version, tasks)
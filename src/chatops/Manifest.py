@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from src.chatops.ArtifactWriter import UMASK
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class ProjectManifest:
+    """
+    Per project index of output versions stored next to the version folders.
+
+    Versions are allocated from a counter kept in the lock file under an exclusive file lock,
+    so concurrent runs never claim the same version and allocation does not rewrite the
+    manifest. A version enters the manifest when it is published, with the files and content
+    hashes it holds and, for incremental runs, the input fingerprint and files of every task.
+    Runs that fail or save nothing leave a gap in the numbering but no entry.
+
+    Layout of {output_location}/{project}.manifest.json:
+        {"project": "bot", "latest_version": 2,
+         "versions": {"2": {"folder": "bot_v2", "created": "...", "files": {"main.py": "<sha256>"},
+                            "tasks": {"Write a hello world script": {"fingerprint": "<sha256>", "files": {"main.py": "<sha256>"}}}}}}
+    """
+
+    def __init__(self, output_location: str, project: str):
+        self.output_location = output_location
+        self.project = project
+        self.path = os.path.join(output_location, f"{project}.manifest.json")
+        self.lock_path = f"{self.path}.lock"
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds an exclusive lock on the manifest across processes.
+        """
+        os.makedirs(self.output_location, exist_ok=True)
+        with open(self.lock_path, 'a+') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield lock_file
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def load(self) -> dict:
+        """
+        Reads the manifest, building it from existing version folders the first time.
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return self._from_folders()
+
+    def _from_folders(self) -> dict:
+        # One directory listing to adopt projects created before the manifest existed
+        pattern = re.compile(rf"^{re.escape(self.project)}_v(\d+)$")
+        versions = {}
+        if os.path.isdir(self.output_location):
+            for name in os.listdir(self.output_location):
+                match = pattern.match(name)
+                if match:
+                    versions[match.group(1)] = {'folder': name, 'created': None, 'files': {}}
+        latest = max((int(version) for version in versions), default=0)
+        if versions:
+            logging.info(f"Indexed {len(versions)} existing version(s) of {self.project}")
+        return {'project': self.project, 'latest_version': latest, 'versions': versions}
+
+    def _write(self, manifest: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_location, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=4)
+        # mkstemp creates the file for its owner only, give the manifest the mode of a regular file
+        os.chmod(tmp_path, 0o666 & ~UMASK)
+        os.replace(tmp_path, self.path)
+
+    def folder_name(self, version: int) -> str:
+        return f"{self.project}_v{version}"
+
+    def allocate_version(self, overwrite: bool = False) -> int:
+        """
+        Claims the version a run writes to, recorded in the manifest once published.
+
+        Args:
+            overwrite (bool): Reuse the latest published version instead of allocating a new one.
+
+        Returns:
+            int: Version number.
+        """
+        if overwrite:
+            return max(self.latest_version(), 1)
+        with self.locked() as lock_file:
+            lock_file.seek(0)
+            counter = lock_file.read().strip()
+            # The manifest is only read once, to seed the counter of an existing project
+            allocated = int(counter) if counter.isdigit() else self.latest_version()
+            version = allocated + 1
+            lock_file.truncate(0)
+            lock_file.write(str(version))
+            lock_file.flush()
+        return version
+
+    def latest_version(self) -> int:
+        """
+        Returns the latest published version, 0 when none was published.
+        """
+        return self.load()['latest_version']
+
+    def version_files(self, version: int) -> dict:
+        """
+        Returns {file name: sha256} recorded for a version.
+        """
+        return self.load()['versions'].get(str(version), {}).get('files', {})
+
+    def version_tasks(self, version: int) -> dict:
+        """
+        Returns {task: {'fingerprint': sha256, 'files': {file name: sha256}}} recorded for a version.
+        """
+        return self.load()['versions'].get(str(version), {}).get('tasks', {})
+
+    def record_tasks(self, version: int, tasks: dict):
+        """
+        Records the input fingerprint and files of every task of a published version, replacing earlier entries.
+
+        Args:
+            version (int): Version number.
+            tasks (dict): {task: {'fingerprint': sha256 or None, 'files': {file name: sha256}}}
+        """
+        with self.locked():
+            manifest = self.load()
+            entry = manifest['versions'].get(str(version))
+            if entry is None:
+                # The version saved nothing and was never published
+                return
+            entry['tasks'] = tasks
+            self._write(manifest)
+
+    def record_files(self, version: int, files: dict):
+        """
+        Records a published version with the file names and content hashes written to it.
+        Nothing is recorded for a version without files, as no folder was published.
+
+        Args:
+            version (int): Version number.
+            files (dict): {file name: sha256}
+        """
+        if not files:
+            return
+        with self.locked():
+            manifest = self.load()
+            entry = manifest['versions'].setdefault(str(version), {'folder': self.folder_name(version), 'created': None, 'files': {}})
+            entry['created'] = datetime.now().isoformat()
+            entry['files'].update(files)
+            manifest['latest_version'] = max(manifest['latest_version'], version)
+            self._write(manifest)
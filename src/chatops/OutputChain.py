@@ -1,36 +1,255 @@
 
-import subprocess
 import logging
 import shutil
 import json
 import re
-import os
+import threading
+from typing import NamedTuple, Optional
+from src.chatops.Executor import CodeExecutor, format_result
+from src.chatops.Manifest import ProjectManifest
+from src.chatops.ArtifactWriter import ArtifactWriter
+from src.chatops.Tracing import tracer
+
+
+class CodeBlock(NamedTuple):
+    file_name: str
+    folder_name: Optional[str]
+    app_type: str
+    code_content: str
+
+    def entry(self):
+        """
+        Returns the block in the dictionary format used by execute_code_blocks.
+        """
+        return {'app_type': self.app_type, 'code_content': self.code_content, 'folder_name': self.folder_name}
+
+
+class CodeBlockParser:
+    """
+    Single pass tokenizer extracting code blocks from completion text.
+
+    Each ~File_Name:...~ header is paired with the fenced block that follows it and the most
+    recent ~Folder_Name:...~ header. Headers may also sit on the line of the opening fence,
+    before or after it, and a block may fit on one line (```python print(1)```, the first word
+    is the language). Fences opened with a language inside a block are treated as nested and
+    kept in the content. Text can be fed incrementally while streaming, and every block is
+    returned as soon as its closing fence arrives.
+    """
+
+    # Backtick fences with the rest of their line and ~Tag:value~ headers. Both alternatives
+    # start with a literal character and are bounded by a single line so scanning stays linear.
+    token_pattern = re.compile(r'```(?P<fence>[^\n]*)|~(?P<tag>File_Name|Folder_Name):(?P<value>[^~\n]*)~')
+    header_pattern = re.compile(r'#?~(File_Name|Folder_Name):([^~\n]*)~')
+    # Text before a fence that only holds headers, the fence still starts the line
+    header_prefix = re.compile(r'[\s#]*(?:~(?:File_Name|Folder_Name):[^~\n]*~[\s#]*)*')
+
+    def __init__(self, default_file_name: str = None):
+        """
+        Args:
+            default_file_name (str): Name used for blocks without a File_Name header, such blocks are skipped when None.
+        """
+        self.default_file_name = default_file_name
+        self._buffer = ""
+        self._file_name = None
+        self._folder_name = None
+        self._app_type = None
+        self._parts = None  # Content of the open block, None outside a block
+        self._depth = 0     # Nested fences inside the open block
+        self._unnamed = 0
+
+    def _scan(self, text):
+        blocks = []
+        content_start = 0
+        for match in self.token_pattern.finditer(text):
+            fence, tag = match.group('fence', 'tag')
+            if fence is not None:
+                line_start = text.rfind("\n", 0, match.start()) + 1
+                if not self.header_prefix.fullmatch(text, line_start, match.start()):
+                    if fence.strip():
+                        # Backticks inside a line of code
+                        continue
+                    # Closing fence glued to the end of a line of code
+                    lang = None
+                else:
+                    lang = fence.strip()
+            elif self._parts is None:
+                self._set_header(tag, match.group('value'))
+                continue
+            else:
+                # Headers inside a block are part of its content
+                continue
+
+            if self._parts is None:
+                if lang is None:
+                    continue
+                if '~' in lang:
+                    for header in self.header_pattern.finditer(lang):
+                        self._set_header(*header.groups())
+                    lang = self.header_pattern.sub('', lang).strip()
+                if '```' in lang:
+                    # Single line block, the first word is the language
+                    words = lang[:lang.index('```')].split(None, 1)
+                    self._app_type = words[0] if len(words) > 1 else 'text'
+                    self._parts = [words[-1] if words else ""]
+                    block = self._close_block()
+                    if block is not None:
+                        blocks.append(block)
+                    continue
+                self._app_type = lang or 'text'
+                self._parts = []
+                self._depth = 0
+                content_start = match.end() + 1
+                continue
+
+            if lang:
+                # Fence with a language opens a nested block, e.g. code samples inside markdown
+                self._depth += 1
+                continue
+            if self._depth:
+                if lang is not None:
+                    self._depth -= 1
+                continue
+
+            self._parts.append(text[content_start:match.start()])
+            block = self._close_block()
+            if block is not None:
+                blocks.append(block)
+
+        if self._parts is not None:
+            self._parts.append(text[content_start:])
+        return blocks
+
+    def _set_header(self, tag, value):
+        if tag == 'File_Name':
+            self._file_name = value.strip()
+        else:
+            self._folder_name = value.strip()
+
+    def _close_block(self):
+        file_name = self._file_name
+        if file_name is None and self.default_file_name is not None:
+            self._unnamed += 1
+            file_name = self.default_file_name if self._unnamed == 1 else f"{self.default_file_name}_{self._unnamed}"
+
+        block = None
+        if file_name is not None:
+            block = CodeBlock(file_name, self._folder_name, self._app_type, "".join(self._parts).strip())
+        else:
+            logging.debug(f"Skipping {self._app_type} code block without a File_Name header")
+        self._file_name = None
+        self._parts = None
+        return block
+
+    def feed(self, text):
+        """
+        Feeds a chunk of completion text. Only complete lines are tokenized, the rest is buffered.
+
+        Returns:
+            list: CodeBlock for every block completed by the chunk.
+        """
+        self._buffer += text
+        end = self._buffer.rfind("\n") + 1
+        if not end:
+            return []
+        complete, self._buffer = self._buffer[:end], self._buffer[end:]
+        return self._scan(complete)
+
+    def close(self):
+        """
+        Flushes the last partial line once the text has ended.
+        """
+        remainder, self._buffer = self._buffer, ""
+        return self._scan(remainder)
+
+
+# App types saved without being executed
+NON_EXECUTABLES = [
+    'yaml', 'json', 'xml', 'csv', 'toml', 'ini', 'conf',
+    'html', 'md', 'rst',
+    'css', 'scss', 'less',
+    'txt', 'log', 'pdf', 'docx', 'xlsx', 'pptx',
+    'jpg', 'jpeg', 'png', 'gif', 'svg', 'mp3', 'mp4', 'avi', 'mov',
+    'zip', 'tar', 'gz', 'markdown' , 'text', 'txt', 'tf', 'hcl' , 'terraform' , 'xml' , 'sql' ,'env'
+]
+
+
+class CandidateChecker:
+    """
+    Decides whether a candidate completion works by executing its code blocks without saving them.
+
+    Used by Prompt_Manager to race several candidate completions of a role. A check stops at the
+    first failing block and kills the blocks still running when its cancel event is set. Results
+    are stored in the execution cache, so the winning candidate is not executed again when its
+    output is processed.
+    """
+
+    def __init__(self, executor: CodeExecutor, execution_cache=None, no_test: bool = False):
+        self.executor = executor
+        self.execution_cache = execution_cache
+        self.no_test = no_test
+
+    def __call__(self, output: str, cancel: threading.Event = None) -> bool:
+        """
+        Returns True when every executable code block of output completes.
+        """
+        if self.no_test:
+            return True
+        parser = CodeBlockParser()
+        executables = {
+            block.file_name: (block.app_type, block.code_content)
+            for block in parser.feed(output) + parser.close()
+            if block.app_type.lower() not in NON_EXECUTABLES
+        }
+        cancel = cancel or threading.Event()
+        versions = {}
+        for key, (app_type, code_content) in list(executables.items()):
+            versions[key] = self.executor.interpreter_version(app_type) if self.execution_cache is not None else None
+            cached_result = self.execution_cache.get_result(app_type, versions[key], code_content) if versions[key] else None
+            if cached_result is not None:
+                if cached_result['status'] != 'completed':
+                    return False
+                del executables[key]
+
+        passed = True
+        for key, status, stdout, stderr in self.executor.run_all(executables, cancel=cancel):
+            app_type, code_content = executables[key]
+            if status == 'cancelled':
+                passed = False
+                continue
+            if versions[key]:
+                self.execution_cache.set_result(app_type, versions[key], code_content, status, stdout, stderr)
+            if status != 'completed' and passed:
+                passed = False
+                # The candidate lost, stop its other blocks
+                cancel.set()
+        return passed
 
 
 class CodeProcessor:
     """
     Asynchronous class to process code responses and validate their format and content.
     """
-    def __init__(self, output_location="output", output_project:str ="bot", overwrite_project = False, max_retries: int = 3, no_test:bool =False):
+    def __init__(self, output_location="output", output_project:str ="bot", overwrite_project = False, max_retries: int = 3, no_test:bool =False, executor: CodeExecutor = None, execution_cache=None, result_store=None):
         """
         Initializes the CodeProcessor with a maximum number of retries and an output location.
+        Code blocks are run by the given CodeExecutor, which can be shared between processors,
+        and results are reused from the optional ExecutionCache. Execution results are appended
+        to the optional ResultStore as they finish.
         """
 
+        self.executor = executor or CodeExecutor()
+        self.execution_cache = execution_cache
+        self.result_store = result_store
         self.no_test = no_test
         self.max_retries = max_retries
         self.output_location = output_location
         self.output_project = output_project
         self.overwrite_project = overwrite_project
+        self.manifest = ProjectManifest(output_location, output_project)
+        self.saved_files = {}
         self.get_folder_instance = self.get_project_folder(overwrite_project)
-        self.non_executables = [
-            'yaml', 'json', 'xml', 'csv', 'toml', 'ini', 'conf',
-            'html', 'md', 'rst',
-            'css', 'scss', 'less',
-            'txt', 'log', 'pdf', 'docx', 'xlsx', 'pptx',
-            'jpg', 'jpeg', 'png', 'gif', 'svg', 'mp3', 'mp4', 'avi', 'mov',
-            'zip', 'tar', 'gz', 'markdown' , 'text', 'txt', 'tf', 'hcl' , 'terraform' , 'xml' , 'sql' ,'env'
-
-        ]
+        self.writer = ArtifactWriter(output_location, self.manifest.folder_name(self.version))
+        self.non_executables = list(NON_EXECUTABLES)
         
         self.programming_languages = {
             'python'        : 'py',
@@ -101,25 +320,14 @@ class CodeProcessor:
     def parse_code_blocks(self, input_string, file_name:str = None):
         """
         Parse code blocks from the input string and return them as a dictionary.
-        The dictionary has the key from the 'File_Name' and a dictionary with 'app_type' and 'code_content'.
+        The dictionary has the key from the 'File_Name' and a dictionary with 'app_type', 'code_content' and 'folder_name'.
+        When file_name is passed it is used for blocks that have no 'File_Name' header.
         """
-        if file_name == None:
-            code_dict = {}
-            code_pattern = r'```(\S+)\s*([\s\S]*?)```'
-            file_name_pattern = r'~File_Name:(.*?)~'
-
-            # Find all File_Name matches in the input_string
-            file_name_matches = re.findall(file_name_pattern, input_string)
-
-            # Find all code matches in the input_string
-            code_matches = re.findall(code_pattern, input_string, re.DOTALL)
-
-            for file_name, (app_type, code_content) in zip(file_name_matches, code_matches):
-                code_dict[file_name] = {'app_type': app_type, 'code_content': code_content.strip()}
-        else:
-            ""
-
-        return code_dict
+        with tracer.span("parse_code_blocks", characters=len(input_string)) as span:
+            parser = CodeBlockParser(default_file_name=file_name)
+            blocks = parser.feed(input_string) + parser.close()
+            span.set(blocks=len(blocks))
+        return {block.file_name: block.entry() for block in blocks}
 
 
 
@@ -127,88 +335,132 @@ class CodeProcessor:
         """
         Get the project folder path based on the version.
         """
-        latest_version = self.get_latest_version(overwrite)
-        return f"{self.output_location}/{self.output_project}_v{latest_version}"
+        self.version = self.get_latest_version(overwrite)
+        return f"{self.output_location}/{self.manifest.folder_name(self.version)}"
 
     def get_latest_version(self, overwrite=False):
         """
-        Find the latest version number for the project.
+        Claim the version number for this run from the project manifest.
+        A new version is allocated unless overwrite is set, which reuses the latest version.
         """
-        version = 1
-        while os.path.exists(f"{self.output_location}/{self.output_project}_v{version}"):
-            version += 1
+        return self.manifest.allocate_version(overwrite)
 
-        # Subtract 1 from the version if overwrite is set to True
-        if overwrite:
-            version -= 1
+    def file_name(self, key, app_type, folder_name=None):
+        """
+        Returns the name a code block is saved under, inside its Folder_Name when it has one.
+        Folder names are kept inside the project folder: absolute parts, '.' and '..' are dropped.
+        """
+        file_extension = self.programming_languages.get(app_type.lower(), 'txt')
+        folders = [part for part in re.split(r'[\\/]+', folder_name or '') if part.strip() not in ('', '.', '..')]
+        return "/".join(folders + [f"{key}.{file_extension}"])
 
-        return version
+    def carry_forward(self, files: dict) -> bool:
+        """
+        Stages files of an earlier version unchanged, see ArtifactWriter.adopt.
+
+        Args:
+            files (dict): {file name: sha256}
 
-    def save_code_to_file(self, key, app_type, code_content):
+        Returns:
+            bool: False when a file could not be carried forward.
         """
-        Save code content to a file based on the key, app_type, and code_content.
+        carried = True
+        for file_name, digest in files.items():
+            if self.writer.adopt(file_name, digest):
+                self.saved_files[file_name] = digest
+            else:
+                carried = False
+        return carried
+
+    def save_code_to_file(self, key, app_type, code_content, folder_name=None):
         """
-        output_folder = self.get_folder_instance
-        file_extension = self.programming_languages.get(app_type.lower(), 'txt')
-        file_name = f"{output_folder}/{key}.{file_extension}"
+        Stage code content as a file of the project version based on the key, app_type, and code_content.
+        Staged files become visible in the project folder when the version is published.
+        """
+        file_name = self.file_name(key, app_type, folder_name)
+        with tracer.span("save_code_to_file", file=file_name, app_type=app_type):
+            self.saved_files[file_name] = self.writer.write(file_name, code_content)
+
+    def publish(self):
+        """
+        Publish the staged files to the project folder and record them in the project manifest.
+        """
+        with tracer.span("publish", files=len(self.saved_files)):
+            self.writer.publish()
+            self.manifest.record_files(self.version, self.saved_files)
 
-        # Create the output folder if it doesn't exist
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-            
-        with open(file_name, 'w') as file:
-            file.write(code_content)
 
+    def execute_code_blocks(self, code_dict, output_file:str = None, output_app_type:str = None, use_cache:bool = True, publish:bool = True):
+        """
+        Execute code blocks in parallel and return the results in the order they finish.
+        Results found in the execution cache are returned without running the code and marked with 'cached': True.
+        Pass use_cache=False to always execute, e.g. for non-deterministic code.
+        Saved files are published to the project folder at the end unless publish is False.
+        """
+        return json.dumps(dict(self.iter_code_blocks(code_dict, output_file, output_app_type, use_cache, publish)), indent=4)
 
-    def execute_code_blocks(self, code_dict, output_file:str = None, output_app_type:str = None):
+    def iter_code_blocks(self, code_dict, output_file:str = None, output_app_type:str = None, use_cache:bool = True, publish:bool = True):
         """
-        Execute code blocks using subprocess and return the results.
+        Executes code blocks like execute_code_blocks but yields (key, result) as each block finishes instead of
+        collecting every result. Results are also appended to the result store when one is set.
+        Saved files are published once the generator is exhausted unless publish is False.
         """
         if (output_file is None and output_app_type is not None) or (output_file is not None and output_app_type is None):
             raise ValueError("Both output_file and output_app_type must be provided together when passed")
 
-
-        results = {}
+        executables = {}
+        folders = {key: value.get('folder_name') for key, value in code_dict.items()}
 
         for key, value in code_dict.items():
             app_type = value['app_type']
             code_content = value['code_content']
-            result = {'code_executed': code_content, 'status': '', 'result': '', 'app_type': app_type}
 
             # Check if the app_type is in the list of languages to save directly
             if app_type.lower() in self.non_executables or self.no_test:
                 # Save code directly without execution
-                self.save_code_to_file(key, app_type, code_content)
-                result['status'] = 'saved_directly'
-
+                self.save_code_to_file(key, app_type, code_content, folders[key])
+                yield key, self._store_result(key, {'code_executed': code_content, 'status': 'saved_directly', 'result': '', 'app_type': app_type})
             else:
-                # Run the code using subprocess
-                try:
-                    process = subprocess.run([app_type, '-c', code_content], capture_output=True, text=True, check=True)
-                    result['result'] = process.stdout.strip()
-                    result['status'] = 'completed'
-
-                    # Save code to file if execution is successful
-                    if result['status'] == 'completed':
-                        
-                        if output_file == None:
-                            self.save_code_to_file(key, app_type, code_content)
-                        else :
-                            self.save_code_to_file(output_file, output_app_type, code_content)
-
-                except subprocess.CalledProcessError as e:
-                    result['status'] = 'failed'
-                    result['result'] = f"Error executing code: {e.stderr.strip()}"
-
-                except FileNotFoundError:
-                    # Handle the case where the programming language is not installed
-                    result['status'] = 'language_not_installed'
-                    result['result'] = f"Error: {app_type} is not installed."
-
-            results[key] = result
-
-        return json.dumps(results, indent=4)
-    
+                executables[key] = (app_type, code_content)
+
+        cache = self.execution_cache if use_cache else None
+        versions = {}
+        if cache is not None:
+            for key, (app_type, code_content) in list(executables.items()):
+                versions[key] = self.executor.interpreter_version(app_type)
+                cached_result = cache.get_result(app_type, versions[key], code_content) if versions[key] else None
+                if cached_result is not None:
+                    del executables[key]
+                    status = cached_result['status']
+                    output = format_result(status, cached_result['stdout'], cached_result['stderr'])
+                    yield key, self._record_execution(key, app_type, code_content, status, output, True, output_file, output_app_type, folders[key])
+
+        with tracer.span("execute_code_blocks", blocks=len(code_dict), executed=len(executables)):
+            for key, status, stdout, stderr in self.executor.run_all(executables):
+                app_type, code_content = executables[key]
+                if cache is not None and versions[key]:
+                    cache.set_result(app_type, versions[key], code_content, status, stdout, stderr)
+                output = format_result(status, stdout, stderr)
+                yield key, self._record_execution(key, app_type, code_content, status, output, False, output_file, output_app_type, folders[key])
+
+        if publish:
+            self.publish()
+
+    def _record_execution(self, key, app_type, code_content, status, output, cached, output_file=None, output_app_type=None, folder_name=None):
+        # Save code to file if execution is successful
+        if status == 'completed':
+            if output_file == None:
+                self.save_code_to_file(key, app_type, code_content, folder_name)
+            else :
+                self.save_code_to_file(output_file, output_app_type, code_content)
+
+        return self._store_result(key, {'code_executed': code_content, 'status': status, 'result': output, 'app_type': app_type, 'cached': cached})
+
+    def _store_result(self, key, result):
+        if self.result_store is not None:
+            self.result_store.append({'file': key, **result})
+        return result
+
 '''
 # Sample Usage #
 input_string = """
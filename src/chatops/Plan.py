@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+
+class PlanFile:
+    """
+    Versioned, serialized output of Prompt_Manager.plan().
+
+    A plan holds the precomputed messages and token counts of every role and task plus
+    fingerprints of the inputs it was compiled from, so it can be executed again on any
+    machine without reading the data files or tokenizing the prompts.
+
+    Layout:
+        {"format": "chatops-plan", "version": 1, "created": "...", "model": "gpt-3.5-turbo",
+         "objective": "...", "roles": {"Writer": {"instructions": [...], "depends_on": []}},
+         "fingerprints": {"objective": "<sha256>", "roles": "<sha256>", "configurations": "<sha256>",
+                          "tasks": {"task": "<sha256 of the data>"}},
+         "tasks": [{"task": "...", "system": [...], "Writer": [...], "token_usage": {...}}]}
+    """
+
+    format_name = "chatops-plan"
+    format_version = 1
+
+    @staticmethod
+    def fingerprint(value) -> str:
+        """
+        Returns a sha256 of a JSON serializable value.
+        """
+        payload = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def build(cls, model: str, objective: str, roles: dict, configurations: str, task_data: dict, tasks: list) -> dict:
+        """
+        Assembles a plan artifact.
+
+        Args:
+            model (str): Model the token counts were computed with.
+            objective (str): Objective of the run.
+            roles (dict): {role: {'instructions': [...], 'depends_on': [...]}} in execution order.
+            configurations (str): Output rules sent with every request.
+            task_data (dict): {task name: data} the plan was compiled from.
+            tasks (list): plan_task results in task order.
+        """
+        return {
+            'format': cls.format_name,
+            'version': cls.format_version,
+            'created': datetime.now().isoformat(),
+            'model': model,
+            'objective': objective,
+            'roles': roles,
+            'fingerprints': {
+                'objective': cls.fingerprint(objective),
+                'roles': cls.fingerprint(roles),
+                'configurations': cls.fingerprint(configurations),
+                'tasks': {task: cls.fingerprint(data) for task, data in task_data.items()}
+            },
+            'tasks': tasks
+        }
+
+    @staticmethod
+    def save(path: str, plan: dict):
+        """
+        Writes a plan atomically.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(plan, file, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logging.info(f"Saved plan of {len(plan['tasks'])} task(s) to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> dict:
+        """
+        Reads and validates a plan.
+
+        Raises:
+            ValueError: Raised when the file is not a plan or was written by an unsupported version.
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            plan = json.load(file)
+        if not isinstance(plan, dict) or plan.get('format') != cls.format_name:
+            raise ValueError(f"{path} is not a ChatOps plan file")
+        if plan.get('version') != cls.format_version:
+            raise ValueError(f"Plan file {path} has version {plan.get('version')}, expected {cls.format_version}")
+        if cls.fingerprint(plan['roles']) != plan['fingerprints']['roles']:
+            raise ValueError(f"Roles of plan file {path} do not match their fingerprint")
+        return plan
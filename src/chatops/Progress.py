@@ -0,0 +1,170 @@
+import shutil
+import sys
+import threading
+from collections import Counter
+from time import monotonic
+
+
+class ProgressTracker:
+    """
+    Counters for LLM requests and code block executions, fed by scheduler and executor events.
+
+    Recording an event only updates counters under a lock, nothing is drawn on the caller's
+    thread. ProgressRenderer reads a snapshot at its own frame rate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = monotonic()
+        self.requests_queued = 0
+        self.requests_in_flight = 0
+        self.requests_done = 0
+        self.retries = 0
+        self.tokens = 0
+        self.blocks_queued = 0
+        self.blocks_running = 0
+        self.block_statuses = Counter()
+        # Bumped on every event so the renderer only redraws when something changed
+        self.version = 0
+
+    def _update(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+            self.version += 1
+
+    def request_queued(self):
+        self._update(requests_queued=1)
+
+    def request_started(self):
+        self._update(requests_queued=-1, requests_in_flight=1)
+
+    def request_finished(self):
+        self._update(requests_in_flight=-1, requests_done=1)
+
+    def request_cancelled(self):
+        self._update(requests_queued=-1)
+
+    def request_retried(self):
+        self._update(retries=1)
+
+    def tokens_used(self, tokens: int):
+        if tokens:
+            self._update(tokens=tokens)
+
+    def block_queued(self):
+        self._update(blocks_queued=1)
+
+    def block_started(self):
+        self._update(blocks_queued=-1, blocks_running=1)
+
+    def block_finished(self, status: str):
+        with self._lock:
+            self.blocks_running -= 1
+            self.block_statuses[status] += 1
+            self.version += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = monotonic() - self.started
+            return {
+                'elapsed': elapsed,
+                'requests_queued': self.requests_queued,
+                'requests_in_flight': self.requests_in_flight,
+                'requests_done': self.requests_done,
+                'retries': self.retries,
+                'tokens': self.tokens,
+                'tokens_per_second': self.tokens / elapsed if elapsed > 0 else 0.0,
+                'blocks_queued': self.blocks_queued,
+                'blocks_running': self.blocks_running,
+                'block_statuses': dict(self.block_statuses),
+                'version': self.version
+            }
+
+    def summary(self) -> str:
+        """
+        Formats the current state as a single status line.
+        """
+        state = self.snapshot()
+        line = (
+            f"[{state['elapsed']:6.1f}s] LLM {state['requests_queued']} queued, {state['requests_in_flight']} in flight, "
+            f"{state['requests_done']} done, {state['retries']} retries, {state['tokens_per_second']:.0f} tok/s"
+        )
+        if state['blocks_queued'] or state['blocks_running'] or state['block_statuses']:
+            finished = ", ".join(f"{count} {status}" for status, count in sorted(state['block_statuses'].items()))
+            line += f" | blocks {state['blocks_queued']} queued, {state['blocks_running']} running"
+            if finished:
+                line += f", {finished}"
+        return line
+
+
+class ProgressRenderer:
+    """
+    Draws a ProgressTracker from a single background thread at a bounded frame rate.
+
+    On a terminal the status line is rewritten in place. Otherwise, e.g. in CI logs, a plain
+    line is printed when the state changed, at most once every plain_interval seconds.
+    """
+
+    def __init__(self, tracker: ProgressTracker, desc: str = "Processing output...", fps: float = 4,
+                 stream=None, plain: bool = None, plain_interval: float = 2.0):
+        """
+        Args:
+            tracker (ProgressTracker): Source of the progress state.
+            desc (str): Label printed before the status line.
+            fps (float): Maximum redraws per second on a terminal.
+            stream: Output stream, defaults to stderr next to the log output.
+            plain (bool): Force plain lines, defaults to True when the stream is not a terminal.
+            plain_interval (float): Minimum seconds between plain lines.
+        """
+        self.tracker = tracker
+        self.desc = desc
+        self.stream = stream or sys.stderr
+        self.plain = plain if plain is not None else not self.stream.isatty()
+        self.interval = plain_interval if self.plain else 1 / max(fps, 0.1)
+        self._done = threading.Event()
+        self._thread = None
+        self._drawn_version = None
+
+    def _line(self) -> str:
+        return f"{self.desc} {self.tracker.summary()}"
+
+    def render(self, final: bool = False):
+        """
+        Draws one frame. Plain lines are skipped when the tracker did not change since the last one.
+        """
+        version = self.tracker.version
+        if self.plain and version == self._drawn_version and not final:
+            return
+        self._drawn_version = version
+        line = self._line()
+        if self.plain:
+            self.stream.write(f"{line}\n")
+        else:
+            width = shutil.get_terminal_size().columns
+            end = "\n" if final else ""
+            self.stream.write(f"\r\x1b[K{line[:width - 1]}{end}")
+        self.stream.flush()
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            self.render()
+
+    def start(self):
+        self.tracker.started = monotonic()
+        self._thread = threading.Thread(target=self._run, name="chatops-progress", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.render(final=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
@@ -0,0 +1,98 @@
+import json
+import mmap
+import os
+import tempfile
+import threading
+import weakref
+
+
+def _remove(file, path):
+    file.close()
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ResultStore:
+    """
+    Append-only store of JSON records backed by a JSONL file instead of memory.
+
+    Records are written as soon as they are appended and only their offsets stay in memory.
+    Reads go through a memory map of the file, so looking up or iterating records only pages
+    in the records that are read.
+
+    Records are read back by index, negative indexes count from the end:
+        store = ResultStore()
+        store.append({'task': 'Write a hello world script', 'output': '...'})
+        store[-1]['output']
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path (str): JSONL file the records are written to, replaced when it exists. Defaults to a
+                temporary file removed once the store is closed or garbage collected.
+        """
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="chatops-results-", suffix=".jsonl")
+            self._file = os.fdopen(fd, 'w+b')
+            self._finalizer = weakref.finalize(self, _remove, self._file, path)
+        else:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'w+b')
+            self._finalizer = weakref.finalize(self, self._file.close)
+        self.path = path
+        self._offsets = []
+        self._size = 0
+        self._map = None
+        self._lock = threading.Lock()
+
+    def append(self, record: dict) -> int:
+        """
+        Writes a JSON serializable record and returns its index.
+        """
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(line)
+            self._file.flush()
+            self._offsets.append(self._size)
+            self._size += len(line)
+            return len(self._offsets) - 1
+
+    def _mapped(self) -> mmap.mmap:
+        # Called with the lock held, remaps once the file grew past the current map
+        if self._map is None or len(self._map) < self._size:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> dict:
+        with self._lock:
+            start = self._offsets[index]
+            position = index if index >= 0 else len(self._offsets) + index
+            end = self._offsets[position + 1] if position + 1 < len(self._offsets) else self._size
+            return json.loads(self._mapped()[start:end])
+
+    def __iter__(self):
+        # Records appended while iterating are included
+        index = 0
+        while index < len(self._offsets):
+            yield self[index]
+            index += 1
+
+    def close(self):
+        """
+        Closes the file, a temporary file is also removed.
+        """
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._finalizer()
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import math
+import random
+import sys
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic
+from typing import NamedTuple, Optional
+from src.chatops.Tracing import tracer
+
+# Statuses worth sending again: timeouts, conflicts, throttling and server side failures
+RETRYABLE_STATUSES = {408, 409, 425, 429}
+
+
+class MalformedResponseError(Exception):
+    """
+    Raised when a chat completions response has no message content.
+    """
+
+
+class Failure(NamedTuple):
+    retryable: bool
+    reason: str
+    retry_after: Optional[float] = None
+
+
+def _header(headers, name: str):
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    Returns the delay requested by retry-after-ms or Retry-After (seconds or an HTTP date), None when absent.
+    """
+    milliseconds = _header(headers, 'retry-after-ms')
+    if milliseconds is not None:
+        try:
+            return max(0.0, float(milliseconds) / 1000)
+        except ValueError:
+            pass
+    value = _header(headers, 'retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(error: Exception) -> Failure:
+    """
+    Decides whether a failed request is worth sending again.
+
+    Transport and openai errors are classified by their HTTP status, timeouts and dropped
+    connections are retried, anything else (bad requests, authentication, bugs) is not.
+    aiohttp and openai are only inspected when already imported.
+    """
+    if isinstance(error, MalformedResponseError):
+        return Failure(True, 'malformed response')
+    status = getattr(error, 'status', None) or getattr(error, 'http_status', None)
+    if isinstance(status, int):
+        retryable = status in RETRYABLE_STATUSES or status >= 500
+        return Failure(retryable, f"HTTP {status}", parse_retry_after(getattr(error, 'headers', None)) if retryable else None)
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return Failure(True, 'timeout')
+    if isinstance(error, ConnectionError):
+        return Failure(True, 'connection')
+    aiohttp = sys.modules.get('aiohttp')
+    if aiohttp is not None and isinstance(error, aiohttp.ClientError):
+        return Failure(True, 'connection')
+    openai_error = sys.modules.get('openai.error')
+    if openai_error is not None:
+        transient = (openai_error.Timeout, openai_error.APIConnectionError, openai_error.ServiceUnavailableError,
+                     openai_error.RateLimitError, openai_error.TryAgain)
+        if isinstance(error, transient):
+            return Failure(True, type(error).__name__, parse_retry_after(getattr(error, 'headers', None)))
+    return Failure(False, type(error).__name__)
+
+
+class RetryPolicy:
+    """
+    How often and how long to wait before sending a failed request again, and when to hedge.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0,
+                 hedge_percentile: float = None, hedge_min_samples: int = 20):
+        """
+        Args:
+            max_retries (int): Attempts after the first one.
+            base_delay (float): Backoff of the first retry in seconds, doubled on every further retry.
+            max_delay (float): Upper bound of the backoff in seconds.
+            hedge_percentile (float): Latency percentile, e.g. 95, after which a duplicate of a slow
+                request is sent and the first answer wins. None disables hedging.
+            hedge_min_samples (int): Completed requests observed before hedging starts.
+        """
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        """
+        Returns the wait before retry number attempt (0 based): the Retry-After of the service when
+        given, otherwise exponential backoff with full jitter so throttled requests do not retry in lockstep.
+        """
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class LatencyTracker:
+    """
+    Latencies of the most recent successful requests.
+    """
+
+    def __init__(self, size: int = 500):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, percentile: float) -> float:
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(percentile / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class Attempt:
+    """
+    One attempt of a request, marked by the request once the scheduler admitted it.
+
+    Latency and the hedge timer start at admission, time spent queued behind our own
+    concurrency and rate limits says nothing about how slow the service is.
+    """
+
+    def __init__(self):
+        self.admitted_at = None
+        self._admitted = asyncio.Event()
+
+    def admitted(self):
+        self.admitted_at = monotonic()
+        self._admitted.set()
+
+    async def wait_admitted(self):
+        await self._admitted.wait()
+
+
+class RetryEngine:
+    """
+    Sends requests with classified retries and optional hedging.
+
+    Requests are coroutine functions taking an Attempt and making a single attempt, so each retry
+    or hedge goes through scheduler admission on its own. Requests call attempt.admitted() once
+    admitted; only those are timed and hedged. A Retry-After answer also pauses the scheduler,
+    which holds back every other queued request instead of only the throttled one.
+    """
+
+    def __init__(self, policy: RetryPolicy = None, scheduler=None):
+        """
+        Args:
+            policy (RetryPolicy): Retry and hedging settings, defaults to RetryPolicy().
+            scheduler (RateLimitScheduler): Paused on Retry-After and told about retries.
+        """
+        self.policy = policy or RetryPolicy()
+        self.scheduler = scheduler
+        self.latencies = LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Returns the seconds after which a duplicate request is sent, None while hedging is off.
+        """
+        if self.policy.hedge_percentile is None or len(self.latencies.samples) < self.policy.hedge_min_samples:
+            return None
+        return self.latencies.percentile(self.policy.hedge_percentile)
+
+    async def _timed(self, request, attempt: Attempt = None):
+        attempt = attempt or Attempt()
+        result = await request(attempt)
+        if attempt.admitted_at is not None:
+            self.latencies.record(monotonic() - attempt.admitted_at)
+        return result
+
+    def _can_hedge(self) -> bool:
+        # A duplicate queued behind a saturated scheduler only takes a slot from other requests
+        return self.scheduler is None or self.scheduler.has_capacity()
+
+    async def _hedged(self, request):
+        threshold = self.hedge_delay()
+        if threshold is None:
+            return await self._timed(request)
+        first = Attempt()
+        primary = asyncio.ensure_future(self._timed(request, first))
+        attempts = [primary]
+        try:
+            # The hedge timer starts once the primary is admitted, never while it is still queued
+            admitted = asyncio.ensure_future(first.wait_admitted())
+            try:
+                await asyncio.wait([primary, admitted], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                admitted.cancel()
+            done, pending = set(), {primary}
+            if not primary.done():
+                remaining = threshold - (monotonic() - first.admitted_at)
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, remaining))
+                if not done and self._can_hedge():
+                    self.hedges += 1
+                    logging.debug(f"Request slower than {threshold:.2f}s, sending a hedged duplicate")
+                    attempts.append(asyncio.ensure_future(self._timed(request)))
+                    pending = set(attempts)
+            error = None
+            while True:
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not primary:
+                            self.hedges_won += 1
+                        return attempt.result()
+                    error = attempt.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # The slower attempt gives its scheduler slot back as soon as it is cancelled
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+
+    async def call(self, request, retries: int = None, hedge: bool = True):
+        """
+        Runs request until it succeeds.
+
+        Args:
+            request (callable): Coroutine function taking an Attempt and making one attempt.
+            retries (int): Overrides the retries of the policy.
+            hedge (bool): Allows hedging, disable it for requests with side effects such as streams.
+
+        Raises:
+            Exception: The error of the last attempt, or the first error that is not retryable.
+        """
+        retries = self.policy.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                return await (self._hedged(request) if hedge else self._timed(request))
+            except Exception as e:
+                failure = classify(e)
+                if not failure.retryable or attempt >= retries:
+                    if failure.retryable:
+                        logging.error(f"Request failed after {retries} retries: {e}")
+                    raise
+                delay = self.policy.delay(attempt, failure.retry_after)
+                if failure.retry_after is not None and self.scheduler is not None:
+                    self.scheduler.pause(failure.retry_after)
+                attempt += 1
+                self.retries += 1
+                if self.scheduler is not None:
+                    self.scheduler.record_retry()
+                logging.warning(f"Retry {attempt}/{retries} in {delay:.2f}s after {failure.reason}: {e}")
+                with tracer.span("backoff", attempt=attempt, reason=failure.reason, delay=delay):
+                    await asyncio.sleep(delay)
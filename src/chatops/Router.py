@@ -0,0 +1,216 @@
+import asyncio
+import logging
+from collections import deque
+from time import monotonic
+from src.chatops.Retry import classify
+from src.chatops.Transport import AzureHTTPTransport, Transport
+
+
+class Deployment:
+    """
+    Live state of one deployment: latency, error rate, throttling and the quota used in the last minute.
+    """
+
+    window_seconds = 60
+    # Weight of the newest sample in the latency and error rate moving averages
+    smoothing = 0.2
+
+    def __init__(self, name: str, transport: Transport, tokens_per_minute: float = None, requests_per_minute: float = None, weight: float = 1.0):
+        """
+        Args:
+            name (str): Label used in logs and status reports.
+            transport (Transport): Backend of the deployment.
+            tokens_per_minute (float): Token quota of the deployment, None when unknown.
+            requests_per_minute (float): Request quota of the deployment, None when unknown.
+            weight (float): Relative share of traffic between otherwise equal deployments.
+        """
+        self.name = name
+        self.transport = transport
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.weight = weight
+        self.latency = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.throttled_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.throttles = 0
+        self._usage = deque()
+
+    def _trim(self, now: float):
+        while self._usage and self._usage[0][0] <= now - self.window_seconds:
+            self._usage.popleft()
+
+    def headroom(self, now: float) -> float:
+        """
+        Returns the smallest share of the token and request quotas left in the current minute, 1 without quotas.
+        """
+        self._trim(now)
+        shares = [1.0]
+        if self.tokens_per_minute:
+            shares.append(1 - sum(tokens for _, tokens in self._usage) / self.tokens_per_minute)
+        if self.requests_per_minute:
+            shares.append(1 - len(self._usage) / self.requests_per_minute)
+        return min(shares)
+
+    def available(self, now: float) -> bool:
+        return now >= self.throttled_until and self.headroom(now) > 0
+
+    def score(self, now: float) -> float:
+        """
+        Lower is better. Deployments without latency samples score as fast so every deployment gets tried.
+        """
+        latency = self.latency if self.latency is not None else 0.0
+        return (latency + 0.05) * (1 + self.in_flight) * (1 + 4 * self.error_rate) / (self.weight * max(self.headroom(now), 0.05))
+
+    def record_success(self, seconds: float, tokens: int):
+        self.requests += 1
+        self.latency = seconds if self.latency is None else (1 - self.smoothing) * self.latency + self.smoothing * seconds
+        self.error_rate *= 1 - self.smoothing
+        self._usage.append((monotonic(), tokens))
+
+    def record_failure(self):
+        self.requests += 1
+        self.failures += 1
+        self.error_rate = (1 - self.smoothing) * self.error_rate + self.smoothing
+        self._usage.append((monotonic(), 0))
+
+    def throttle(self, seconds: float):
+        """
+        Drains the deployment, no requests are routed to it for the given seconds.
+        """
+        self.record_failure()
+        self.throttles += 1
+        self.throttled_until = max(self.throttled_until, monotonic() + seconds)
+        logging.info(f"Deployment {self.name} throttled, draining it for {seconds:.1f}s")
+
+    def stats(self) -> dict:
+        now = monotonic()
+        return {
+            'name': self.name,
+            'requests': self.requests,
+            'failures': self.failures,
+            'throttles': self.throttles,
+            'in_flight': self.in_flight,
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'headroom': round(self.headroom(now), 3),
+            'throttled': now < self.throttled_until
+        }
+
+
+class DeploymentRouter(Transport):
+    """
+    Spreads chat completions across several deployments, e.g. the same model in several Azure
+    regions, so a run is not capped by the quota of a single deployment.
+
+    Each request goes to the available deployment with the best score, combining its smoothed
+    latency, requests in flight, error rate and the share of its per minute quota left. A
+    deployment answering 429 is drained for its Retry-After and the request moves to another
+    deployment; only when every deployment is throttled does the error reach the retry engine.
+    """
+
+    # Drain time of a 429 answer without Retry-After
+    default_throttle = 10.0
+
+    def __init__(self, deployments: list):
+        """
+        Args:
+            deployments (list): Deployment instances.
+        """
+        if not deployments:
+            raise ValueError("The router needs at least one deployment")
+        self.deployments = deployments
+
+    @classmethod
+    def from_config(cls, configs: list, **transport_options) -> "DeploymentRouter":
+        """
+        Builds a router with an AzureHTTPTransport per deployment.
+
+        Args:
+            configs (list): Deployments as loaded by Bootstrap.load_deployments.
+            transport_options: pool_size, connect_timeout and request_timeout of every transport.
+        """
+        return cls([
+            Deployment(
+                config['name'],
+                AzureHTTPTransport(config['endpoint'], config['api_key'], config['api_version'], config['deployment'], **transport_options),
+                tokens_per_minute=config.get('tokens_per_minute'),
+                requests_per_minute=config.get('requests_per_minute'),
+                weight=config.get('weight', 1.0)
+            )
+            for config in configs
+        ])
+
+    async def select(self) -> Deployment:
+        """
+        Returns the best available deployment, waiting while every deployment is throttled or out of quota.
+        """
+        waiting = False
+        while True:
+            now = monotonic()
+            candidates = [deployment for deployment in self.deployments if deployment.available(now)]
+            if candidates:
+                return min(candidates, key=lambda deployment: deployment.score(now))
+            if not waiting:
+                logging.info("Every deployment is throttled or out of quota, waiting")
+                waiting = True
+            wait = min(deployment.throttled_until - now for deployment in self.deployments)
+            await asyncio.sleep(min(max(wait, 0.05), 1.0))
+
+    def _failed(self, deployment: Deployment, error: Exception) -> bool:
+        """
+        Records a failed request and returns True when it should move to another deployment.
+        """
+        if getattr(error, 'status', None) != 429:
+            deployment.record_failure()
+            return False
+        deployment.throttle(classify(error).retry_after or self.default_throttle)
+        now = monotonic()
+        return any(other.available(now) for other in self.deployments if other is not deployment)
+
+    async def complete(self, messages: list, temperature: float) -> dict:
+        while True:
+            deployment = await self.select()
+            deployment.in_flight += 1
+            start = monotonic()
+            try:
+                response = await deployment.transport.complete(messages, temperature)
+            except Exception as e:
+                if self._failed(deployment, e):
+                    continue
+                raise
+            finally:
+                deployment.in_flight -= 1
+            deployment.record_success(monotonic() - start, response.get('usage', {}).get('total_tokens', 0))
+            return response
+
+    async def stream(self, messages: list, temperature: float):
+        while True:
+            deployment = await self.select()
+            deployment.in_flight += 1
+            start = monotonic()
+            characters = 0
+            try:
+                async for delta in deployment.transport.stream(messages, temperature):
+                    characters += len(delta)
+                    yield delta
+            except Exception as e:
+                # Only streams that failed before their first delta can move without repeating output
+                if self._failed(deployment, e) and characters == 0:
+                    continue
+                raise
+            finally:
+                deployment.in_flight -= 1
+            # Streams carry no usage, estimate about four characters per token
+            prompt_characters = sum(len(message.get('content') or '') for message in messages)
+            deployment.record_success(monotonic() - start, (prompt_characters + characters) // 4)
+            return
+
+    def stats(self) -> list:
+        return [deployment.stats() for deployment in self.deployments]
+
+    async def close(self):
+        for deployment in self.deployments:
+            await deployment.transport.close()
@@ -0,0 +1,260 @@
+import builtins
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import tempfile
+import threading
+import traceback
+from time import monotonic
+from src.chatops.Executor import format_result
+
+try:
+    import resource
+except ImportError:  # Windows has no rlimits
+    resource = None
+
+
+# Modules imported once by the fork server so every worker starts warm
+DEFAULT_WARM_IMPORTS = (
+    'json', 're', 'os', 'sys', 'math', 'random', 'datetime', 'collections', 'itertools',
+    'functools', 'typing', 'dataclasses', 'pathlib', 'subprocess', 'asyncio', 'logging', 'unittest'
+)
+
+
+def _snapshot(warm_imports):
+    """
+    Captures the interpreter state a code block could leak into the next one.
+
+    Modules a block imports are left loaded like in a fresh interpreter that imports them, only
+    warm modules removed or replaced in sys.modules count as a leak.
+    """
+    return (
+        os.getcwd(),
+        tuple(sys.path),
+        tuple(sorted(os.environ.items())),
+        tuple(id(sys.modules.get(name)) for name in warm_imports),
+        threading.active_count()
+    )
+
+
+def _execute(code, cpu_time):
+    """
+    Runs code in a clean namespace with file descriptors 1 and 2 redirected, like python -c.
+    """
+    if resource is not None and cpu_time:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_time, hard))
+
+    with tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_stdout, saved_stderr = os.dup(1), os.dup(2)
+        os.dup2(stdout_file.fileno(), 1)
+        os.dup2(stderr_file.fileno(), 2)
+        status = 'completed'
+        try:
+            namespace = {'__name__': '__main__', '__builtins__': builtins}
+            exec(compile(code, '<string>', 'exec'), namespace)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                status = 'failed'
+                if not isinstance(e.code, int):
+                    print(e.code, file=sys.stderr)
+        except BaseException as e:
+            status = 'failed'
+            # Drop this frame so the traceback matches python -c
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_stdout, 1)
+            os.dup2(saved_stderr, 2)
+            os.close(saved_stdout)
+            os.close(saved_stderr)
+
+        stdout_file.seek(0)
+        stderr_file.seek(0)
+        return status, stdout_file.read().decode('utf-8', 'replace'), stderr_file.read().decode('utf-8', 'replace')
+
+
+def _worker_main(conn, cpu_time, memory_limit_mb, warm_imports):
+    """
+    Worker loop: receives code over the pipe and answers (status, stdout, stderr, leaked).
+    """
+    for name in warm_imports:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    sys.argv = ['-c']
+    if resource is not None and memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    baseline = _snapshot(warm_imports)
+    while True:
+        try:
+            code = conn.recv()
+        except EOFError:
+            break
+        status, stdout, stderr = _execute(code, cpu_time)
+        conn.send((status, stdout, stderr, _snapshot(warm_imports) != baseline))
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.runs = 0
+
+
+class RunnerPool:
+    """
+    Pool of pre-forked, pre-warmed Python workers that run code blocks in a clean namespace.
+
+    Workers are forked from a fork server that already imported the warm modules, so a block
+    skips interpreter startup and common imports. A worker is replaced after max_runs blocks,
+    after a timeout or crash, and as soon as a block leaks state such as a changed working
+    directory, environment, sys.path, replaced warm modules or threads left running.
+    """
+
+    def __init__(self, size: int = 2, max_runs: int = 50, timeout: float = 60, cpu_time: int = None,
+                 memory_limit_mb: int = None, warm_imports=DEFAULT_WARM_IMPORTS):
+        """
+        Args:
+            size (int): Number of workers.
+            max_runs (int): Blocks a worker runs before it is replaced.
+            timeout (float): Wall clock seconds allowed per block.
+            cpu_time (int): CPU seconds allowed per block, defaults to the wall clock timeout.
+            memory_limit_mb (int): Address space limit per worker in MB, None for no limit.
+            warm_imports (tuple): Modules imported before any block runs.
+        """
+        self.size = size
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self.cpu_time = cpu_time or max(1, int(timeout))
+        self.memory_limit_mb = memory_limit_mb
+        self.warm_imports = tuple(warm_imports)
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context('forkserver')
+            self._context.set_forkserver_preload(list(self.warm_imports) + [__name__])
+        else:
+            self._context = multiprocessing.get_context('spawn')
+        self._idle = queue.Queue()
+        self._workers = []
+        self._workers_lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.cpu_time, self.memory_limit_mb, self.warm_imports),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        with self._workers_lock:
+            self._workers.append(worker)
+        return worker
+
+    def _retire(self, worker: _Worker):
+        worker.conn.close()
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join()
+        with self._workers_lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        self._retire(worker)
+        return self._spawn()
+
+    def run(self, code_content: str, cancel=None):
+        """
+        Executes a code block on an idle worker, waiting for one when all are busy.
+
+        Args:
+            code_content (str): Code to execute.
+            cancel (threading.Event): Replaces the worker running the block as soon as it is set.
+
+        Returns:
+            tuple: (status, result) in the same format as CodeExecutor.run.
+        """
+        status, stdout, stderr = self.execute(code_content, cancel)
+        return status, format_result(status, stdout, stderr)
+
+    def execute(self, code_content: str, cancel=None):
+        """
+        Executes a code block like run, keeping its output and errors apart.
+
+        Returns:
+            tuple: (status, stdout, stderr) in the same format as CodeExecutor.execute.
+        """
+        worker = self._idle.get()
+        try:
+            try:
+                worker.conn.send(code_content)
+            except Exception as e:
+                # The worker died while idle, run the block on a fresh one
+                logging.debug(f"Replacing unreachable runner: {e!r}")
+                worker = self._replace(worker)
+                worker.conn.send(code_content)
+            if not self._wait(worker, cancel):
+                worker = self._replace(worker)
+                if cancel is not None and cancel.is_set():
+                    return 'cancelled', '', "cancelled"
+                return 'timeout', '', f"timed out after {self.timeout} seconds"
+
+            try:
+                status, stdout, stderr, leaked = worker.conn.recv()
+            except (EOFError, OSError):
+                # The worker died, e.g. killed for exceeding its CPU or memory limit
+                worker.process.join()
+                exitcode = worker.process.exitcode
+                worker = self._replace(worker)
+                if os.name == 'posix' and exitcode == -signal.SIGXCPU:
+                    return 'timeout', '', f"exceeded {self.cpu_time} seconds of CPU time"
+                return 'failed', '', f"worker exited with code {exitcode}"
+
+            worker.runs += 1
+            if leaked or worker.runs >= self.max_runs:
+                logging.debug(f"Recycling runner after {worker.runs} run(s){' (state leaked)' if leaked else ''}")
+                worker = self._replace(worker)
+        except BaseException:
+            # A worker in an unknown state never goes back to the idle queue
+            worker = self._replace(worker)
+            raise
+        finally:
+            self._idle.put(worker)
+
+        return status, stdout.strip(), stderr.strip()
+
+    def _wait(self, worker: _Worker, cancel) -> bool:
+        """
+        Waits for the result of a worker, returns False on timeout or cancellation.
+        """
+        if cancel is None:
+            return worker.conn.poll(self.timeout)
+        deadline = monotonic() + self.timeout
+        while not cancel.is_set():
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return False
+            if worker.conn.poll(min(remaining, 0.1)):
+                return True
+        return False
+
+    def shutdown(self):
+        with self._workers_lock:
+            workers = list(self._workers)
+        for worker in workers:
+            self._retire(worker)
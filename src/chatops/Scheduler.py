@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from time import monotonic
+from src.chatops.Tracing import tracer
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket refilled continuously at a per minute rate.
+
+    Azure OpenAI enforces its per minute quotas over short windows, so the bucket only
+    holds ten seconds worth of budget instead of allowing a full minute to burst at once.
+    """
+
+    window_seconds = 10
+
+    def __init__(self, per_minute: float):
+        self.refill_rate = per_minute / 60
+        self.capacity = max(1.0, self.refill_rate * self.window_seconds)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """
+        Waits until the bucket holds enough budget and takes it. Waiters are served in order.
+
+        Args:
+            amount (float): Budget to take, clamped to the bucket capacity so large requests still run.
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.refill_rate)
+
+    def consume(self, amount: float):
+        """
+        Takes budget without waiting, the balance may go negative to throttle later requests.
+        """
+        self._refill()
+        self.tokens -= amount
+
+
+class RateLimitScheduler:
+    """
+    Admits LLM requests under a maximum number of in flight requests plus
+    requests per minute and tokens per minute limits.
+    """
+
+    def __init__(self, max_in_flight: int = 8, requests_per_minute: float = None, tokens_per_minute: float = None, progress=None):
+        """
+        Args:
+            max_in_flight (int): Maximum concurrent requests, None or 0 for no limit.
+            requests_per_minute (float): Request quota of the deployment, None or 0 for no limit.
+            tokens_per_minute (float): Token quota of the deployment, None or 0 for no limit.
+            progress (ProgressTracker): Receives queued, in flight, done, retry and token events.
+        """
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._semaphore = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+        self._request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.progress = progress
+        self.in_flight = 0
+        self.admitted = 0
+        self.resume_at = 0.0
+
+    @asynccontextmanager
+    async def admit(self, tokens: int = 0):
+        """
+        Holds an in flight slot and quota for the duration of one request.
+
+        Args:
+            tokens (int): Estimated prompt tokens of the request, taken from plan().
+        """
+        if self.progress is not None:
+            self.progress.request_queued()
+        queued_at = tracer.now()
+        started = False
+        # Requests wait out a Retry-After before taking a slot
+        while (paused := self.resume_at - monotonic()) > 0:
+            await asyncio.sleep(paused)
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        try:
+            if self._request_bucket is not None:
+                await self._request_bucket.acquire(1)
+            if self._token_bucket is not None:
+                await self._token_bucket.acquire(tokens)
+            self.in_flight += 1
+            self.admitted += 1
+            started = True
+            tracer.add("queue", queued_at, tokens=tokens, in_flight=self.in_flight)
+            if self.progress is not None:
+                self.progress.request_started()
+            logging.debug(f"Admitted request ({tokens} tokens), {self.in_flight} in flight")
+            try:
+                yield self
+            finally:
+                self.in_flight -= 1
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+            if self.progress is not None:
+                if started:
+                    self.progress.request_finished()
+                else:
+                    # Cancelled while waiting for admission
+                    self.progress.request_cancelled()
+
+    def has_capacity(self) -> bool:
+        """
+        Returns True when a new request would not wait for a concurrency slot or a Retry-After pause.
+        """
+        return monotonic() >= self.resume_at and (self._semaphore is None or not self._semaphore.locked())
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """
+        Charges the difference between the admitted estimate and the usage reported by the service.
+        """
+        if self._token_bucket is not None and actual_tokens:
+            self._token_bucket.consume(actual_tokens - estimated_tokens)
+        if self.progress is not None:
+            self.progress.tokens_used(actual_tokens)
+
+    def pause(self, seconds: float):
+        """
+        Holds back new admissions for the given seconds, used when the service answers with Retry-After.
+        Requests already in flight are not affected.
+        """
+        self.resume_at = max(self.resume_at, monotonic() + seconds)
+        logging.info(f"Throttled by the service, pausing new requests for {seconds:.1f}s")
+
+    def record_retry(self):
+        """
+        Reports a request that is sent again after a failed attempt.
+        """
+        if self.progress is not None:
+            self.progress.request_retried()
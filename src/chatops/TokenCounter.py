@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+
+class TokenCounter:
+    """
+    Token accounting engine shared by every planning and scheduling step.
+
+    Encoders are loaded once per model and token counts are memoized by a hash of the
+    content, so the same instruction or data file is only ever encoded once per encoding.
+    The memo keeps the max_entries most recently used counts, so a long lived daemon does
+    not grow without bound. Counts are safe to take from several threads.
+    """
+
+    # Per message overhead used by the chat completions format (role + separators)
+    tokens_per_message = 3
+    # Every reply is primed with <|start|>assistant<|message|>
+    tokens_per_reply = 3
+    fallback_encoding = "cl100k_base"
+
+    def __init__(self, max_entries: int = 100_000):
+        """
+        Args:
+            max_entries (int): Memoized counts kept, least recently used first out.
+        """
+        self.max_entries = max_entries
+        self._encoders: Dict[str, "tiktoken.Encoding"] = {}
+        self._counts: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encoding_for(self, model: str) -> "tiktoken.Encoding":
+        """
+        Returns the cached encoder for a model, loading it on first use.
+
+        Args:
+            model (str): Model name, unknown models fall back to cl100k_base.
+
+        Returns:
+            tiktoken.Encoding: Encoder for the model.
+        """
+        encoder = self._encoders.get(model)
+        if encoder is None:
+            with self._lock:
+                encoder = self._encoders.get(model)
+                if encoder is None:
+                    # Imported on first use to keep CLI start up fast
+                    import tiktoken
+                    try:
+                        encoder = tiktoken.encoding_for_model(model)
+                    except KeyError:
+                        logging.info(f"No tokenizer registered for '{model}', using {self.fallback_encoding}")
+                        encoder = tiktoken.get_encoding(self.fallback_encoding)
+                    self._encoders[model] = encoder
+        return encoder
+
+    def count(self, text, model: str) -> int:
+        """
+        Counts the tokens in a piece of text, memoized by content hash.
+
+        Args:
+            text: Input text, non string values are converted with str().
+            model (str): Model name used to select the encoder.
+
+        Returns:
+            int: Number of tokens.
+        """
+        encoder = self.encoding_for(model)
+        text = text if isinstance(text, str) else str(text)
+        key = (encoder.name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+        with self._counts_lock:
+            tokens = self._counts.get(key)
+            if tokens is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return tokens
+            self.misses += 1
+        # Encoded outside the lock, two threads may count the same new text once each
+        tokens = len(encoder.encode(text, disallowed_special=()))
+        with self._counts_lock:
+            self._counts[key] = tokens
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def count_message(self, message: dict, model: str) -> int:
+        """
+        Counts the tokens a single chat message costs, including the message overhead.
+        """
+        return self.tokens_per_message + sum(self.count(value, model) for value in message.values())
+
+    def count_messages(self, messages: List[dict], model: str) -> int:
+        """
+        Counts the prompt tokens for a full chat message list.
+
+        Args:
+            messages (list): Chat messages as sent to the completions endpoint.
+            model (str): Model name used to select the encoder.
+
+        Returns:
+            int: Number of prompt tokens.
+        """
+        return sum(self.count_message(message, model) for message in messages) + self.tokens_per_reply
+
+
+# Shared instance so encoders and memoized counts survive across Prompt_Manager instances
+token_counter = TokenCounter()
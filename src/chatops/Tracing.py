@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+from time import perf_counter_ns
+
+
+class Span:
+    """
+    Span being recorded, attributes can be added until it ends.
+    """
+
+    __slots__ = ('tracer', 'name', 'attributes', 'start')
+
+    def __init__(self, tracer, name: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            self.attributes['error'] = f"{exc_type.__name__}: {exc_value}"
+        self.tracer.add(self.name, self.start, **self.attributes)
+
+
+class _NoopSpan:
+    """
+    Shared span returned while tracing is disabled.
+    """
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Records timed spans of the chain steps and exports them in the Chrome trace event format,
+    which chrome://tracing and https://ui.perfetto.dev open directly.
+
+    Spans of each asyncio task and each thread are drawn on their own track. While disabled,
+    span() returns a shared no-op span, so instrumented code only pays for one attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self._pid = os.getpid()
+        self._origin = perf_counter_ns()
+        self._task_tracks = {}
+        self._track_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        self._origin = perf_counter_ns()
+
+    def disable(self):
+        self.enabled = False
+
+    @staticmethod
+    def now() -> int:
+        return perf_counter_ns()
+
+    def span(self, name: str, **attributes):
+        """
+        Returns a context manager timing a step, e.g. with tracer.span("parse", blocks=3) as span: ...
+
+        Args:
+            name (str): Step name.
+            attributes: Values shown with the span, e.g. task, role, tokens or status.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def _track(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        with self._lock:
+            if task is not None:
+                key, label = id(task), task.get_name()
+            else:
+                thread = threading.current_thread()
+                key, label = thread.ident, thread.name
+            track = self._task_tracks.get(key)
+            if track is None:
+                track = self._task_tracks[key] = next(self._track_ids)
+                self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': track, 'args': {'name': label}})
+            return track
+
+    def add(self, name: str, start: int, end: int = None, **attributes):
+        """
+        Records a span from perf_counter_ns timestamps, for steps that do not fit a with block.
+        """
+        if not self.enabled:
+            return
+        end = end if end is not None else perf_counter_ns()
+        self.events.append({
+            'name': name,
+            'cat': 'chatops',
+            'ph': 'X',
+            'ts': (start - self._origin) / 1000,
+            'dur': (end - start) / 1000,
+            'pid': self._pid,
+            'tid': self._track(),
+            'args': {key: value if isinstance(value, (int, float, bool, str)) or value is None else str(value) for key, value in attributes.items()}
+        })
+
+    def export(self, path: str):
+        """
+        Writes the recorded spans as a Chrome trace JSON file.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, file)
+        logging.info(f"Wrote {sum(1 for event in self.events if event['ph'] == 'X')} trace span(s) to {path}")
+
+
+# Shared instance so every module records into the same trace
+tracer = Tracer()
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+
+# aiohttp and openai are imported by the backends that use them to keep CLI start up fast
+
+
+class TransportError(Exception):
+    """
+    Raised when the chat completions service answers with an error status.
+    """
+
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.headers = dict(headers or {})
+
+
+class Transport:
+    """
+    Base class for chat completion backends used by Prompt_Manager.
+    """
+
+    async def complete(self, messages: list, temperature: float) -> dict:
+        """
+        Sends a chat completion request.
+
+        Args:
+            messages (list): Chat messages.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            dict: Response in the chat completions wire format.
+        """
+        raise NotImplementedError
+
+    async def stream(self, messages: list, temperature: float):
+        """
+        Streams a chat completion as content deltas. Backends without streaming yield the whole completion once.
+
+        Args:
+            messages (list): Chat messages.
+            temperature (float): Sampling temperature.
+
+        Yields:
+            str: Content deltas in order.
+        """
+        response = await self.complete(messages, temperature)
+        yield response['choices'][0]['message']['content']
+
+    async def close(self):
+        """
+        Releases connections held by the transport.
+        """
+
+
+class OpenAITransport(Transport):
+    """
+    Legacy backend running the blocking openai client on the default thread pool.
+    """
+
+    def __init__(self, deployment: str):
+        self.deployment = deployment
+
+    async def complete(self, messages: list, temperature: float) -> dict:
+        import openai
+        return await asyncio.to_thread(
+            openai.ChatCompletion.create,
+            temperature=temperature,
+            engine=self.deployment,
+            messages=messages
+        )
+
+    async def stream(self, messages: list, temperature: float):
+        import openai
+        response = await openai.ChatCompletion.acreate(
+            temperature=temperature,
+            engine=self.deployment,
+            messages=messages,
+            stream=True
+        )
+        async for chunk in response:
+            for choice in chunk['choices']:
+                content = choice.get('delta', {}).get('content')
+                if content:
+                    yield content
+
+
+class AzureHTTPTransport(Transport):
+    """
+    Native async backend speaking the Azure OpenAI chat completions wire format
+    over a shared keep-alive connection pool.
+    """
+
+    def __init__(self, endpoint: str, api_key: str, api_version: str, deployment: str,
+                 pool_size: int = 100, connect_timeout: float = 10, request_timeout: float = 120, keepalive_timeout: float = 60):
+        """
+        Args:
+            endpoint (str): Azure OpenAI resource endpoint, e.g. https://my-resource.openai.azure.com
+            api_key (str): Azure OpenAI API key.
+            api_version (str): API version query parameter.
+            deployment (str): Deployment (model) name.
+            pool_size (int): Maximum number of pooled connections.
+            connect_timeout (float): Seconds allowed to establish a connection.
+            request_timeout (float): Seconds allowed for a whole request.
+            keepalive_timeout (float): Seconds an idle connection is kept open for reuse.
+        """
+        self.endpoint = endpoint.rstrip('/')
+        self.api_key = api_key
+        self.api_version = api_version
+        self.deployment = deployment
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self._session = None
+
+    @property
+    def url(self) -> str:
+        return f"{self.endpoint}/openai/deployments/{self.deployment}/chat/completions?api-version={self.api_version}"
+
+    def session(self) -> "aiohttp.ClientSession":
+        """
+        Returns the pooled session, creating it on the running event loop when needed.
+        """
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout, sock_connect=self.connect_timeout),
+                headers={"api-key": self.api_key}
+            )
+        return self._session
+
+    async def complete(self, messages: list, temperature: float) -> dict:
+        payload = {"messages": messages, "temperature": temperature}
+        async with self.session().post(self.url, json=payload) as response:
+            if response.status >= 400:
+                raise TransportError(response.status, await response.text(), response.headers)
+            return await response.json()
+
+    async def stream(self, messages: list, temperature: float):
+        payload = {"messages": messages, "temperature": temperature, "stream": True}
+        async with self.session().post(self.url, json=payload) as response:
+            if response.status >= 400:
+                raise TransportError(response.status, await response.text(), response.headers)
+            # Server-sent events, one "data: {...}" line per chunk
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                # Azure sends an initial chunk with content filter results and no choices
+                for choice in json.loads(data).get("choices", []):
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        yield content
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logging.debug("Closed HTTP connection pool")
+        self._session = None
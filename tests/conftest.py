@@ -0,0 +1,38 @@
+import asyncio
+import pytest
+
+
+class FakeClock:
+    """
+    Monotonic clock that only moves when asyncio.sleep is awaited or advance is called.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Replaces monotonic in the scheduling modules and makes asyncio.sleep advance the fake clock
+    instead of waiting, so rate limits and backoff are tested without real delays.
+    """
+    clock = FakeClock()
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, result=None):
+        clock.sleeps.append(delay)
+        clock.advance(max(0.0, delay))
+        return await real_sleep(0, result)
+
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    for module in ('src.chatops.Scheduler', 'src.chatops.Retry', 'src.chatops.Router'):
+        monkeypatch.setattr(f"{module}.monotonic", clock)
+    return clock
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import pytest
+from src.chatops import ArtifactWriter as artifact_writer
+from src.chatops.ArtifactWriter import ArtifactWriter
+
+
+def read(path):
+    with open(path) as file:
+        return file.read()
+
+
+def test_write_stages_without_touching_the_live_folder(tmp_path):
+    writer = ArtifactWriter(str(tmp_path), 'bot_v1')
+    digest = writer.write('src/main.py', 'print(1)\n')
+
+    assert digest == hashlib.sha256(b'print(1)\n').hexdigest()
+    assert not os.path.exists(writer.target)
+    assert read(os.path.join(writer.staging_dir, 'src', 'main.py')) == 'print(1)\n'
+    assert os.path.basename(writer.staging_dir).startswith('.bot_v1.staging-')
+
+    writer.discard()
+    assert writer.staging_dir is None
+    assert os.listdir(tmp_path) == ['.blobs']
+
+
+def test_identical_content_is_hard_linked_to_one_blob(tmp_path):
+    first = ArtifactWriter(str(tmp_path), 'bot_v1')
+    digest = first.write('a.txt', 'same')
+    first.write('b.txt', 'same')
+    first.publish()
+    second = ArtifactWriter(str(tmp_path), 'bot_v2')
+    second.write('c.txt', 'same')
+    second.publish()
+
+    blob = ArtifactWriter.blob_path(first.blob_dir, digest)
+    linked = [os.path.join(first.target, 'a.txt'), os.path.join(first.target, 'b.txt'),
+              os.path.join(second.target, 'c.txt')]
+    assert all(os.path.samefile(blob, path) for path in linked)
+    assert os.stat(blob).st_nlink == 4
+    if os.name == 'posix':
+        assert os.stat(blob).st_mode & 0o777 == ArtifactWriter.blob_mode & ~artifact_writer.UMASK
+
+
+def test_adopt_links_an_existing_blob(tmp_path):
+    first = ArtifactWriter(str(tmp_path), 'bot_v1')
+    digest = first.write('a.txt', 'kept')
+    first.publish()
+
+    second = ArtifactWriter(str(tmp_path), 'bot_v2')
+    assert second.adopt('nested/a.txt', digest)
+    assert not second.adopt('missing.txt', '0' * 64)
+    second.publish()
+    assert read(os.path.join(second.target, 'nested', 'a.txt')) == 'kept'
+    assert second.files == {'nested/a.txt': digest}
+
+
+def test_publish_creates_the_version_folder(tmp_path):
+    writer = ArtifactWriter(str(tmp_path), 'bot_v1')
+    writer.write('a.txt', 'one')
+    writer.publish()
+
+    assert read(os.path.join(writer.target, 'a.txt')) == 'one'
+    assert writer.staging_dir is None
+    assert sorted(os.listdir(tmp_path)) == ['.blobs', 'bot_v1']
+    if os.name == 'posix':
+        assert os.stat(writer.target).st_mode & 0o777 == ArtifactWriter.dir_mode & ~artifact_writer.UMASK
+
+
+@pytest.mark.parametrize('can_exchange', [True, False])
+def test_publish_overwrites_and_carries_files_forward(tmp_path, monkeypatch, can_exchange):
+    first = ArtifactWriter(str(tmp_path), 'bot_v1')
+    first.write('kept.txt', 'kept')
+    first.write('changed.txt', 'old')
+    first.publish()
+
+    if not can_exchange:
+        monkeypatch.setattr(artifact_writer, 'exchange', lambda first, second: False)
+    second = ArtifactWriter(str(tmp_path), 'bot_v1')
+    second.write('changed.txt', 'new')
+    second.publish()
+
+    assert read(os.path.join(second.target, 'kept.txt')) == 'kept'
+    assert read(os.path.join(second.target, 'changed.txt')) == 'new'
+    # Neither the previous version nor the staging folder is left behind
+    assert sorted(os.listdir(tmp_path)) == ['.blobs', 'bot_v1']
+
+
+@pytest.mark.skipif(artifact_writer._renameat2 is None, reason="renameat2 is not available")
+def test_exchange_swaps_two_folders(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a' / 'from_a').write_text('a')
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'b' / 'from_b').write_text('b')
+
+    assert artifact_writer.exchange(str(tmp_path / 'a'), str(tmp_path / 'b'))
+    assert os.listdir(tmp_path / 'a') == ['from_b']
+    assert os.listdir(tmp_path / 'b') == ['from_a']
+
+
+def test_recover_restores_a_version_stranded_between_renames(tmp_path):
+    retired = tmp_path / '.bot_v1.retired-abc'
+    (retired / 'bot_v1').mkdir(parents=True)
+    (retired / 'bot_v1' / 'a.txt').write_text('previous')
+
+    writer = ArtifactWriter(str(tmp_path), 'bot_v1')
+    assert read(os.path.join(writer.target, 'a.txt')) == 'previous'
+    assert not retired.exists()
+
+
+def test_recover_drops_retired_folders_of_a_published_version(tmp_path):
+    (tmp_path / 'bot_v1').mkdir()
+    (tmp_path / 'bot_v1' / 'a.txt').write_text('current')
+    retired = tmp_path / '.bot_v1.retired-abc'
+    (retired / 'bot_v1').mkdir(parents=True)
+    (retired / 'bot_v1' / 'a.txt').write_text('previous')
+    other = tmp_path / '.bot_v2.retired-abc'
+    other.mkdir()
+
+    assert not ArtifactWriter.recover(str(tmp_path), 'bot_v1')
+    assert read(tmp_path / 'bot_v1' / 'a.txt') == 'current'
+    assert not retired.exists()
+    # Retired folders of other versions belong to their own writers
+    assert other.exists()
+
+
+def test_collect_garbage_removes_unlinked_blobs(tmp_path):
+    writer = ArtifactWriter(str(tmp_path), 'bot_v1')
+    kept = writer.write('kept.txt', 'kept')
+    dropped = writer.write('dropped.txt', 'dropped')
+    writer.publish()
+    os.remove(os.path.join(writer.target, 'dropped.txt'))
+
+    assert ArtifactWriter.collect_garbage(writer.blob_dir, min_age=0) == len('dropped')
+    assert os.path.exists(ArtifactWriter.blob_path(writer.blob_dir, kept))
+    assert not os.path.exists(ArtifactWriter.blob_path(writer.blob_dir, dropped))
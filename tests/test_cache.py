@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+from src.chatops import Cache as cache_module
+from src.chatops.Cache import DiskCache, ExecutionCache
+
+
+def test_execution_cache_stores_stdout_and_stderr_apart(tmp_path):
+    cache = ExecutionCache(str(tmp_path))
+    cache.set_result('Python', '3.11', 'print(1)', 'completed', '1', 'DeprecationWarning')
+    assert cache.get_result('python', '3.11', 'print(1)') == {'status': 'completed', 'stdout': '1', 'stderr': 'DeprecationWarning'}
+    assert cache.get_result('python', '3.12', 'print(1)') is None
+
+
+def test_execution_cache_skips_failures_unless_opted_in(tmp_path):
+    cache = ExecutionCache(str(tmp_path))
+    for status in ('failed', 'timeout', 'cancelled', 'language_not_installed'):
+        cache.set_result('python', '3.11', status, status, '', 'error')
+        assert cache.get_result('python', '3.11', status) is None
+    assert cache._entries() == []
+
+    failures = ExecutionCache(str(tmp_path), cache_failures=True)
+    failures.set_result('python', '3.11', '1/0', 'failed', '', 'ZeroDivisionError')
+    failures.set_result('python', '3.11', 'while True: pass', 'timeout', '', 'timed out')
+    assert failures.get_result('python', '3.11', '1/0')['stderr'] == 'ZeroDivisionError'
+    assert failures.get_result('python', '3.11', 'while True: pass') is None
+    # A failure stored by a run that opted in is not served to one that did not
+    assert ExecutionCache(str(tmp_path)).get_result('python', '3.11', '1/0') is None
+
+
+def test_execution_cache_ignores_entries_of_the_old_format(tmp_path):
+    cache = ExecutionCache(str(tmp_path))
+    cache.set(cache.key_for('python', '3.11', 'print(1)'), {'status': 'completed', 'result': '1'})
+    assert cache.get_result('python', '3.11', 'print(1)') is None
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    now = time.time()
+    for age, key in zip([30, 20, 10], ['a', 'b', 'c']):
+        cache.set(key, 'x' * 100)
+        # Distinct access times, a oldest
+        os.utime(cache._path(key), (now - age, now - age))
+    # Reading a makes it the most recently used entry
+    assert cache.get('a') == 'x' * 100
+    # Room for three entries, their creation timestamps may differ in length by a few bytes
+    cache.max_bytes = cache._size + 50
+
+    cache.set('d', 'x' * 100)
+    assert cache.get('b') is None
+    assert [cache.get(key) is not None for key in ('a', 'c', 'd')] == [True, True, True]
+    assert cache._size == sum(entry.stat().st_size for entry in cache._entries()) <= cache.max_bytes
+
+
+def test_entries_older_than_max_age_are_misses(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_age=60)
+    cache.set('old', 'value')
+    assert cache.get('old') == 'value'
+
+    now = time.time()
+    monkeypatch.setattr(cache_module, 'time', lambda: now + 61)
+    assert cache.get('old') is None
+    assert not os.path.exists(cache._path('old'))
+    assert cache._size == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entry_evicted_during_a_hit_is_a_miss(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path))
+    cache.set('key', 'value')
+    real_utime = os.utime
+
+    def evicted_before_touch(path, *args, **kwargs):
+        # Another thread or process evicts the entry between the read and the touch
+        os.remove(path)
+        return real_utime(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'utime', evicted_before_touch)
+    assert cache.get('key') is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_expiry_racing_a_set_keeps_the_size_accurate(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_age=60)
+    now = time.time()
+    monkeypatch.setattr(cache_module, 'time', lambda: now - 120)
+    cache.set('key', 'old')
+    monkeypatch.setattr(cache_module, 'time', lambda: now)
+    real_remove = os.remove
+    writer = threading.Thread(target=cache.set, args=('key', 'x' * 100))
+
+    def remove_while_rewritten(path):
+        # Another thread stores a larger value under the key while the expired entry is removed
+        monkeypatch.setattr(os, 'remove', real_remove)
+        writer.start()
+        writer.join(timeout=0.2)
+        real_remove(path)
+
+    monkeypatch.setattr(os, 'remove', remove_while_rewritten)
+    assert cache.get('key') is None
+    writer.join()
+    assert cache._size == sum(entry.stat().st_size for entry in cache._entries())
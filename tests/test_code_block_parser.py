@@ -0,0 +1,95 @@
+import pytest
+from src.chatops.OutputChain import CodeBlock, CodeBlockParser, CodeProcessor
+
+
+def parse(text, default_file_name=None):
+    parser = CodeBlockParser(default_file_name=default_file_name)
+    return parser.feed(text) + parser.close()
+
+
+def test_pairs_headers_with_blocks():
+    text = (
+        "#~Folder_Name:Microsoft/Compute~\n"
+        "#~File_Name:main~\n"
+        "```python\nprint('hi')\n```\n"
+        "Some text\n"
+        "#~File_Name:config~\n"
+        "```yaml\nkey: value\n```\n"
+    )
+    assert parse(text) == [
+        CodeBlock('main', 'Microsoft/Compute', 'python', "print('hi')"),
+        CodeBlock('config', 'Microsoft/Compute', 'yaml', 'key: value'),
+    ]
+
+
+def test_block_without_header_is_skipped_without_misaligning_later_blocks():
+    text = "```python\nprint(1)\n```\n~File_Name:second~\n```python\nprint(2)\n```\n"
+    assert parse(text) == [CodeBlock('second', None, 'python', 'print(2)')]
+
+
+def test_default_file_name_for_blocks_without_header():
+    text = "```python\nprint(1)\n```\n```python\nprint(2)\n```\n"
+    assert [block.file_name for block in parse(text, default_file_name='out')] == ['out', 'out_2']
+
+
+@pytest.mark.parametrize('line', [
+    "~File_Name:main~ ```python",
+    "#~File_Name:main~```python",
+    "```python ~File_Name:main~",
+])
+def test_header_on_the_fence_line(line):
+    assert parse(f"{line}\nprint('hi')\n```\n") == [CodeBlock('main', None, 'python', "print('hi')")]
+
+
+def test_folder_and_file_headers_on_the_fence_line():
+    text = "#~Folder_Name:app/src~ #~File_Name:main~ ```python\nprint('hi')\n```\n"
+    assert parse(text) == [CodeBlock('main', 'app/src', 'python', "print('hi')")]
+
+
+def test_single_line_block():
+    text = "~File_Name:hello~\n```python print('hello')```\n~File_Name:note~\n```plain```\n"
+    assert parse(text) == [
+        CodeBlock('hello', None, 'python', "print('hello')"),
+        CodeBlock('note', None, 'text', 'plain'),
+    ]
+
+
+def test_single_line_block_with_header_on_the_same_line():
+    assert parse("~File_Name:hello~ ```python print('hello')```") == [CodeBlock('hello', None, 'python', "print('hello')")]
+
+
+def test_inline_backticks_in_prose_are_not_blocks():
+    assert parse("~File_Name:main~\nRun ```pip install x``` first\n```python\nprint(1)\n```\n") == [
+        CodeBlock('main', None, 'python', 'print(1)')
+    ]
+
+
+def test_nested_fences_stay_in_the_content():
+    text = "~File_Name:readme~\n```markdown\n# Usage\n```bash\nrun.sh\n```\n```\n"
+    assert parse(text) == [CodeBlock('readme', None, 'markdown', "# Usage\n```bash\nrun.sh\n```")]
+
+
+def test_streamed_chunks_match_a_single_feed():
+    text = "#~Folder_Name:app~\n~File_Name:a~ ```python\nprint(1)\n```\n~File_Name:b~\n```python print(2)```\n"
+    parser = CodeBlockParser()
+    blocks = []
+    for index in range(0, len(text), 3):
+        blocks += parser.feed(text[index:index + 3])
+    assert blocks + parser.close() == parse(text)
+
+
+@pytest.mark.parametrize('folder_name, expected', [
+    (None, 'main.py'),
+    ('Microsoft/Compute', 'Microsoft/Compute/main.py'),
+    ('/etc/../app\\src/', 'etc/app/src/main.py'),
+])
+def test_file_name_keeps_folders_inside_the_project(tmp_path, folder_name, expected):
+    processor = CodeProcessor(output_location=str(tmp_path))
+    assert processor.file_name('main', 'python', folder_name) == expected
+
+
+def test_saved_blocks_go_into_their_folder(tmp_path):
+    processor = CodeProcessor(output_location=str(tmp_path), no_test=True)
+    code_blocks = processor.parse_code_blocks("#~Folder_Name:app/src~\n~File_Name:main~\n```python\nprint(1)\n```\n")
+    list(processor.iter_code_blocks(code_blocks))
+    assert (tmp_path / 'bot_v1' / 'app' / 'src' / 'main.py').read_text() == 'print(1)'
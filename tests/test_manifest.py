@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from src.chatops import ArtifactWriter
+from src.chatops.Manifest import ProjectManifest
+
+
+def allocate(output_location, count):
+    manifest = ProjectManifest(output_location, 'bot')
+    return [manifest.allocate_version() for _ in range(count)]
+
+
+def test_versions_are_allocated_in_sequence(tmp_path):
+    manifest = ProjectManifest(str(tmp_path), 'bot')
+    assert [manifest.allocate_version() for _ in range(3)] == [1, 2, 3]
+    # Allocation alone publishes nothing
+    assert manifest.latest_version() == 0
+    assert not os.path.exists(manifest.path)
+
+
+def test_counter_is_seeded_from_existing_versions(tmp_path):
+    (tmp_path / 'bot_v4').mkdir()
+    (tmp_path / 'other_v9').mkdir()
+    manifest = ProjectManifest(str(tmp_path), 'bot')
+    assert manifest.allocate_version() == 5
+
+
+def test_overwrite_reuses_the_latest_published_version(tmp_path):
+    manifest = ProjectManifest(str(tmp_path), 'bot')
+    assert manifest.allocate_version(overwrite=True) == 1
+    manifest.record_files(manifest.allocate_version(), {'a.txt': 'digest'})
+    manifest.allocate_version()
+    assert manifest.allocate_version(overwrite=True) == 1
+
+
+def test_concurrent_threads_never_share_a_version(tmp_path):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        batches = list(pool.map(allocate, [str(tmp_path)] * 8, [25] * 8))
+    versions = [version for batch in batches for version in batch]
+    assert sorted(versions) == list(range(1, 201))
+
+
+def test_concurrent_processes_never_share_a_version(tmp_path):
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        batches = list(pool.map(allocate, [str(tmp_path)] * 4, [25] * 4))
+    versions = [version for batch in batches for version in batch]
+    assert sorted(versions) == list(range(1, 101))
+
+
+def test_record_files_publishes_the_version(tmp_path):
+    manifest = ProjectManifest(str(tmp_path), 'bot')
+    version = manifest.allocate_version()
+    manifest.record_tasks(version, {'task': {'fingerprint': None, 'files': {}}})
+    assert manifest.version_tasks(version) == {}
+
+    manifest.record_files(version, {'a.txt': 'digest'})
+    manifest.record_tasks(version, {'task': {'fingerprint': 'f', 'files': {'a.txt': 'digest'}}})
+    assert manifest.latest_version() == version
+    assert manifest.version_files(version) == {'a.txt': 'digest'}
+    assert manifest.version_tasks(version)['task']['fingerprint'] == 'f'
+
+
+def test_manifest_is_written_with_the_umask(tmp_path):
+    manifest = ProjectManifest(str(tmp_path), 'bot')
+    manifest.record_files(manifest.allocate_version(), {'a.txt': 'digest'})
+    if os.name == 'posix':
+        assert os.stat(manifest.path).st_mode & 0o777 == 0o666 & ~ArtifactWriter.UMASK
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
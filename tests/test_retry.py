@@ -0,0 +1,163 @@
+import asyncio
+import pytest
+from src.chatops import Retry
+from src.chatops.Retry import Failure, MalformedResponseError, RetryEngine, RetryPolicy, classify, parse_retry_after
+from src.chatops.Scheduler import RateLimitScheduler
+
+
+class HTTPError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.headers = headers or {}
+
+
+class LegacyHTTPError(Exception):
+    def __init__(self, http_status):
+        super().__init__(f"HTTP {http_status}")
+        self.http_status = http_status
+
+
+@pytest.mark.parametrize('error, expected', [
+    (HTTPError(400), Failure(False, 'HTTP 400')),
+    (HTTPError(401), Failure(False, 'HTTP 401')),
+    (HTTPError(404), Failure(False, 'HTTP 404')),
+    (HTTPError(408), Failure(True, 'HTTP 408')),
+    (HTTPError(409), Failure(True, 'HTTP 409')),
+    (HTTPError(425), Failure(True, 'HTTP 425')),
+    (HTTPError(429), Failure(True, 'HTTP 429')),
+    (HTTPError(500), Failure(True, 'HTTP 500')),
+    (HTTPError(503), Failure(True, 'HTTP 503')),
+    (LegacyHTTPError(502), Failure(True, 'HTTP 502')),
+    (HTTPError(429, {'Retry-After': '7'}), Failure(True, 'HTTP 429', 7.0)),
+    (HTTPError(503, {'retry-after-ms': '1500'}), Failure(True, 'HTTP 503', 1.5)),
+    (HTTPError(400, {'Retry-After': '7'}), Failure(False, 'HTTP 400')),
+    (asyncio.TimeoutError(), Failure(True, 'timeout')),
+    (TimeoutError(), Failure(True, 'timeout')),
+    (ConnectionResetError(), Failure(True, 'connection')),
+    (MalformedResponseError(), Failure(True, 'malformed response')),
+    (ValueError('bug'), Failure(False, 'ValueError')),
+    (KeyError('bug'), Failure(False, 'KeyError')),
+])
+def test_classify(error, expected):
+    assert classify(error) == expected
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({}) is None
+    assert parse_retry_after({'Retry-After': '2.5'}) == 2.5
+    assert parse_retry_after({'Retry-After': '-3'}) == 0.0
+    assert parse_retry_after({'retry-after-ms': '250', 'Retry-After': '9'}) == 0.25
+    assert parse_retry_after({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}) == 0.0
+    assert parse_retry_after({'Retry-After': 'soon'}) is None
+
+
+def test_retry_after_overrides_the_backoff(monkeypatch):
+    monkeypatch.setattr(Retry.random, 'uniform', lambda low, high: high)
+    policy = RetryPolicy(base_delay=1.0, max_delay=60.0)
+    assert policy.delay(5, retry_after=30.0) == 31.0
+    assert policy.delay(0, retry_after=0.0) == 1.0
+
+
+def test_full_jitter_bounds(monkeypatch):
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    bounds = []
+    monkeypatch.setattr(Retry.random, 'uniform', lambda low, high: bounds.append((low, high)) or high)
+    assert [policy.delay(attempt) for attempt in range(6)] == [1, 2, 4, 8, 10, 10]
+    assert all(low == 0 for low, _ in bounds)
+
+
+def test_full_jitter_stays_within_bounds():
+    policy = RetryPolicy(base_delay=0.5, max_delay=4.0)
+    for attempt in range(8):
+        for _ in range(50):
+            assert 0 <= policy.delay(attempt) <= min(4.0, 0.5 * 2 ** attempt)
+
+
+def test_retry_limit_is_respected(clock):
+    engine = RetryEngine(RetryPolicy(max_retries=5, base_delay=1.0), RateLimitScheduler())
+    calls = 0
+
+    async def request(attempt):
+        nonlocal calls
+        calls += 1
+        raise HTTPError(503)
+
+    with pytest.raises(HTTPError):
+        asyncio.run(engine.call(request, retries=2))
+    assert calls == 3
+    assert engine.retries == 2
+    assert len(clock.sleeps) == 2
+
+
+def test_non_retryable_errors_are_not_retried(clock):
+    engine = RetryEngine(RetryPolicy(max_retries=3))
+    calls = 0
+
+    async def request(attempt):
+        nonlocal calls
+        calls += 1
+        raise HTTPError(400)
+
+    with pytest.raises(HTTPError):
+        asyncio.run(engine.call(request))
+    assert calls == 1
+    assert engine.retries == 0
+    assert clock.sleeps == []
+
+
+def test_retry_after_pauses_the_scheduler(clock):
+    scheduler = RateLimitScheduler()
+    engine = RetryEngine(RetryPolicy(max_retries=1, base_delay=1.0), scheduler)
+    calls = []
+
+    async def request(attempt):
+        async with scheduler.admit():
+            attempt.admitted()
+            calls.append(clock())
+            if len(calls) == 1:
+                raise HTTPError(429, {'Retry-After': '20'})
+            return 'ok'
+
+    assert asyncio.run(engine.call(request, hedge=False)) == 'ok'
+    assert 20 <= calls[1] - calls[0] <= 21
+
+
+def test_hedged_call_cancels_the_losing_attempt():
+    # Real time: the hedge timer runs on the event loop clock
+    engine = RetryEngine(RetryPolicy(hedge_percentile=50, hedge_min_samples=1))
+    engine.latencies.record(0.01)
+    calls = 0
+    cancelled = False
+
+    async def request(attempt):
+        nonlocal calls, cancelled
+        calls += 1
+        number = calls
+        attempt.admitted()
+        if number == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            return 'slow'
+        return 'fast'
+
+    async def main():
+        result = await engine.call(request)
+        # Give the cancelled attempt a turn to observe the cancellation
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == 'fast'
+    assert calls == 2
+    assert engine.hedges == 1
+    assert engine.hedges_won == 1
+    assert cancelled
+
+
+def test_no_hedge_before_enough_samples():
+    engine = RetryEngine(RetryPolicy(hedge_percentile=50, hedge_min_samples=3))
+    engine.latencies.record(0.01)
+    assert engine.hedge_delay() is None
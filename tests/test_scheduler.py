@@ -0,0 +1,140 @@
+import asyncio
+import pytest
+from src.chatops.Scheduler import RateLimitScheduler, TokenBucket
+
+
+def test_in_flight_requests_are_capped(clock):
+    scheduler = RateLimitScheduler(max_in_flight=2)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with scheduler.admit():
+            peak = max(peak, scheduler.in_flight)
+            await asyncio.sleep(1)
+
+    async def main():
+        await asyncio.gather(*[request() for _ in range(6)])
+
+    asyncio.run(main())
+    assert peak == 2
+    assert scheduler.admitted == 6
+    assert scheduler.in_flight == 0
+
+
+def test_token_bucket_waits_for_refill(clock):
+    # 60 per minute refills one token a second and holds ten seconds of budget
+    bucket = TokenBucket(60)
+    assert bucket.capacity == 10
+
+    async def main():
+        await bucket.acquire(10)
+        start = clock()
+        await bucket.acquire(3)
+        return clock() - start
+
+    assert asyncio.run(main()) == pytest.approx(3)
+    assert bucket.tokens == pytest.approx(0)
+
+
+def test_token_bucket_clamps_requests_above_capacity(clock):
+    bucket = TokenBucket(60)
+
+    async def main():
+        await bucket.acquire(500)
+
+    asyncio.run(main())
+    assert clock.sleeps == []
+    assert bucket.tokens == pytest.approx(0)
+
+
+def test_token_bucket_refill_is_capped(clock):
+    bucket = TokenBucket(60)
+    bucket.consume(4)
+    clock.advance(3600)
+    bucket.consume(0)
+    assert bucket.tokens == bucket.capacity
+
+
+def test_record_usage_charges_actual_tokens_over_the_estimate(clock):
+    # 600 tokens per minute: 10 a second, 100 of capacity
+    scheduler = RateLimitScheduler(tokens_per_minute=600)
+
+    async def main():
+        async with scheduler.admit(20):
+            pass
+
+    asyncio.run(main())
+    assert scheduler._token_bucket.tokens == pytest.approx(80)
+    scheduler.record_usage(20, 50)
+    assert scheduler._token_bucket.tokens == pytest.approx(50)
+    # Usage below the estimate gives budget back
+    scheduler.record_usage(20, 10)
+    assert scheduler._token_bucket.tokens == pytest.approx(60)
+
+
+def test_overcharged_bucket_delays_the_next_request(clock):
+    scheduler = RateLimitScheduler(tokens_per_minute=600)
+    scheduler.record_usage(0, 150)
+
+    async def main():
+        async with scheduler.admit(10):
+            pass
+
+    asyncio.run(main())
+    # -50 tokens left, 60 more needed at 10 a second
+    assert sum(clock.sleeps) == pytest.approx(6)
+
+
+def test_admit_releases_its_slot_when_the_request_raises(clock):
+    scheduler = RateLimitScheduler(max_in_flight=1)
+
+    async def failing():
+        async with scheduler.admit():
+            raise ValueError("request failed")
+
+    async def main():
+        with pytest.raises(ValueError):
+            await failing()
+        assert scheduler.in_flight == 0
+        assert scheduler.has_capacity()
+        async with scheduler.admit():
+            return scheduler.in_flight
+
+    assert asyncio.run(main()) == 1
+
+
+def test_admit_releases_its_slot_when_cancelled_while_queued(clock):
+    scheduler = RateLimitScheduler(max_in_flight=1)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.admit():
+                await release.wait()
+
+        first = asyncio.ensure_future(holder())
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(holder())
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        release.set()
+        await first
+        return scheduler.has_capacity(), scheduler.admitted
+
+    assert asyncio.run(main()) == (True, 1)
+
+
+def test_pause_holds_back_new_admissions(clock):
+    scheduler = RateLimitScheduler()
+    scheduler.pause(5)
+    assert not scheduler.has_capacity()
+
+    async def main():
+        start = clock()
+        async with scheduler.admit():
+            return clock() - start
+
+    assert asyncio.run(main()) == pytest.approx(5)